@@ -0,0 +1,26 @@
+# Benchmarks the construction time and the number of widgets created by geemap.Map(),
+# with and without lite_mode, e.g., for a dashboard showing a grid of 12 maps.
+
+import time
+import ipywidgets as widgets
+import geemap
+
+# Initializes the Earth Engine session once, outside of the timed loop
+geemap.ee_initialize()
+
+repeats = 12
+
+for lite_mode in [False, True]:
+    widget_count = len(widgets.Widget.widgets)
+    start = time.perf_counter()
+    maps = [geemap.Map(lite_mode=lite_mode) for i in range(repeats)]
+    elapsed = time.perf_counter() - start
+    widgets_per_map = (len(widgets.Widget.widgets) - widget_count) / repeats
+    print('lite_mode={}: {:.1f} ms per map, {:.0f} widgets per map'.format(
+        lite_mode, elapsed / repeats * 1000, widgets_per_map))
+
+grid = widgets.GridBox(maps, layout=widgets.Layout(
+    grid_template_columns='repeat(4, 300px)'))
+for m in maps:
+    m.layout.height = '300px'
+grid
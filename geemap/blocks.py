@@ -0,0 +1,450 @@
+"""Module for reading the pixels of Earth Engine images into numpy arrays. The region is split into blocks that fit the request limits, which are downloaded concurrently as NPY files and written into a preallocated array (or a memory-mapped file for large outputs) at their offsets.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .export import plan_export
+
+
+def _decode_npy(content):
+    """Decodes NPY bytes without copying the data.
+
+    Returns:
+        array: A read-only numpy array backed by content.
+    """
+    import io
+    import numpy as np
+
+    buffer = io.BytesIO(content)
+    version = np.lib.format.read_magic(buffer)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(
+            buffer)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(
+            buffer)
+    count = int(np.prod(shape))
+    array = np.frombuffer(content, dtype=dtype,
+                          count=count, offset=buffer.tell())
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def _fetch_block(image, block, crs):
+    """Fetches the pixels of all bands of one block of the plan with a single NPY download.
+
+    Returns:
+        array: A (height, width) structured numpy array with a field per band.
+    """
+    from .download import get_session, get_timeout
+
+    url = image.getDownloadURL({
+        'format': 'NPY',
+        'crs': crs,
+        'crs_transform': block['crs_transform'],
+        'dimensions': '{}x{}'.format(block['width'], block['height']),
+    })
+    r = get_session().get(url, timeout=get_timeout())
+    if r.status_code != 200:
+        raise IOError('An error occurred while downloading a block (HTTP {}): {}'.format(
+            r.status_code, r.text[:1000]))
+    return _decode_npy(r.content)
+
+
+def band_dtype(band_type):
+    """Returns the numpy dtype of an Earth Engine PixelType dictionary, such as {'type': 'PixelType', 'precision': 'int', 'min': 0, 'max': 255}.
+
+    Args:
+        band_type (dict): The PixelType of a band, as returned by ee.Image.bandTypes().
+
+    Returns:
+        object: The numpy dtype.
+    """
+    import numpy as np
+
+    precision = band_type.get('precision')
+    if precision == 'double':
+        return np.dtype('float64')
+    elif precision == 'float':
+        return np.dtype('float32')
+    min_value = band_type.get('min')
+    max_value = band_type.get('max')
+    if min_value is None or max_value is None:
+        return np.dtype('int64')
+    for name in ['uint8', 'int8', 'uint16', 'int16', 'uint32', 'int32']:
+        info = np.iinfo(name)
+        if min_value >= info.min and max_value <= info.max:
+            return np.dtype(name)
+    return np.dtype('int64')
+
+
+def _with_mask_bands(image):
+    """Appends the mask of each band as a uint8 band named 'mask_<band>'."""
+    import ee
+
+    masks = image.mask().gt(0).uint8()
+    names = image.bandNames().map(lambda name: ee.String('mask_').cat(name))
+    return image.addBands(masks.rename(names))
+
+
+def _allocate(shape, dtype, filename=None):
+    import numpy as np
+
+    if filename is None:
+        return np.zeros(shape, dtype=dtype)
+    return np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape)
+
+
+def _plan_read(image, region=None, scale=None, crs=None, default_value=None, masked=False, tile_shape=None):
+    """Plans reading an image in blocks.
+
+    Returns:
+        tuple: The image to download, the plan, the band names, the mask band names and the dtype of the output.
+    """
+    import numpy as np
+
+    if default_value is not None:
+        image = image.unmask(default_value, False)
+    if masked:
+        image = _with_mask_bands(image)
+    plan = plan_export(image, region=region, scale=scale,
+                       crs=crs, tile_shape=tile_shape)
+    band_names = plan['band_names']
+    mask_names = []
+    if masked:
+        count = len(band_names) // 2
+        band_names, mask_names = band_names[:count], band_names[count:]
+
+    dtypes = [band_dtype(plan['band_types'][band]) for band in band_names]
+    dtype = np.result_type(*dtypes) if dtypes else np.dtype('float64')
+    return image, plan, band_names, mask_names, dtype
+
+
+def _fetch_blocks(image, plan, workers=4, read_ahead=None):
+    """Downloads the blocks of a plan concurrently, keeping at most workers + read_ahead blocks in flight or waiting to be consumed.
+
+    Yields:
+        tuple: The block and its structured numpy array, in the order in which they arrive.
+    """
+    from .download import get_session
+
+    if read_ahead is None:
+        read_ahead = workers
+    get_session(workers)
+    blocks = iter(plan['tiles'])
+    futures = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                for block in blocks:
+                    future = executor.submit(
+                        _fetch_block, image, block, plan['crs'])
+                    futures[future] = block
+                    if len(futures) >= workers + read_ahead:
+                        break
+                if not futures:
+                    return
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    block = futures.pop(future)
+                    yield block, future.result()
+        finally:
+            # Stops downloading when the consumer stops early or a block fails.
+            for future in futures:
+                future.cancel()
+
+
+def _copy_block(values, band_names, mask_names, out, mask=None):
+    """Copies the bands of a downloaded block into an output window, and its masks into a mask window."""
+    import numpy as np
+
+    for index, band in enumerate(band_names):
+        out[:, :, index] = values[band]
+    for index, band in enumerate(mask_names):
+        np.equal(values[band], 0, out=mask[:, :, index])
+
+
+def read_image(image, region=None, scale=None, crs=None, default_value=None, masked=False, filename=None, workers=4):
+    """Reads the pixels of an image into a (y, x, band) numpy array. The region is split into blocks that fit the request size limit of getDownloadURL, which are downloaded concurrently as binary NPY files and copied into the array as they arrive. The array has the smallest numpy dtype that holds all band types.
+
+    Args:
+        image (object): The ee.Image to read.
+        region (object, optional): The region to read. Defaults to the footprint of the image.
+        scale (float, optional): The scale in meters. Defaults to the nominal scale of the image.
+        crs (str, optional): The CRS. Defaults to the CRS of the first band of the image.
+        default_value (float, optional): A sentinel value for masked pixels. Defaults to None, which leaves the fill value of the server.
+        masked (bool, optional): Whether to return a numpy masked array, using the masks of the bands. Defaults to False.
+        filename (str, optional): If given, the array is a numpy memmap stored in this .npy file, for outputs larger than memory. The mask of a masked array is stored next to it in a _mask.npy file. Defaults to None.
+        workers (int, optional): The number of blocks to fetch concurrently. Defaults to 4.
+
+    Returns:
+        array: The (y, x, band) numpy array, or a numpy masked array if masked is True.
+    """
+    import numpy as np
+
+    image, plan, band_names, mask_names, dtype = _plan_read(
+        image, region, scale, crs, default_value, masked)
+    shape = (plan['height'], plan['width'], len(band_names))
+    out = _allocate(shape, dtype, filename)
+    mask = None
+    if masked:
+        mask_filename = None
+        if filename is not None:
+            mask_filename = os.path.splitext(filename)[0] + '_mask.npy'
+        mask = _allocate(shape, 'bool', mask_filename)
+
+    for block, values in _fetch_blocks(image, plan, workers):
+        rows = slice(block['row_off'], block['row_off'] + block['height'])
+        cols = slice(block['col_off'], block['col_off'] + block['width'])
+        # Each band is copied once, from the downloaded bytes into the output array.
+        _copy_block(values, band_names, mask_names, out[rows, cols],
+                    None if mask is None else mask[rows, cols])
+
+    if filename is not None:
+        out.flush()
+        if mask is not None:
+            mask.flush()
+    if masked:
+        return np.ma.MaskedArray(out, mask=mask, copy=False)
+    return out
+
+
+def iter_image_blocks(image, region=None, scale=None, crs=None, block_shape=(512, 512), default_value=None, masked=False, workers=4, read_ahead=None):
+    """Iterates over the blocks of an image as they are downloaded, for processing images larger than memory block by block. At most workers + read_ahead blocks are held in memory at a time.
+
+    Args:
+        image (object): The ee.Image to read.
+        region (object, optional): The region to read. Defaults to the footprint of the image.
+        scale (float, optional): The scale in meters. Defaults to the nominal scale of the image.
+        crs (str, optional): The CRS. Defaults to the CRS of the first band of the image.
+        block_shape (tuple, optional): The (height, width) of the blocks, in pixels. Blocks at the right and bottom edges can be smaller. Defaults to (512, 512).
+        default_value (float, optional): A sentinel value for masked pixels. Defaults to None.
+        masked (bool, optional): Whether to yield numpy masked arrays, using the masks of the bands. Defaults to False.
+        workers (int, optional): The number of blocks to download concurrently. Defaults to 4.
+        read_ahead (int, optional): The number of blocks downloaded ahead of the consumer. Defaults to None, which is the number of workers.
+
+    Yields:
+        tuple: The window of the block (a dict of col_off, row_off, width, height, crs and crs_transform) and its (y, x, band) numpy array, in the order in which the blocks arrive.
+    """
+    planned = _plan_read(image, region, scale, crs,
+                         default_value, masked, tile_shape=block_shape)
+    return _iter_blocks(planned, masked, workers, read_ahead)
+
+
+def _iter_blocks(planned, masked=False, workers=4, read_ahead=None):
+    """Iterates over the blocks of an image planned by _plan_read(), as iter_image_blocks() does."""
+    import numpy as np
+
+    image, plan, band_names, mask_names, dtype = planned
+    for block, values in _fetch_blocks(image, plan, workers, read_ahead):
+        shape = (block['height'], block['width'], len(band_names))
+        out = np.empty(shape, dtype=dtype)
+        mask = np.empty(shape, dtype='bool') if masked else None
+        _copy_block(values, band_names, mask_names, out, mask)
+        if masked:
+            out = np.ma.MaskedArray(out, mask=mask, copy=False)
+        yield dict(block, crs=plan['crs']), out
+
+
+def _attach_shared_memory(name):
+    from multiprocessing import shared_memory
+
+    try:
+        # The segments are owned and unlinked by the parent process.
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _map_block(func, in_spec, out_spec=None):
+    """Applies func to a block in shared memory in a worker process. The result is written to the output shared memory, or returned if out_spec is None.
+    """
+    import numpy as np
+
+    in_shm = _attach_shared_memory(in_spec[0])
+    out_shm = None
+    try:
+        block = np.ndarray(in_spec[1], dtype=in_spec[2], buffer=in_shm.buf)
+        result = np.asarray(func(block))
+        del block
+        if result.ndim == 2:
+            result = result[:, :, np.newaxis]
+        if result.shape[:2] != tuple(in_spec[1][:2]):
+            raise ValueError('func must return an array with the height and width of the block, {}, but returned {}.'.format(
+                tuple(in_spec[1][:2]), result.shape))
+        if out_spec is None:
+            return result
+        out_shm = _attach_shared_memory(out_spec[0])
+        out = np.ndarray(out_spec[1], dtype=out_spec[2], buffer=out_shm.buf)
+        out[...] = result
+        del out
+    finally:
+        in_shm.close()
+        if out_shm is not None:
+            out_shm.close()
+
+
+def _shared_array(shape, dtype):
+    """Creates a numpy array in a new shared memory segment.
+
+    Returns:
+        tuple: The shared memory segment and the array.
+    """
+    import numpy as np
+    from multiprocessing import shared_memory
+
+    dtype = np.dtype(dtype)
+    size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+class _BlockWriter(object):
+    """Writes the results of map_blocks() to a numpy array, a .npy memmap or a GeoTIFF."""
+
+    def __init__(self, out, plan, bands, dtype):
+        import numpy as np
+
+        self.out = out
+        self.dataset = None
+        shape = (plan['height'], plan['width'], bands)
+        if out is None:
+            self.array = np.zeros(shape, dtype=dtype)
+        elif out.lower().endswith('.tif') or out.lower().endswith('.tiff'):
+            import rasterio
+
+            self.dataset = rasterio.open(out, 'w', driver='GTiff', width=plan['width'], height=plan['height'],
+                                         count=bands, dtype=np.dtype(dtype).name, crs=plan['crs'],
+                                         transform=rasterio.Affine(
+                                             *plan['crs_transform']),
+                                         tiled=True, blockxsize=256, blockysize=256, compress='deflate',
+                                         BIGTIFF='IF_SAFER')
+        else:
+            self.array = np.lib.format.open_memmap(
+                out, mode='w+', dtype=dtype, shape=shape)
+
+    def write(self, block, result):
+        if self.dataset is not None:
+            from rasterio.windows import Window
+
+            self.dataset.write(result.transpose(2, 0, 1), window=Window(
+                block['col_off'], block['row_off'], block['width'], block['height']))
+        else:
+            self.array[block['row_off']:block['row_off'] + block['height'],
+                       block['col_off']:block['col_off'] + block['width']] = result
+
+    def close(self):
+        if self.dataset is not None:
+            self.dataset.close()
+            return self.out
+        if self.out is not None:
+            self.array.flush()
+        return self.array
+
+
+def map_blocks(func, image, region=None, scale=None, crs=None, out=None, block_shape=(512, 512), default_value=None, workers=4, processes=None):
+    """Applies a Python function to the blocks of an image on a process pool, as the blocks are downloaded. Blocks are handed to the worker processes through shared memory, and the results are written to a numpy array, a .npy memmap or a GeoTIFF.
+
+    Args:
+        func (function): A function taking a (y, x, band) numpy array and returning a numpy array with the same height and width, either 2D or (y, x, band). It must be picklable, such as a function defined at the top level of a module.
+        image (object): The ee.Image to process.
+        region (object, optional): The region to process. Defaults to the footprint of the image.
+        scale (float, optional): The scale in meters. Defaults to the nominal scale of the image.
+        crs (str, optional): The CRS. Defaults to the CRS of the first band of the image.
+        out (str, optional): The output .npy or .tif file. Defaults to None, which returns an in-memory numpy array.
+        block_shape (tuple, optional): The (height, width) of the blocks, in pixels. Defaults to (512, 512).
+        default_value (float, optional): A sentinel value for masked pixels. Defaults to None.
+        workers (int, optional): The number of blocks to download concurrently. Defaults to 4.
+        processes (int, optional): The number of worker processes. Defaults to None, which is the number of CPUs.
+
+    Returns:
+        object: The output numpy array or memmap, or the file path of the GeoTIFF.
+    """
+    import sys
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+
+    if sys.version_info < (3, 8):
+        raise ImportError(
+            'map_blocks requires Python 3.8 or later for shared memory.')
+
+    if out is not None:
+        out = os.path.abspath(out)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    image, plan, band_names, mask_names, dtype = _plan_read(
+        image, region, scale, crs, default_value, tile_shape=block_shape)
+
+    writer = None
+    result_spec = None
+    running = {}
+
+    def finish(future):
+        block, in_shm, out_shm, out_array = running.pop(future)
+        try:
+            result = future.result()
+            writer.write(block, result if out_array is None else out_array)
+        finally:
+            del out_array
+            for shm in [in_shm, out_shm]:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for block, values in _fetch_blocks(image, plan, workers):
+                shape = (block['height'], block['width'], len(band_names))
+                in_shm, in_array = _shared_array(shape, dtype)
+                _copy_block(values, band_names, mask_names, in_array)
+                del in_array
+                in_spec = (in_shm.name, shape, dtype.str)
+
+                if writer is None:
+                    # The first block is run on its own to find the number of bands and the dtype of the output.
+                    future = executor.submit(_map_block, func, in_spec)
+                    running[future] = (block, in_shm, None, None)
+                    result = future.result()
+                    result_spec = (result.shape[2], result.dtype)
+                    writer = _BlockWriter(
+                        out, plan, result_spec[0], result_spec[1])
+                    finish(future)
+                    continue
+
+                out_shape = (block['height'],
+                             block['width'], result_spec[0])
+                out_shm, out_array = _shared_array(out_shape, result_spec[1])
+                future = executor.submit(_map_block, func, in_spec,
+                                         (out_shm.name, out_shape, np.dtype(result_spec[1]).str))
+                running[future] = (block, in_shm, out_shm, out_array)
+                del out_array
+
+                # Bounds the number of blocks waiting in shared memory.
+                if len(running) >= 2 * processes:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(future)
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future)
+    except BaseException:
+        for future in list(running):
+            future.cancel()
+            block, in_shm, out_shm, out_array = running.pop(future)
+            del out_array
+            for shm in [in_shm, out_shm]:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+        if writer is not None:
+            writer.close()
+        raise
+
+    if writer is None:
+        return None
+    return writer.close()
@@ -0,0 +1,174 @@
+"""Module for extracting fixed-size image chips around many points, such as for machine learning training sets. Nearby chips are grouped into shared requests, which are downloaded concurrently and cut into a single preallocated array.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import csv
+import math
+import os
+import ee
+from .blocks import _allocate, _fetch_blocks, band_dtype
+from .export import MAX_GRID_DIMENSION, MAX_REQUEST_BYTES, _band_bytes
+
+# A group of chips is split when the area of its window exceeds this multiple of the area of its chips.
+MAX_WASTE = 4
+
+
+def _query_points(image, points, scale=None, crs=None):
+    """Projects the points to the pixel grid of the chips on the server, with a single query.
+
+    Returns:
+        dict: The crs, the pixel size (x_res, y_res), the band_names and band_types of the image, the projected coordinates (xy) of the points and their ids.
+    """
+    if crs is None:
+        base = ee.Projection(image.projection().crs())
+    else:
+        base = ee.Projection(crs)
+    if scale is None:
+        scale = image.projection().nominalScale()
+
+    if isinstance(points, ee.FeatureCollection):
+        xy = points.map(lambda f: ee.Feature(None, {'xy': f.geometry().transform(
+            base, 1).coordinates()})).aggregate_array('xy')
+        ids = points.aggregate_array('system:index')
+    else:
+        if not isinstance(points, ee.Geometry):
+            points = ee.Geometry.MultiPoint(points)
+        xy = points.transform(base, 1).coordinates()
+        ids = None
+
+    query = {
+        'projection': base.atScale(scale),
+        'band_names': image.bandNames(),
+        'band_types': image.bandTypes(),
+        'xy': xy,
+    }
+    if ids is not None:
+        query['ids'] = ids
+    info = ee.Dictionary(query).getInfo()
+    info.setdefault('ids', None)
+    transform = info['projection']['transform']
+    info['crs'] = info['projection'].get('crs', info['projection'].get('wkt'))
+    info['x_res'] = abs(transform[0])
+    info['y_res'] = abs(transform[4])
+    if info['xy'] and not isinstance(info['xy'][0], list):
+        # A single point.
+        info['xy'] = [info['xy']]
+    return info
+
+
+def _group_chips(origins, size, max_side):
+    """Groups chips into windows of at most max_side pixels. Groups of chips that are far apart are split, so that little more than the chips is downloaded.
+
+    Args:
+        origins (list): The (col, row) of the upper-left pixel of each chip.
+        size (int): The size of the chips, in pixels.
+        max_side (int): The maximum width and height of a window, in pixels.
+
+    Returns:
+        list: The windows, as (col_off, row_off, width, height, indices) tuples.
+    """
+    step = max_side - size + 1
+    cells = {}
+    for index, (col, row) in enumerate(origins):
+        cells.setdefault((col // step, row // step), []).append(index)
+
+    windows = []
+
+    def split(indices):
+        cols = [origins[i][0] for i in indices]
+        rows = [origins[i][1] for i in indices]
+        col0, row0 = min(cols), min(rows)
+        width = max(cols) - col0 + size
+        height = max(rows) - row0 + size
+        if len(indices) == 1 or width * height <= MAX_WASTE * len(indices) * size * size:
+            windows.append((col0, row0, width, height, indices))
+            return
+        # Splits the window into quadrants around its center.
+        col_mid = col0 + (width - size) / 2.0
+        row_mid = row0 + (height - size) / 2.0
+        quadrants = {}
+        for i in indices:
+            key = (origins[i][0] > col_mid, origins[i][1] > row_mid)
+            quadrants.setdefault(key, []).append(i)
+        if len(quadrants) == 1:
+            # All chips are at the same position.
+            windows.append((col0, row0, width, height, indices))
+            return
+        for key in sorted(quadrants):
+            split(quadrants[key])
+
+    for key in sorted(cells):
+        split(cells[key])
+    return windows
+
+
+def read_chips(image, points, size=64, scale=None, crs=None, out=None, default_value=None, workers=4):
+    """Reads square chips of an image centered on points into a (point, y, x, band) numpy array. The points are projected on the server with a single query, nearby chips are grouped into shared requests, and the requests are downloaded concurrently as NPY files.
+
+    Args:
+        image (object): The ee.Image to read.
+        points (object): The points, as an ee.FeatureCollection, a MultiPoint ee.Geometry or a list of (lon, lat) coordinates.
+        size (int, optional): The width and height of the chips, in pixels. Defaults to 64.
+        scale (float, optional): The scale in meters. Defaults to the nominal scale of the image.
+        crs (str, optional): The CRS. Defaults to the CRS of the first band of the image.
+        out (str, optional): If given, the chips are stored in a numpy memmap in this .npy file, and the index in a .csv file with the same name. Defaults to None.
+        default_value (float, optional): A value for masked pixels. Defaults to None, which leaves the fill value of the server.
+        workers (int, optional): The number of requests to download concurrently. Defaults to 4.
+
+    Returns:
+        tuple: The (point, y, x, band) numpy array and the index of the chips, a list of dictionaries with the id of the point (for feature collections), its projected x and y, and the col_off, row_off, x0 and y0 of the upper-left corner of the chip on the pixel grid of the CRS.
+    """
+    import numpy as np
+
+    if default_value is not None:
+        image = image.unmask(default_value, False)
+    info = _query_points(image, points, scale, crs)
+    band_names = info['band_names']
+    band_types = info['band_types']
+    x_res, y_res = info['x_res'], info['y_res']
+
+    pixel_bytes = max(_band_bytes(band_types[band]) for band in band_names) * len(band_names)
+    max_side = min(int(math.sqrt(MAX_REQUEST_BYTES // pixel_bytes)), MAX_GRID_DIMENSION)
+    if size > max_side:
+        raise ValueError('Chips of {} x {} pixels exceed the request size limit.'.format(
+            size, size))
+
+    # The chips are snapped to the pixel grid of the CRS, like plan_export().
+    origins = [(int(math.floor(x / x_res)) - size // 2, int(math.floor(-y / y_res)) - size // 2)
+               for x, y in info['xy']]
+    index = []
+    for i, ((x, y), (col, row)) in enumerate(zip(info['xy'], origins)):
+        entry = {'index': i, 'x': x, 'y': y, 'col_off': col, 'row_off': row,
+                 'x0': col * x_res, 'y0': -row * y_res}
+        if info['ids'] is not None:
+            entry = dict(id=info['ids'][i], **entry)
+        index.append(entry)
+
+    dtypes = [band_dtype(band_types[band]) for band in band_names]
+    dtype = np.result_type(*dtypes)
+    if out is not None:
+        out = os.path.abspath(out)
+    chips = _allocate((len(origins), size, size, len(band_names)), dtype, out)
+
+    tiles = []
+    for col0, row0, width, height, indices in _group_chips(origins, size, max_side):
+        tiles.append({'col_off': col0, 'row_off': row0, 'width': width, 'height': height,
+                      'crs_transform': [x_res, 0, col0 * x_res, 0, -y_res, -row0 * y_res],
+                      'indices': indices})
+    plan = {'crs': info['crs'], 'tiles': tiles}
+    for tile, values in _fetch_blocks(image, plan, workers):
+        for i in tile['indices']:
+            rows = slice(origins[i][1] - tile['row_off'], origins[i][1] - tile['row_off'] + size)
+            cols = slice(origins[i][0] - tile['col_off'], origins[i][0] - tile['col_off'] + size)
+            for band_index, band in enumerate(band_names):
+                chips[i, :, :, band_index] = values[band][rows, cols]
+
+    if out is not None:
+        chips.flush()
+        with open(os.path.splitext(out)[0] + '.csv', 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(index[0]) if index else ['index'])
+            writer.writeheader()
+            writer.writerows(index)
+    return chips, index
@@ -3,14 +3,71 @@ import sys
 import click
 
 
-@click.command()
-def main(args=None):
+@click.group(invoke_without_command=True)
+@click.pass_context
+def main(ctx, args=None):
     """Console script for geemap."""
-    click.echo("Replace this message by putting your code into "
-               "geemap.cli.main")
-    click.echo("See click documentation at https://click.palletsprojects.com/")
+    if ctx.invoked_subcommand is None:
+        click.echo("Replace this message by putting your code into "
+                   "geemap.cli.main")
+        click.echo(
+            "See click documentation at https://click.palletsprojects.com/")
     return 0
 
 
+@main.group()
+@click.option('--db', default=None, help='Path of the job database. Defaults to ~/.geemap/jobs.db.')
+@click.pass_context
+def jobs(ctx, db):
+    """Manage the persistent export job queue."""
+    from .jobs import JobQueue
+
+    ctx.obj = JobQueue(db)
+
+
+@jobs.command('list')
+@click.option('--status', type=click.Choice(['pending', 'running', 'done', 'failed']), default=None, help='Only list jobs with this status.')
+@click.pass_obj
+def list_jobs(queue, status):
+    """List the jobs of the queue."""
+    for job in queue.list(status):
+        size = '' if job['bytes'] is None else '{:.1f} MB'.format(
+            job['bytes'] / 1024 ** 2)
+        click.echo('{:>5}  {:<16} {:<8} {:>2}  {:>10}  {}'.format(
+            job['id'], job['kind'], job['status'], job['attempts'], size, job['output']))
+        if job['error'] and job['status'] == 'failed':
+            click.echo('       {}'.format(job['error']))
+
+
+@jobs.command('run')
+@click.option('--workers', default=2, show_default=True, help='Number of jobs to run concurrently.')
+@click.option('--retries', default=2, show_default=True, help='Number of times to retry a failed job.')
+@click.option('--retry-delay', default=5.0, show_default=True, help='Delay before the first retry, in seconds.')
+@click.pass_obj
+def run_jobs(queue, workers, retries, retry_delay):
+    """Run the pending jobs, including jobs interrupted by a crash."""
+    summary = queue.run(workers=workers, retries=retries,
+                        retry_delay=retry_delay)
+    if summary['failed']:
+        sys.exit(1)
+
+
+@jobs.command('retry')
+@click.argument('job_ids', nargs=-1, type=int)
+@click.pass_obj
+def retry_jobs(queue, job_ids):
+    """Mark failed jobs as pending (all failed jobs if no JOB_IDS are given)."""
+    click.echo('{} jobs marked as pending.'.format(queue.retry(job_ids)))
+
+
+@jobs.command('clear')
+@click.option('--status', type=click.Choice(['pending', 'done', 'failed', 'all']), default='done', show_default=True, help='Status of the jobs to remove.')
+@click.pass_obj
+def clear_jobs(queue, status):
+    """Remove jobs from the queue."""
+    count = queue.clear(None if status == 'all' else status)
+    click.echo('{} jobs removed.'.format(count))
+
+
 if __name__ == "__main__":
     sys.exit(main())  # pragma: no cover
@@ -0,0 +1,76 @@
+"""Module for Earth Engine helper functions shared by the ipyleaflet (geemap) and folium (eefolium) maps.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import threading
+from collections import OrderedDict
+import ee
+
+_bounds_cache = OrderedDict()
+_bounds_cache_lock = threading.Lock()
+_bounds_cache_size = 256
+
+
+def ee_object_bounds(ee_object, max_error=100):
+    """Computes the bounding box of an Earth Engine object on the server, so that only the four corner coordinates are downloaded. Results are cached per object.
+
+    Args:
+        ee_object (object): An ee.Geometry, ee.Feature, ee.Image, ee.FeatureCollection or ee.ImageCollection.
+        max_error (float, optional): The maximum error in meters tolerated when computing the bounds. Defaults to 100.
+
+    Returns:
+        list: The bounds as [[south, west], [north, east]], or None if the object is empty.
+    """
+    key = (ee_object.serialize(), max_error)
+    with _bounds_cache_lock:
+        if key in _bounds_cache:
+            _bounds_cache.move_to_end(key)
+            return _bounds_cache[key]
+
+    if isinstance(ee_object, ee.geometry.Geometry):
+        coordinates = ee_object.bounds(max_error).coordinates().getInfo()
+        bounds = _ring_to_bounds(coordinates)
+    elif isinstance(ee_object, ee.feature.Feature) or isinstance(ee_object, ee.image.Image):
+        coordinates = ee_object.geometry(
+            max_error).bounds(max_error).coordinates().getInfo()
+        bounds = _ring_to_bounds(coordinates)
+    elif isinstance(ee_object, ee.featurecollection.FeatureCollection) or isinstance(ee_object, ee.imagecollection.ImageCollection):
+        # Reduces the per-element bounding boxes in parallel instead of merging all footprints into a single geometry.
+        def set_bbox(element):
+            ring = ee.List(element.geometry(max_error).bounds(
+                max_error).coordinates().get(0))
+            lower_left = ee.List(ring.get(0))
+            upper_right = ee.List(ring.get(2))
+            return element.set({'_west': lower_left.get(0), '_south': lower_left.get(1),
+                                '_east': upper_right.get(0), '_north': upper_right.get(1)})
+
+        reducer = ee.Reducer.min().repeat(2).combine(ee.Reducer.max().repeat(2))
+        result = ee_object.map(set_bbox).reduceColumns(
+            reducer, ['_west', '_south', '_east', '_north']).getInfo()
+        if not result.get('min') or result['min'][0] is None:
+            bounds = None
+        else:
+            (west, south), (east, north) = result['min'], result['max']
+            bounds = [[south, west], [north, east]]
+    else:
+        raise TypeError(
+            'The ee_object must be an ee.Geometry, ee.Feature, ee.Image, ee.FeatureCollection or ee.ImageCollection.')
+
+    with _bounds_cache_lock:
+        _bounds_cache[key] = bounds
+        if len(_bounds_cache) > _bounds_cache_size:
+            _bounds_cache.popitem(last=False)
+    return bounds
+
+
+def _ring_to_bounds(coordinates):
+    """Converts the coordinates of a bounding rectangle to [[south, west], [north, east]].
+    """
+    if not coordinates:
+        return None
+    ring = coordinates[0]
+    xs = [c[0] for c in ring]
+    ys = [c[1] for c in ring]
+    return [[min(ys), min(xs)], [max(ys), max(xs)]]
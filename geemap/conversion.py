@@ -21,7 +21,6 @@ import shutil
 import string
 import subprocess
 import tarfile
-import urllib.request
 import zipfile
 from collections import deque
 from pathlib import Path
@@ -622,6 +621,8 @@ def get_nb_template(download_latest=False, out_file=None):
     Returns:
         str: The file path of the template.
     """
+    from .download import download_file
+
     pkg_dir = os.path.dirname(
         pkg_resources.resource_filename("geemap", "geemap.py"))
     example_dir = os.path.join(pkg_dir, 'data')
@@ -641,7 +642,7 @@ def get_nb_template(download_latest=False, out_file=None):
     if download_latest:
         template_url = 'https://raw.githubusercontent.com/giswqs/geemap/master/examples/template/template.py'
         print("Downloading the latest notebook template from {}".format(template_url))
-        urllib.request.urlretrieve(template_url, out_file)
+        download_file(template_url, out_file)
     elif out_file is not None:
         shutil.copyfile(template_file, out_file)
 
@@ -912,6 +913,8 @@ def download_from_url(url, out_file_name=None, out_dir='.', unzip=True):
         out_dir (str, optional): The output directory to use. Defaults to '.'.
         unzip (bool, optional): Whether to unzip the downloaded file if it is a zip file. Defaults to True.
     """
+    from .download import download_file
+
     in_file_name = os.path.basename(url)
 
     if out_file_name is None:
@@ -921,7 +924,7 @@ def download_from_url(url, out_file_name=None, out_dir='.', unzip=True):
     print('Downloading {} ...'.format(in_file_name))
 
     try:
-        urllib.request.urlretrieve(url, out_file_path)
+        download_file(url, out_file_path)
     except:
         print("The URL is invalid. Please double check the URL.")
         return
@@ -955,6 +958,8 @@ def download_gee_app(url, out_file=None):
         url (str): The URL of the GEE App.
         out_file (str, optional): The output file path for the downloaded JavaScript. Defaults to None.
     """
+    from .download import download_file
+
     cwd = os.getcwd()
     out_file_name = os.path.basename(url) + '.js'
     out_file_path = os.path.join(cwd, out_file_name)
@@ -976,7 +981,7 @@ def download_gee_app(url, out_file=None):
     json_path = out_file_path + 'on'
 
     try:
-        urllib.request.urlretrieve(json_url, json_path)
+        download_file(json_url, json_path)
     except:
         print("The URL is invalid. Please double check the URL.")
         return
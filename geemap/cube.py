@@ -0,0 +1,285 @@
+"""Module for storing the images of an Earth Engine image collection as a local (time, band, y, x) data cube. The cube is a directory with a meta.json file and a compressed .npz file per chunk, which are downloaded concurrently and can be read back lazily by slicing.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .blocks import _fetch_block, _plan_read
+
+META_FILE = 'meta.json'
+
+
+def _chunk_name(t, y, x):
+    return '{}.{}.{}.npz'.format(t, y, x)
+
+
+def _collection_info(collection):
+    """Returns the system:index and the acquisition date of each image of a collection, with a single server query."""
+    import datetime
+    import ee
+
+    info = ee.Dictionary({
+        'ids': collection.aggregate_array('system:index'),
+        'times': collection.aggregate_array('system:time_start'),
+        'bands': ee.Image(collection.first()).bandNames(),
+    }).getInfo()
+    ids = info['ids']
+    # Images without a system:time_start are skipped by aggregate_array.
+    if len(info['times']) == len(ids):
+        dates = [datetime.datetime.fromtimestamp(t / 1000.0, datetime.timezone.utc).isoformat()
+                 for t in info['times']]
+    else:
+        dates = [None] * len(ids)
+    return ids, dates, info['bands']
+
+
+def _time_group(collection, ids):
+    """Stacks the images of a collection with the given system:index into a single image with toBands(). Filtering by system:index does not make the server walk the images before them, unlike toList() with an offset."""
+    import ee
+
+    return collection.filter(ee.Filter.inList('system:index', ids)).toBands()
+
+
+def _write_chunk(image, block, crs, path, shape, dtype):
+    """Downloads a chunk of all images of a time step group and saves it as a compressed .npz file.
+
+    Returns:
+        int: The size of the chunk file, in bytes.
+    """
+    import numpy as np
+
+    values = _fetch_block(image, block, crs)
+    data = np.empty(shape, dtype=dtype)
+    bands = shape[1]
+    # The bands of toBands() are ordered by image, then by band.
+    for index, name in enumerate(values.dtype.names):
+        data[index // bands, index % bands] = values[name]
+    tmp = path + '.part'
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(f, data=data)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def write_cube(collection, path, region=None, scale=None, crs=None, chunks=(1, 256, 256), default_value=None, workers=4, verbose=True):
+    """Downloads the images of an image collection into a chunked data cube stored in a directory. Chunks that already exist are skipped, so an interrupted download can be resumed by calling write_cube() again with the same arguments.
+
+    Args:
+        collection (object): The ee.ImageCollection to download. All images must have the same bands.
+        path (str): The directory of the cube.
+        region (object, optional): The region to download. Defaults to the footprint of the first image.
+        scale (float, optional): The scale in meters. Defaults to the nominal scale of the first image.
+        crs (str, optional): The CRS. Defaults to the CRS of the first image.
+        chunks (tuple, optional): The (time, height, width) of the chunks. Each chunk is a single request, so it must fit the request size limit. Defaults to (1, 256, 256).
+        default_value (float, optional): A value for masked pixels. Defaults to None, which leaves the fill value of the server.
+        workers (int, optional): The number of chunks to download concurrently. Defaults to 4.
+        verbose (bool, optional): Whether to print the progress. Defaults to True.
+
+    Returns:
+        Cube: The cube.
+    """
+    import ee
+
+    ids, dates, bands = _collection_info(collection)
+    if not ids:
+        raise ValueError('The image collection is empty.')
+    time_chunk = chunks[0]
+    first = _time_group(collection, ids[:time_chunk])
+    if region is None:
+        region = ee.Image(collection.first()).geometry()
+    if scale is None:
+        scale = ee.Image(collection.first()).projection().nominalScale()
+    _, plan, _, _, dtype = _plan_read(first, region, scale, crs, default_value,
+                                      tile_shape=tuple(chunks[1:]))
+
+    meta = {
+        'shape': [len(ids), len(bands), plan['height'], plan['width']],
+        'chunks': list(chunks),
+        'dtype': dtype.str,
+        'ids': ids,
+        'dates': dates,
+        'bands': bands,
+        'crs': plan['crs'],
+        'crs_transform': plan['crs_transform'],
+        'fill_value': 0 if default_value is None else default_value,
+    }
+    meta_file = os.path.join(path, META_FILE)
+    if os.path.exists(meta_file):
+        with open(meta_file) as f:
+            existing = json.load(f)
+        for key in ['shape', 'chunks', 'dtype', 'ids', 'bands', 'crs_transform']:
+            if existing[key] != meta[key]:
+                raise ValueError('A different cube already exists at {} ({} do not match).'.format(
+                    path, key))
+    else:
+        if not os.path.exists(path):
+            os.makedirs(path)
+        with open(meta_file, 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    tasks = []
+    for t, offset in enumerate(range(0, len(ids), time_chunk)):
+        count = min(time_chunk, len(ids) - offset)
+        group = None
+        for block in plan['tiles']:
+            filename = os.path.join(path, _chunk_name(
+                t, block['row_off'] // chunks[1], block['col_off'] // chunks[2]))
+            if os.path.exists(filename):
+                continue
+            if group is None:
+                group = _time_group(collection, ids[offset:offset + count])
+                if default_value is not None:
+                    group = group.unmask(default_value, False)
+            shape = (count, len(bands), block['height'], block['width'])
+            tasks.append((group, block, filename, shape))
+
+    total = len(plan['tiles']) * len(range(0, len(ids), time_chunk))
+    if verbose:
+        print('Downloading {} of {} chunks ...'.format(len(tasks), total))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_write_chunk, group, block, plan['crs'], filename, shape, dtype)
+                   for group, block, filename, shape in tasks]
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if verbose:
+                    print('Downloaded {} of {} chunks'.format(
+                        done, len(tasks)), end='\r')
+        finally:
+            for future in futures:
+                future.cancel()
+    if verbose and tasks:
+        print()
+
+    return Cube(path)
+
+
+class Cube(object):
+    """A (time, band, y, x) data cube stored by write_cube(). Slicing a cube reads only the chunks that intersect the slice, and returns a numpy array. Chunks that have not been downloaded are filled with the fill value.
+
+    Args:
+        path (str): The directory of the cube.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.shape = tuple(meta['shape'])
+        self.chunks = tuple(meta['chunks'])
+        self.dtype = np.dtype(meta['dtype'])
+        self.ids = meta['ids']
+        self.dates = meta['dates']
+        self.bands = meta['bands']
+        self.crs = meta['crs']
+        self.crs_transform = meta['crs_transform']
+        self.fill_value = meta['fill_value']
+
+    @property
+    def ndim(self):
+        return 4
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return 'Cube({!r}, shape={}, dtype={})'.format(self.path, self.shape, self.dtype)
+
+    def _chunk_grid(self):
+        return [-(-size // chunk) for size, chunk in zip(self.shape[:1] + self.shape[2:], self.chunks)]
+
+    @property
+    def missing(self):
+        """The (time, y, x) indices of the chunks that have not been downloaded."""
+        import itertools
+
+        return [index for index in itertools.product(*[range(n) for n in self._chunk_grid()])
+                if not os.path.exists(os.path.join(self.path, _chunk_name(*index)))]
+
+    def _read_chunk(self, t, y, x):
+        import numpy as np
+
+        filename = os.path.join(self.path, _chunk_name(t, y, x))
+        if not os.path.exists(filename):
+            return None
+        with np.load(filename) as f:
+            return f['data']
+
+    def __getitem__(self, key):
+        import numpy as np
+
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            index = key.index(Ellipsis)
+            key = key[:index] + (slice(None),) * (4 - len(key) + 1) + key[index + 1:]
+        if len(key) > 4:
+            raise IndexError('Too many indices for a 4-dimensional cube.')
+        key = key + (slice(None),) * (4 - len(key))
+
+        slices = []
+        squeeze = []
+        for axis, k in enumerate(key):
+            size = self.shape[axis]
+            if isinstance(k, slice):
+                slices.append(k.indices(size))
+            elif isinstance(k, (int, np.integer)):
+                if not -size <= k < size:
+                    raise IndexError('Index {} is out of bounds for axis {} with size {}.'.format(
+                        k, axis, size))
+                k = int(k) % size
+                slices.append((k, k + 1, 1))
+                squeeze.append(axis)
+            else:
+                raise TypeError('Cubes can only be indexed with integers and slices.')
+
+        # Reads the bounding range of each axis, then applies the steps.
+        ranges = [(start, stop) if step > 0 else (stop + 1, start + 1)
+                  for start, stop, step in slices]
+        ranges = [(start, max(start, stop)) for start, stop in ranges]
+        out = np.full([stop - start for start, stop in ranges],
+                      self.fill_value, dtype=self.dtype)
+
+        (t0, t1), bands, (y0, y1), (x0, x1) = ranges
+        tc, yc, xc = self.chunks
+        for t in range(t0 // tc, -(-t1 // tc)):
+            for y in range(y0 // yc, -(-y1 // yc)):
+                for x in range(x0 // xc, -(-x1 // xc)):
+                    data = self._read_chunk(t, y, x)
+                    if data is None:
+                        continue
+                    # The window of the chunk that intersects the slice, in cube coordinates.
+                    ts = slice(max(t0, t * tc), min(t1, t * tc + data.shape[0]))
+                    ys = slice(max(y0, y * yc), min(y1, y * yc + data.shape[2]))
+                    xs = slice(max(x0, x * xc), min(x1, x * xc + data.shape[3]))
+                    out[ts.start - t0:ts.stop - t0, :, ys.start - y0:ys.stop - y0, xs.start - x0:xs.stop - x0] = \
+                        data[ts.start - t * tc:ts.stop - t * tc, bands[0]:bands[1],
+                             ys.start - y * yc:ys.stop - y * yc, xs.start - x * xc:xs.stop - x * xc]
+
+        out = out[tuple(slice(None, None, step) for _, _, step in slices)]
+        if squeeze:
+            out = out.squeeze(axis=tuple(squeeze))
+        return out
+
+    def __array__(self, dtype=None):
+        array = self[...]
+        if dtype is not None:
+            array = array.astype(dtype)
+        return array
+
+
+def open_cube(path):
+    """Opens a data cube stored by ee_to_cube().
+
+    Args:
+        path (str): The directory of the cube.
+
+    Returns:
+        Cube: The cube.
+    """
+    return Cube(path)
@@ -0,0 +1,498 @@
+"""Module for downloading files over HTTP through a shared session with connection pooling and retries. Downloads are written to a .part file, resumed with HTTP Range requests after interruptions, verified, and then renamed to the output file.
+Zip files can also be extracted while they are being downloaded, without writing the zip file to disk first.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+import zipfile
+import zlib
+
+# The options of the shared session, which can be changed with configure_session().
+_session_options = {
+    'pool_size': 10,
+    'retries': 5,
+    'backoff_factor': 0.5,
+    'backoff_jitter': 0.5,
+    'timeout': 60,
+    'headers': {},
+}
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+
+def configure_session(pool_size=None, retries=None, backoff_factor=None, backoff_jitter=None, timeout=None, headers=None):
+    """Configures the HTTP session shared by all downloads and tile requests of geemap.
+
+    Args:
+        pool_size (int, optional): The minimum number of connections to keep per host. The pool grows to the number of workers of concurrent downloads. Defaults to None.
+        retries (int, optional): The number of times to retry a request after a connection error or a 429 or 5xx response. Defaults to None.
+        backoff_factor (float, optional): The base of the exponential backoff between retries, in seconds. Defaults to None.
+        backoff_jitter (float, optional): The maximum random delay added to each backoff, in seconds. Defaults to None.
+        timeout (float, optional): The default timeout of the connection and of each read, in seconds. Defaults to None.
+        headers (dict, optional): Headers to send with every request, such as a User-Agent. Defaults to None.
+    """
+    global _session_pool_size
+
+    options = {'pool_size': pool_size, 'retries': retries, 'backoff_factor': backoff_factor,
+               'backoff_jitter': backoff_jitter, 'timeout': timeout}
+    with _session_lock:
+        _session_options.update(
+            {key: value for key, value in options.items() if value is not None})
+        if headers:
+            _session_options['headers'].update(headers)
+        if _session is not None:
+            _session.headers.update(_session_options['headers'])
+        # The adapters are mounted again with the new options on the next get_session() call.
+        _session_pool_size = 0
+
+
+def _mount_adapters(session, pool_size):
+    import requests
+    from urllib3.util.retry import Retry
+
+    retry_options = dict(
+        total=_session_options['retries'],
+        backoff_factor=_session_options['backoff_factor'],
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    try:
+        retry = Retry(
+            backoff_jitter=_session_options['backoff_jitter'], **retry_options)
+    except TypeError:
+        # urllib3 < 2 has no jitter.
+        retry = Retry(**retry_options)
+
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+
+def get_session(pool_size=None):
+    """Returns the HTTP session shared by all downloads and tile requests of geemap, so that connections are reused. Requests are retried with exponential backoff and jitter after connection errors and 429 or 5xx responses.
+
+    Args:
+        pool_size (int, optional): The number of concurrent requests the session should support, such as the number of workers. The connection pool only grows. Defaults to None.
+
+    Returns:
+        object: A requests.Session.
+    """
+    import requests
+
+    global _session, _session_pool_size
+
+    pool_size = max(pool_size or 0, _session_options['pool_size'])
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(_session_options['headers'])
+        if pool_size > _session_pool_size:
+            _mount_adapters(_session, pool_size)
+            _session_pool_size = pool_size
+        return _session
+
+
+def get_timeout(timeout=None):
+    """Returns timeout, or the default timeout of the shared session if it is None."""
+    return _session_options['timeout'] if timeout is None else timeout
+
+
+def _file_checksum(filename, algorithm, chunk_size=1024 * 1024):
+    digest = hashlib.new(algorithm)
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _parse_content_range(value):
+    """Parses a Content-Range header such as 'bytes 100-199/1000'. Returns (start, total), where total is None if unknown.
+    """
+    match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', value or '')
+    if match is None:
+        return None, None
+    total = match.group(2)
+    return int(match.group(1)), (None if total == '*' else int(total))
+
+
+def download_file(url, filename, checksum=None, resume=True, retries=3, chunk_size=1024 * 1024, timeout=None, session=None):
+    """Downloads a file from a URL. The data are written to filename.part, which is resumed with an HTTP Range request if the download is interrupted and the server supports it. Once complete, the length (and optionally the checksum) is verified and the file is renamed to filename.
+
+    Args:
+        url (str): The HTTP URL to download.
+        filename (str): The output file path.
+        checksum (str, optional): The expected checksum as 'algorithm:hexdigest', such as 'md5:9e107d9d372bb6826bd81d3542a419d6'. Defaults to None.
+        resume (bool, optional): Whether to resume from an existing .part file. Defaults to True.
+        retries (int, optional): The number of times to resume the download after a network error. Defaults to 3.
+        chunk_size (int, optional): The size of the chunks to read and write, in bytes. Defaults to 1 MB.
+        timeout (float, optional): The timeout of the connection and of each read, in seconds. Defaults to None, which uses the timeout of the shared session.
+        session (object, optional): The requests session to use. Defaults to None, which uses the shared session.
+
+    Returns:
+        str: The path of the downloaded file.
+    """
+    import requests
+
+    if session is None:
+        session = get_session()
+    timeout = get_timeout(timeout)
+
+    filename = os.path.abspath(filename)
+    out_dir = os.path.dirname(filename)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    part_file = filename + '.part'
+    meta_file = part_file + '.json'
+
+    if resume and os.path.exists(part_file):
+        # A .part file left by an earlier call is only resumed if it comes from the same URL and can be validated with If-Range. Otherwise, the range could be appended to a different file.
+        meta = {}
+        if os.path.exists(meta_file):
+            with open(meta_file) as f:
+                meta = json.load(f)
+        if meta.get('url') != url or not meta.get('validator'):
+            resume = False
+
+    if not resume:
+        for f in [part_file, meta_file]:
+            if os.path.exists(f):
+                os.remove(f)
+
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        validator = None
+        if offset > 0 and os.path.exists(meta_file):
+            with open(meta_file) as f:
+                validator = json.load(f).get('validator')
+
+        # Asks for the raw bytes, so that lengths and offsets refer to the file itself.
+        headers = {'Accept-Encoding': 'identity'}
+        if offset > 0:
+            headers['Range'] = 'bytes={}-'.format(offset)
+            if validator:
+                headers['If-Range'] = validator
+
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+                if r.status_code == 416 and offset > 0:
+                    # The .part file may already be complete, with the size given as 'bytes */total'.
+                    match = re.search(r'/(\d+)$', r.headers.get('Content-Range', ''))
+                    if match is not None and int(match.group(1)) == offset:
+                        break
+                    os.remove(part_file)
+                    continue
+
+                if r.status_code == 206:
+                    start, total = _parse_content_range(
+                        r.headers.get('Content-Range'))
+                    if start != offset:
+                        raise IOError(
+                            'The server returned an unexpected range: {}'.format(r.headers.get('Content-Range')))
+                    mode = 'ab'
+                elif r.status_code == 200:
+                    # The server does not support ranges or the file has changed, so the download starts over.
+                    offset = 0
+                    total = r.headers.get('Content-Length')
+                    total = int(total) if total is not None else None
+                    mode = 'wb'
+                else:
+                    raise requests.HTTPError('An error occurred while downloading {} (HTTP {}): {}'.format(
+                        url, r.status_code, r.text[:1000]), response=r)
+
+                validator = r.headers.get('ETag') or r.headers.get('Last-Modified')
+                with open(meta_file, 'w') as f:
+                    json.dump({'url': url, 'validator': validator}, f)
+
+                with open(part_file, mode) as fd:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        fd.write(chunk)
+
+            size = os.path.getsize(part_file)
+            if total is not None and size != total:
+                raise IOError(
+                    'Incomplete download: received {} of {} bytes.'.format(size, total))
+            break
+
+        except IOError as e:
+            # Network errors and incomplete reads are retried from the end of the .part file.
+            if isinstance(e, requests.HTTPError):
+                raise
+            attempt += 1
+            if attempt > retries:
+                raise
+            if not resume and os.path.exists(part_file):
+                os.remove(part_file)
+
+    if checksum is not None:
+        algorithm, expected = checksum.split(':', 1)
+        actual = _file_checksum(part_file, algorithm.lower())
+        if actual.lower() != expected.lower():
+            for f in [part_file, meta_file]:
+                if os.path.exists(f):
+                    os.remove(f)
+            raise IOError('Checksum mismatch for {}: expected {}, got {}.'.format(
+                filename, expected, actual))
+
+    os.replace(part_file, filename)
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+    return filename
+
+
+class _StreamingNotSupported(Exception):
+    """Raised when a zip file cannot be extracted in a single pass, such as stored members with unknown sizes."""
+
+
+class _InvalidZip(IOError):
+    """Raised when the data of a zip file are invalid, such as a failed CRC check. Unlike a truncated download, downloading the same file again does not help."""
+
+
+class _ByteStream(object):
+    """A buffered reader over an iterator of byte chunks, with support for pushing back data that was read too far."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def read(self, size):
+        """Reads exactly size bytes, or fewer at the end of the stream."""
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def read_some(self, size):
+        """Reads at most size bytes, returning an empty string at the end of the stream."""
+        if not self._buffer:
+            self._buffer = next(self._chunks, b'')
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def unread(self, data):
+        self._buffer = data + self._buffer
+
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+_END_SIGNATURES = [b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06']
+
+
+def _zip64_sizes(extra, csize, usize):
+    """Reads the sizes of a member from its zip64 extra field, if present."""
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, size = struct.unpack('<2H', extra[offset:offset + 4])
+        if header_id == 1:
+            values = extra[offset + 4:offset + 4 + size]
+            position = 0
+            if usize == 0xFFFFFFFF:
+                usize = struct.unpack('<Q', values[position:position + 8])[0]
+                position += 8
+            if csize == 0xFFFFFFFF:
+                csize = struct.unpack('<Q', values[position:position + 8])[0]
+            return csize, usize, True
+        offset += 4 + size
+    return csize, usize, False
+
+
+def _member_path(out_dir, name):
+    """Returns the output path of a zip member, refusing names that would be written outside out_dir."""
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+    if not parts or '..' in parts or ':' in parts[0]:
+        raise _InvalidZip('Unsafe member name in zip file: {}'.format(name))
+    return os.path.join(out_dir, *parts)
+
+
+def _selected(name, members):
+    return members is None or any(fnmatch.fnmatch(name, m) for m in members)
+
+
+def _extract_zip_stream(stream, out_dir, members):
+    """Extracts the members of a zip file in a single pass over its local file headers.
+
+    Returns:
+        list: The names of the extracted members.
+    """
+    extracted = []
+    while True:
+        signature = stream.read(4)
+        if not signature or signature in _END_SIGNATURES:
+            return extracted
+        if signature != _LOCAL_SIGNATURE:
+            raise _InvalidZip('The response is not a valid zip file.')
+
+        header = signature + stream.read(_LOCAL_HEADER.size - 4)
+        if len(header) < _LOCAL_HEADER.size:
+            raise IOError('The zip file is truncated.')
+        (_, _, flags, method, _, _, crc, csize, usize,
+         name_length, extra_length) = _LOCAL_HEADER.unpack(header)
+        name = stream.read(name_length).decode(
+            'utf-8' if flags & 0x800 else 'cp437')
+        extra = stream.read(extra_length)
+        csize, usize, zip64 = _zip64_sizes(extra, csize, usize)
+        has_descriptor = bool(flags & 0x08)
+
+        if flags & 0x01:
+            raise _StreamingNotSupported('Encrypted member: {}'.format(name))
+        if method not in (0, 8):
+            raise _StreamingNotSupported(
+                'Unsupported compression method {} for {}'.format(method, name))
+        if method == 0 and has_descriptor:
+            raise _StreamingNotSupported(
+                'Stored member with unknown size: {}'.format(name))
+
+        selected = _selected(name, members)
+        if selected and name.endswith('/'):
+            path = _member_path(out_dir, name)
+            if not os.path.exists(path):
+                os.makedirs(path)
+            selected = False
+
+        if not selected and not has_descriptor:
+            # The member is skipped without decompressing it.
+            remaining = csize
+            while remaining > 0:
+                data = stream.read_some(min(remaining, 1024 * 1024))
+                if not data:
+                    raise IOError('The zip file is truncated.')
+                remaining -= len(data)
+            continue
+
+        fd = None
+        if selected:
+            path = _member_path(out_dir, name)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            fd = open(path + '.part', 'wb')
+
+        try:
+            actual_crc = 0
+            if method == 0:
+                remaining = csize
+                while remaining > 0:
+                    data = stream.read_some(min(remaining, 1024 * 1024))
+                    if not data:
+                        raise IOError('The zip file is truncated.')
+                    remaining -= len(data)
+                    actual_crc = zlib.crc32(data, actual_crc)
+                    fd.write(data)
+            else:
+                decompressor = zlib.decompressobj(-15)
+                while not decompressor.eof:
+                    data = stream.read_some(1024 * 1024)
+                    if not data:
+                        raise IOError('The zip file is truncated.')
+                    try:
+                        data = decompressor.decompress(data)
+                    except zlib.error as e:
+                        raise _InvalidZip(
+                            'Invalid compressed data for {}: {}'.format(name, e))
+                    actual_crc = zlib.crc32(data, actual_crc)
+                    if fd is not None:
+                        fd.write(data)
+                stream.unread(decompressor.unused_data)
+
+            if has_descriptor:
+                size_length = 8 if zip64 else 4
+                descriptor = stream.read(4)
+                if descriptor == _DESCRIPTOR_SIGNATURE:
+                    descriptor = stream.read(4)
+                crc = struct.unpack('<L', descriptor)[0]
+                stream.read(2 * size_length)
+        except BaseException:
+            if fd is not None:
+                fd.close()
+                os.remove(path + '.part')
+            raise
+
+        if fd is not None:
+            fd.close()
+            if actual_crc != crc:
+                os.remove(path + '.part')
+                raise _InvalidZip('CRC check failed for {}.'.format(name))
+            os.replace(path + '.part', path)
+            extracted.append(name)
+
+
+def extract_zip_url(url, out_dir, members=None, retries=3, chunk_size=1024 * 1024, timeout=None, spool_size=32 * 1024 * 1024, session=None):
+    """Downloads a zip file and extracts it while it is being received, so that the zip file itself is never written to disk. Zip files that cannot be read in a single pass are downloaded into a spooled buffer, which is kept in memory up to spool_size bytes, and extracted from there.
+
+    Args:
+        url (str): The HTTP URL of the zip file.
+        out_dir (str): The directory to extract the members to.
+        members (list, optional): The names or glob patterns of the members to extract, such as ['*.tif']. Defaults to None, which extracts all members.
+        retries (int, optional): The number of times to restart the download after a network error. Defaults to 3.
+        chunk_size (int, optional): The size of the chunks to read, in bytes. Defaults to 1 MB.
+        timeout (float, optional): The timeout of the connection and of each read, in seconds. Defaults to None, which uses the timeout of the shared session.
+        spool_size (int, optional): The size of the in-memory buffer used when the zip file cannot be streamed, in bytes. Defaults to 32 MB.
+        session (object, optional): The requests session to use. Defaults to None, which uses the shared session.
+
+    Returns:
+        list: The names of the extracted members.
+    """
+    import requests
+
+    if session is None:
+        session = get_session()
+    timeout = get_timeout(timeout)
+
+    out_dir = os.path.abspath(out_dir)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    def get():
+        r = session.get(url, headers={'Accept-Encoding': 'identity'},
+                        stream=True, timeout=timeout)
+        if r.status_code != 200:
+            # The body holds the error message, so it is read before the connection is closed.
+            message = r.text[:1000]
+            r.close()
+            raise requests.HTTPError('An error occurred while downloading {} (HTTP {}): {}'.format(
+                url, r.status_code, message), response=r)
+        return r
+
+    streaming = True
+    attempt = 0
+    while True:
+        try:
+            with get() as r:
+                if streaming:
+                    stream = _ByteStream(r.iter_content(chunk_size=chunk_size))
+                    return _extract_zip_stream(stream, out_dir, members)
+
+                with tempfile.SpooledTemporaryFile(max_size=spool_size, dir=out_dir) as spool:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        spool.write(chunk)
+                    with zipfile.ZipFile(spool) as z:
+                        names = [n for n in z.namelist()
+                                 if _selected(n, members)]
+                        z.extractall(out_dir, names)
+                    return names
+
+        except _StreamingNotSupported:
+            streaming = False
+        except (requests.HTTPError, _InvalidZip, zipfile.BadZipFile):
+            # Invalid zip files and HTTP errors are not retried, only network errors and truncated downloads.
+            raise
+        except IOError:
+            attempt += 1
+            if attempt > retries:
+                raise
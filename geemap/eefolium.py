@@ -5,6 +5,7 @@ import ee
 import folium
 import os
 from folium import plugins
+from .common import ee_object_bounds
 
 
 # More WMS basemaps can be found at https://viewer.nationalmap.gov/services/
@@ -291,27 +292,15 @@ class Map(folium.Map):
             ee_object (Element|Geometry): An Earth Engine object to center on - a geometry, image or feature.
             zoom (int, optional): The zoom level, from 1 to 24. Defaults to 10.
         """
-        lat = 0
-        lon = 0
-        bounds = [[lat, lon], [lat, lon]]
-        if isinstance(ee_object, ee.geometry.Geometry):
-            centroid = ee_object.centroid()
-            lon, lat = centroid.getInfo()['coordinates']
-            bounds = [[lat, lon], [lat, lon]]
-        elif isinstance(ee_object, ee.featurecollection.FeatureCollection):
-            centroid = ee_object.geometry().centroid()
-            lon, lat = centroid.getInfo()['coordinates']
-            bounds = [[lat, lon], [lat, lon]]
-        elif isinstance(ee_object, ee.image.Image):
-            geometry = ee_object.geometry()
-            coordinates = geometry.getInfo()['coordinates'][0]
-            bounds = [coordinates[0][::-1], coordinates[2][::-1]]
-        elif isinstance(ee_object, ee.imagecollection.ImageCollection):
-            geometry = ee_object.geometry()
-            coordinates = geometry.getInfo()['coordinates'][0]
-            bounds = [coordinates[0][::-1], coordinates[2][::-1]]
-        else:
-            bounds = [[0, 0], [0, 0]]
+        try:
+            bounds = ee_object_bounds(ee_object)
+        except Exception as e:
+            print(e)
+            return
+
+        if bounds is None:
+            print('The ee_object is empty.')
+            return
 
         self.fit_bounds(bounds, max_zoom=zoom)
 
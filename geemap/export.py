@@ -0,0 +1,727 @@
+"""Module for downloading large Earth Engine images by splitting the export region into a grid of tiles that fit the request size limits of getDownloadURL.
+The tiles are downloaded concurrently and mosaicked into a single GeoTIFF (or one GeoTIFF per band).
+Large feature collections are likewise downloaded as pages of features, which are appended in order to a single file as they arrive.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import ee
+
+# The maximum request size and grid dimension allowed by getDownloadURL.
+MAX_REQUEST_BYTES = 33554432
+MAX_GRID_DIMENSION = 10000
+
+
+def _band_bytes(band_type):
+    """Returns the number of bytes per pixel of an Earth Engine PixelType dictionary.
+    """
+    precision = band_type.get('precision')
+    if precision == 'double':
+        return 8
+    elif precision == 'float':
+        return 4
+    min_value = band_type.get('min', 0)
+    max_value = band_type.get('max', 0)
+    if min_value is None or max_value is None:
+        return 8
+    for size in [1, 2, 4]:
+        bits = 8 * size
+        if min_value >= 0 and max_value < 2 ** bits:
+            return size
+        if min_value >= -2 ** (bits - 1) and max_value < 2 ** (bits - 1):
+            return size
+    return 8
+
+
+def _tile_grid(width, height, tile_pixels):
+    """Returns the (columns, rows) of the grid with the fewest tiles of at most tile_pixels pixels and MAX_GRID_DIMENSION pixels per side. Square tiles are preferred, but the rows and columns are sized separately, so that a long strip, such as a 12000 x 10 image, is split into as few tiles as possible.
+    """
+    def grid(size, other, tile_size):
+        # Splits one side into tiles of at most tile_size, then the other side into the largest tiles that fit.
+        n = int(math.ceil(size / tile_size))
+        tile_other = max(min(tile_pixels // int(math.ceil(size / n)),
+                             MAX_GRID_DIMENSION), 1)
+        return n, int(math.ceil(other / tile_other))
+
+    side = max(min(int(math.sqrt(tile_pixels)), MAX_GRID_DIMENSION), 1)
+    strip = max(min(tile_pixels, MAX_GRID_DIMENSION), 1)
+    rows, cols = grid(height, width, min(height, strip))
+    candidates = [grid(width, height, min(width, side)),
+                  grid(width, height, min(width, strip)),
+                  (cols, rows)]
+    return min(candidates, key=lambda c: c[0] * c[1])
+
+
+def plan_export(image, region=None, scale=None, crs=None, max_bytes=MAX_REQUEST_BYTES, max_pixels=None, tile_shape=None):
+    """Estimates the size of an image export without downloading it, and plans how to split it into tiles that fit the request size limits. Only one small server query is made.
+
+    Args:
+        image (object): The ee.Image to export.
+        region (object, optional): The region to export, as an ee.Geometry, a GeoJSON geometry or a list of coordinates. Defaults to the footprint of the image.
+        scale (float, optional): The scale in meters of the export. Defaults to the nominal scale of the image.
+        crs (str, optional): The CRS of the export. Defaults to the CRS of the first band of the image.
+        max_bytes (int, optional): The maximum size of a single request, in bytes. Defaults to 33554432 (32 MB), the limit of getDownloadURL.
+        max_pixels (int, optional): The maximum number of pixels of a single request, such as 262144 for sampleRectangle. Defaults to None.
+        tile_shape (tuple, optional): The (height, width) of the tiles, which must fit the limits. Defaults to None, which uses the grid with the fewest tiles that fit the limits, preferring square tiles.
+
+    Returns:
+        dict: The export plan, including crs, crs_transform, width, height, pixels, band_names, band_types, bytes_per_band, total_bytes, tile_count, tile_grid (columns, rows), tile_width, tile_height and tiles.
+    """
+    info = _plan_query(image, region, scale, crs).getInfo()
+    return _plan_from_info(info, max_bytes=max_bytes, max_pixels=max_pixels, tile_shape=tile_shape)
+
+
+def _plan_query(image, region=None, scale=None, crs=None):
+    """Returns the ee.Dictionary of the values needed to plan the export of an image: its projection at the export scale, the bounds of the region in that projection, and its band names and types."""
+    if region is None:
+        region = image.geometry()
+    elif isinstance(region, list):
+        region = ee.Geometry.Polygon(region)
+    else:
+        region = ee.Geometry(region)
+
+    if crs is None:
+        base = ee.Projection(image.projection().crs())
+    else:
+        base = ee.Projection(crs)
+    if scale is None:
+        scale = image.projection().nominalScale()
+
+    return ee.Dictionary({
+        'projection': base.atScale(scale),
+        'bounds': region.bounds(1, base).coordinates(),
+        'band_names': image.bandNames(),
+        'band_types': image.bandTypes(),
+    })
+
+
+def plan_collection_export(collection, region=None, scale=None, crs=None, max_bytes=MAX_REQUEST_BYTES):
+    """Plans the export of each image of an image collection, like plan_export(), with a single server query for the system:index, footprints and band types of all images.
+
+    Args:
+        collection (object): The ee.ImageCollection to export.
+        region (object, optional): The region to export, as an ee.Geometry, a GeoJSON geometry or a list of coordinates. Defaults to the footprint of each image.
+        scale (float|function, optional): The scale in meters of the export, or a function returning the scale of an ee.Image. Defaults to the nominal scale of each image.
+        crs (str, optional): The CRS of the export. Defaults to the CRS of the first band of each image.
+        max_bytes (int, optional): The maximum size of a single request, in bytes. Defaults to 33554432 (32 MB).
+
+    Returns:
+        tuple: The system:index of the images and a dictionary of their export plans by system:index. Each plan also has the scale of the export.
+    """
+    if isinstance(region, list):
+        region = ee.Geometry.Polygon(region)
+    elif region is not None:
+        region = ee.Geometry(region)
+
+    def set_plan(image):
+        image_scale = scale(image) if callable(scale) else scale
+        if image_scale is None:
+            image_scale = image.projection().nominalScale()
+        info = _plan_query(image, region, image_scale, crs).set(
+            'scale', image_scale)
+        return image.set('_plan', info)
+
+    info = ee.Dictionary({
+        'ids': collection.aggregate_array('system:index'),
+        'plans': collection.map(set_plan).aggregate_array('_plan'),
+    }).getInfo()
+
+    plans = {}
+    for index, image_info in zip(info['ids'], info['plans']):
+        plans[index] = _plan_from_info(image_info, max_bytes=max_bytes)
+        plans[index]['scale'] = image_info['scale']
+    return info['ids'], plans
+
+
+def _plan_from_info(info, max_bytes=MAX_REQUEST_BYTES, max_pixels=None, tile_shape=None):
+    """Plans an export from the values returned by _plan_query(), without any server query."""
+    ring = info['bounds'][0]
+    xmin = min(c[0] for c in ring)
+    xmax = max(c[0] for c in ring)
+    ymin = min(c[1] for c in ring)
+    ymax = max(c[1] for c in ring)
+
+    transform = info['projection']['transform']
+    x_res = abs(transform[0])
+    y_res = abs(transform[4])
+
+    # Snaps the grid to the pixel boundaries of the projection
+    x0 = math.floor(xmin / x_res) * x_res
+    y0 = math.ceil(ymax / y_res) * y_res
+    width = max(int(math.ceil((xmax - x0) / x_res)), 1)
+    height = max(int(math.ceil((y0 - ymin) / y_res)), 1)
+    pixels = width * height
+
+    band_names = info['band_names']
+    band_types = info['band_types']
+    band_bytes = [_band_bytes(band_types[band]) for band in band_names]
+    # Bands are written to a single GeoTIFF with a common data type.
+    pixel_bytes = max(band_bytes) * len(band_bytes) if band_bytes else 1
+
+    tile_pixels = max(max_bytes // pixel_bytes, 1)
+    if max_pixels is not None:
+        tile_pixels = min(tile_pixels, max_pixels)
+    if tile_shape is not None:
+        tile_height, tile_width = tile_shape
+        if tile_height * tile_width > tile_pixels or max(tile_shape) > MAX_GRID_DIMENSION:
+            raise ValueError('Tiles of {} x {} pixels exceed the request size limit.'.format(
+                tile_width, tile_height))
+        nx = int(math.ceil(width / tile_width))
+        ny = int(math.ceil(height / tile_height))
+    else:
+        nx, ny = _tile_grid(width, height, tile_pixels)
+        tile_width = int(math.ceil(width / nx))
+        tile_height = int(math.ceil(height / ny))
+
+    tiles = []
+    for row in range(ny):
+        for col in range(nx):
+            col_off = col * tile_width
+            row_off = row * tile_height
+            tiles.append({
+                'col_off': col_off,
+                'row_off': row_off,
+                'width': min(tile_width, width - col_off),
+                'height': min(tile_height, height - row_off),
+                'crs_transform': [x_res, 0, x0 + col_off * x_res, 0, -y_res, y0 - row_off * y_res],
+            })
+
+    return {
+        'crs': info['projection'].get('crs', info['projection'].get('wkt')),
+        'crs_transform': [x_res, 0, x0, 0, -y_res, y0],
+        'width': width,
+        'height': height,
+        'pixels': pixels,
+        'band_names': band_names,
+        'band_types': band_types,
+        'bytes_per_band': {band: pixels * size for band, size in zip(band_names, band_bytes)},
+        'total_bytes': pixels * pixel_bytes,
+        'tile_count': len(tiles),
+        'tile_grid': (nx, ny),
+        'tile_width': tile_width,
+        'tile_height': tile_height,
+        'tiles': tiles,
+    }
+
+
+def is_request_too_large(error):
+    """Returns whether an error raised by getDownloadURL was caused by its request size limits, in which case the image can be downloaded as tiles.
+
+    Args:
+        error (Exception): The error raised by getDownloadURL.
+
+    Returns:
+        bool: Whether the request exceeded the request size or grid dimension limit.
+    """
+    message = str(error)
+    return 'must be less than or equal to' in message and ('request size' in message or 'grid dimension' in message)
+
+
+def check_rasterio(purpose):
+    """Checks that rasterio is installed, so that exports that need it fail before anything is downloaded.
+
+    Args:
+        purpose (str): What rasterio is needed for, used in the error message.
+
+    Returns:
+        object: The rasterio module.
+    """
+    try:
+        import rasterio
+    except ImportError:
+        raise ImportError('The rasterio package is required for {}. Install it with: pip install geemap[rasterio]'.format(
+            purpose))
+    return rasterio
+
+
+def _download_tile(image, tile, name, file_per_band, out_dir):
+    """Downloads one tile of the grid and extracts its GeoTIFF files into out_dir.
+
+    Returns:
+        list: The file names of the extracted GeoTIFFs.
+    """
+    from .download import extract_zip_url
+
+    params = {
+        'name': name,
+        'filePerBand': file_per_band,
+        'crs': tile['crs'],
+        'crs_transform': tile['crs_transform'],
+        'dimensions': '{}x{}'.format(tile['width'], tile['height']),
+    }
+    url = image.getDownloadURL(params)
+    try:
+        return extract_zip_url(url, out_dir, members=['*.tif'])
+    except IOError as e:
+        raise IOError('An error occurred while downloading tile {}: {}'.format(
+            tile['index'], e))
+
+
+def download_image_tiles(image, filename, plan, file_per_band=False, workers=4, verbose=True):
+    """Downloads an image tile by tile and mosaics the tiles into GeoTIFFs as they arrive. At most 2 * workers tiles are downloaded or waiting to be mosaicked at a time, so that only a few tiles are held on disk. The GeoTIFFs are written to a temporary directory next to filename and moved in place once complete, so that a failed download never leaves a partial GeoTIFF.
+
+    Args:
+        image (object): The ee.Image to download.
+        filename (str): Output filename for the exported image.
+        plan (dict): The export plan returned by plan_export().
+        file_per_band (bool, optional): Whether to produce a different GeoTIFF per band. Defaults to False.
+        workers (int, optional): The number of tiles to download concurrently. Defaults to 4.
+        verbose (bool, optional): Whether to print the progress. Defaults to True.
+    """
+    rasterio = check_rasterio('mosaicking tiled downloads')
+    from rasterio.windows import Window
+    from .download import get_session
+
+    # Sizes the connection pool of the shared session for the concurrent downloads.
+    get_session(workers)
+    out_dir = os.path.dirname(filename)
+    name = os.path.splitext(os.path.basename(filename))[0]
+    tmp_dir = tempfile.mkdtemp(prefix='.{}_'.format(name), dir=out_dir)
+
+    tiles = iter(enumerate(plan['tiles']))
+    count = len(plan['tiles'])
+    outputs = {}
+
+    def mosaic(tile, tile_dir, members):
+        for member in members:
+            with rasterio.open(os.path.join(tile_dir, member)) as src:
+                if member not in outputs:
+                    profile = src.profile.copy()
+                    profile.update(
+                        driver='GTiff',
+                        width=plan['width'],
+                        height=plan['height'],
+                        transform=src.transform *
+                        rasterio.Affine.translation(
+                            -tile['col_off'], -tile['row_off']),
+                        tiled=True,
+                        blockxsize=256,
+                        blockysize=256,
+                        compress='deflate',
+                        BIGTIFF='IF_SAFER',
+                    )
+                    outputs[member] = rasterio.open(
+                        os.path.join(tmp_dir, member), 'w', **profile)
+                window = Window(tile['col_off'], tile['row_off'],
+                                src.width, src.height)
+                outputs[member].write(src.read(), window=window)
+        shutil.rmtree(tile_dir)
+
+    try:
+        futures = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                finished = 0
+                while True:
+                    for index, tile in tiles:
+                        tile = dict(tile, crs=plan['crs'], index=index + 1)
+                        tile_dir = os.path.join(tmp_dir, str(index))
+                        os.makedirs(tile_dir)
+                        future = executor.submit(
+                            _download_tile, image, tile, name, file_per_band, tile_dir)
+                        futures[future] = (tile, tile_dir)
+                        if len(futures) >= 2 * workers:
+                            break
+                    if not futures:
+                        break
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        tile, tile_dir = futures.pop(future)
+                        members = future.result()
+                        finished += 1
+                        if verbose:
+                            print('Downloaded tile {}/{}'.format(finished, count))
+                        mosaic(tile, tile_dir, members)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        for dst in outputs.values():
+            dst.close()
+        for member in outputs:
+            os.replace(os.path.join(tmp_dir, member),
+                       os.path.join(out_dir, member))
+    finally:
+        for dst in outputs.values():
+            dst.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _stack_band_groups(band_names, ids):
+    """Groups the bands of an image produced by ImageCollection.toBands() by image. The bands are named '<system:index>_<band>' and ordered like the images of the collection.
+
+    Returns:
+        list: A list of (index, band_numbers, names) tuples, where band_numbers are 1-based and names have the image prefix removed.
+    """
+    groups = [(index, [], []) for index in ids]
+    position = 0
+    for number, band_name in enumerate(band_names, start=1):
+        while position < len(ids) and not band_name.startswith(ids[position] + '_'):
+            position += 1
+        # An index can be a prefix of the next one, such as '1' and '1_2'.
+        while position + 1 < len(ids) and band_name.startswith(ids[position + 1] + '_'):
+            position += 1
+        if position == len(ids):
+            raise ValueError(
+                'The band {} does not match any image of the collection.'.format(band_name))
+        groups[position][1].append(number)
+        groups[position][2].append(band_name[len(ids[position]) + 1:])
+    return [group for group in groups if group[1]]
+
+
+def split_image_stack(filename, out_dir, ids, band_names, file_per_band=False):
+    """Splits a GeoTIFF of an image produced by ImageCollection.toBands() into one GeoTIFF per image, named after its system:index.
+
+    Args:
+        filename (str): The GeoTIFF of the stacked image.
+        out_dir (str): The output directory.
+        ids (list): The system:index of the images of the collection, in order.
+        band_names (list): The band names of the stacked image.
+        file_per_band (bool, optional): Whether to produce a different GeoTIFF per band, named '<system:index>.<band>.tif'. Defaults to False.
+
+    Returns:
+        list: The file paths of the GeoTIFFs.
+    """
+    rasterio = check_rasterio('splitting stacked images')
+
+    files = []
+    with rasterio.open(filename) as src:
+        profile = src.profile.copy()
+        for index, numbers, names in _stack_band_groups(band_names, ids):
+            if file_per_band:
+                outputs = [('{}.{}.tif'.format(index, name), [number], [name])
+                           for number, name in zip(numbers, names)]
+            else:
+                outputs = [('{}.tif'.format(index), numbers, names)]
+            for out_name, out_numbers, out_band_names in outputs:
+                out_file = os.path.join(out_dir, out_name)
+                profile.update(count=len(out_numbers))
+                with rasterio.open(out_file, 'w', **profile) as dst:
+                    dst.write(src.read(out_numbers))
+                    dst.descriptions = tuple(out_band_names)
+                files.append(out_file)
+    return files
+
+
+def read_image_stack(filename, ids, band_names):
+    """Reads a GeoTIFF of an image produced by ImageCollection.toBands() into a (time, band, y, x) array. All images must have the same bands.
+
+    Args:
+        filename (str): The GeoTIFF of the stacked image.
+        ids (list): The system:index of the images of the collection, in order.
+        band_names (list): The band names of the stacked image.
+
+    Returns:
+        tuple: The (time, band, y, x) numpy array, the system:index of the images and the band names of each image.
+    """
+    rasterio = check_rasterio('reading stacked images')
+
+    groups = _stack_band_groups(band_names, ids)
+    names = groups[0][2]
+    if any(group[2] != names for group in groups):
+        raise ValueError(
+            'All images must have the same bands to be read into a single array.')
+
+    with rasterio.open(filename) as src:
+        data = src.read()
+    data = data.reshape((len(groups), len(names)) + data.shape[1:])
+    return data, [group[0] for group in groups], names
+
+
+class _CsvPages(object):
+    """Appends CSV pages to a file as they are downloaded. The header is the union of the columns of all pages, in the order they are first seen. Pages with the same header as the first page are copied as they are. If later pages add columns, the file is rewritten once by close() to add them to the header, leaving them empty in the rows written before."""
+
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.out = open(out_file, 'w', newline='')
+        self.header = None
+        self.fieldnames = []
+        self.lineterminator = '\n'
+        self.extended = False
+
+    def append(self, page_file):
+        import csv
+
+        with open(page_file, newline='') as f:
+            header = f.readline()
+            if not header:
+                return
+            names = next(csv.reader([header]), [])
+            if self.header is None:
+                self.header = header
+                self.fieldnames = names
+                self.lineterminator = '\r\n' if header.endswith('\r\n') else '\n'
+                self.out.write(header)
+            if header == self.header:
+                shutil.copyfileobj(f, self.out)
+                return
+
+            for name in names:
+                if name not in self.fieldnames:
+                    self.fieldnames.append(name)
+                    self.extended = True
+            writer = csv.DictWriter(self.out, self.fieldnames, restval='',
+                                    lineterminator=self.lineterminator)
+            for row in csv.DictReader(f, names):
+                writer.writerow(row)
+
+    def close(self, complete=True):
+        """Closes the output file.
+
+        Args:
+            complete (bool, optional): Whether all pages were appended. If False, the file is closed as it is. Defaults to True.
+
+        Returns:
+            list: The file paths of the output.
+        """
+        import csv
+
+        self.out.close()
+        if complete and self.extended:
+            tmp_file = self.out_file + '.tmp'
+            with open(self.out_file, newline='') as f, open(tmp_file, 'w', newline='') as out:
+                reader = csv.reader(f)
+                next(reader, None)
+                writer = csv.writer(out, lineterminator=self.lineterminator)
+                writer.writerow(self.fieldnames)
+                for row in reader:
+                    writer.writerow(
+                        row + [''] * (len(self.fieldnames) - len(row)))
+            os.replace(tmp_file, self.out_file)
+        return [self.out_file]
+
+
+class _GeoJSONPages(object):
+    """Appends the features of GeoJSON FeatureCollection pages to a single FeatureCollection as they are downloaded."""
+
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.out = open(out_file, 'w')
+        self.out.write('{"type": "FeatureCollection", "features": [')
+        self.first = True
+        self.columns = {}
+
+    def append(self, page_file):
+        import json
+
+        with open(page_file) as f:
+            data = json.load(f)
+        self.columns.update(data.get('columns', {}))
+        for feature in data['features']:
+            if not self.first:
+                self.out.write(',\n')
+            self.out.write(json.dumps(feature))
+            self.first = False
+
+    def close(self, complete=True):
+        """Closes the output file.
+
+        Args:
+            complete (bool, optional): Whether all pages were appended. If False, the file is closed as it is. Defaults to True.
+
+        Returns:
+            list: The file paths of the output.
+        """
+        import json
+
+        if complete:
+            self.out.write('], "columns": {}}}\n'.format(json.dumps(self.columns)))
+        self.out.close()
+        return [self.out_file]
+
+
+class _ShapefilePages(object):
+    """Appends shapefile pages to a single shapefile as they are downloaded. The shapes are written to the .shp file as they arrive. The fields of all pages are combined, so the records are spooled to a temporary file and written to the .dbf file by close(), once the size of each field is known. Character fields are sized to their longest value."""
+
+    def __init__(self, out_file):
+        self.base = os.path.splitext(out_file)[0]
+        self.shapes = None
+        self.fields = {}
+        self.widths = {}
+        self.records = open(self.base + '.records', 'wb')
+        self.sidecars = []
+
+    def append(self, page_file):
+        import pickle
+        import shapefile
+
+        with shapefile.Reader(page_file) as reader:
+            if self.shapes is None:
+                self.shapes = shapefile.Writer(shp=open(self.base + '.shp', 'wb'), shx=open(self.base + '.shx', 'wb'),
+                                               shapeType=reader.shapeType)
+                page_base = os.path.splitext(page_file)[0]
+                for ext in ['.prj', '.cpg']:
+                    if os.path.exists(page_base + ext):
+                        shutil.copyfile(page_base + ext, self.base + ext)
+                        self.sidecars.append(self.base + ext)
+
+            for name, field_type, size, decimal in reader.fields[1:]:
+                if name not in self.fields:
+                    self.fields[name] = [field_type, size, decimal]
+                    continue
+                field = self.fields[name]
+                if field[0] != field_type:
+                    field[0] = 'C'
+                field[1] = max(field[1], size)
+                field[2] = max(field[2], decimal)
+
+            records = []
+            for shape_record in reader.iterShapeRecords():
+                self.shapes.shape(shape_record.shape)
+                record = shape_record.record.as_dict()
+                for name, value in record.items():
+                    if value is not None:
+                        self.widths[name] = max(self.widths.get(name, 0), len(
+                            str(value).encode('utf-8')))
+                records.append(record)
+            pickle.dump(records, self.records)
+
+    def close(self, complete=True):
+        """Closes the .shp file and writes the .dbf file from the spooled records.
+
+        Args:
+            complete (bool, optional): Whether all pages were appended. If False, the files are closed as they are. Defaults to True.
+
+        Returns:
+            list: The file paths of the output.
+        """
+        import pickle
+        import shapefile
+
+        self.records.close()
+        if self.shapes is not None:
+            self.shapes.close()
+        if not complete:
+            return []
+
+        with open(self.base + '.dbf', 'wb') as dbf:
+            writer = shapefile.Writer(dbf=dbf)
+            for name, (field_type, size, decimal) in self.fields.items():
+                if field_type == 'C':
+                    size = min(max(self.widths.get(name, 0), 1), 254)
+                    decimal = 0
+                writer.field(name, field_type, size=size, decimal=decimal)
+            with open(self.base + '.records', 'rb') as f:
+                while True:
+                    try:
+                        records = pickle.load(f)
+                    except EOFError:
+                        break
+                    for record in records:
+                        writer.record(**{name: record.get(name)
+                                         for name in self.fields})
+            writer.close()
+        os.remove(self.base + '.records')
+        return [self.base + ext for ext in ['.shp', '.shx', '.dbf']] + self.sidecars
+
+
+_PAGE_WRITERS = {
+    'csv': _CsvPages,
+    'json': _GeoJSONPages,
+    'shp': _ShapefilePages,
+}
+
+
+def _page_ranges(collection, count, page_size):
+    """Splits a feature collection into pages of system:index ranges. The first system:index of each page is computed on the server, with a single request, from the sorted system:index of the features.
+
+    Returns:
+        list: A list of (start, end) tuples, where end is the first system:index of the next page, or None for the last page.
+    """
+    ids = collection.aggregate_array('system:index').sort()
+    starts = ee.List.sequence(0, count - 1, page_size).map(
+        lambda index: ids.get(index)).getInfo()
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def download_vector_pages(collection, filename, count, page_size=10000, selectors=None, workers=4, verbose=True):
+    """Downloads a large ee.FeatureCollection as pages of features, which are downloaded concurrently and appended in order to a single CSV, GeoJSON or shapefile as they arrive. At most 2 * workers pages are downloaded or waiting to be appended at a time, and each page is deleted once appended. The pages are ranges of system:index, so the features are written in the order of their system:index. The output is written to a temporary directory next to filename and moved in place once complete.
+
+    Args:
+        collection (object): The ee.FeatureCollection to download.
+        filename (str): Output file name, ending with .csv, .json or .shp.
+        count (int): The number of features of the collection.
+        page_size (int, optional): The number of features per page. Defaults to 10000.
+        selectors (list, optional): A list of attributes to export. Defaults to None.
+        workers (int, optional): The number of pages to download concurrently. Defaults to 4.
+        verbose (bool, optional): Whether to print the progress. Defaults to True.
+    """
+    from .download import download_file, extract_zip_url, get_session
+
+    get_session(workers)
+    filetype = os.path.splitext(filename)[1][1:].lower()
+    if filetype not in _PAGE_WRITERS:
+        raise ValueError(
+            'Only csv, json and shp files can be downloaded as pages.')
+
+    out_dir = os.path.dirname(filename)
+    name = os.path.splitext(os.path.basename(filename))[0]
+    tmp_dir = tempfile.mkdtemp(prefix='.{}_'.format(name), dir=out_dir)
+    ranges = _page_ranges(collection, count, page_size)
+    pages = len(ranges)
+
+    def download_page(index):
+        start, end = ranges[index]
+        page = collection.filter(ee.Filter.gte('system:index', start))
+        if end is not None:
+            page = page.filter(ee.Filter.lt('system:index', end))
+        page_name = 'page{}'.format(index)
+        url = page.getDownloadURL(
+            filetype=filetype, selectors=selectors, filename=page_name)
+        if filetype == 'shp':
+            page_dir = os.path.join(tmp_dir, page_name)
+            extract_zip_url(url, page_dir)
+            return os.path.join(page_dir, page_name + '.shp')
+        page_file = os.path.join(tmp_dir, '{}.{}'.format(page_name, filetype))
+        download_file(url, page_file)
+        return page_file
+
+    writer = _PAGE_WRITERS[filetype](os.path.join(
+        tmp_dir, os.path.basename(filename)))
+    complete = False
+    try:
+        futures = {}
+        downloaded = {}
+        indexes = iter(range(pages))
+        appended = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                while appended < pages:
+                    while len(futures) + len(downloaded) < 2 * workers:
+                        index = next(indexes, None)
+                        if index is None:
+                            break
+                        futures[executor.submit(download_page, index)] = index
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = futures.pop(future)
+                        downloaded[index] = future.result()
+                        if verbose:
+                            print('Downloaded page {}/{}'.format(index + 1, pages))
+                    # Pages are appended in order, so a page waits for the pages before it.
+                    while appended in downloaded:
+                        page_file = downloaded.pop(appended)
+                        writer.append(page_file)
+                        if filetype == 'shp':
+                            shutil.rmtree(os.path.dirname(page_file))
+                        else:
+                            os.remove(page_file)
+                        appended += 1
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        complete = True
+        for out_file in writer.close():
+            os.replace(out_file, os.path.join(
+                out_dir, os.path.basename(out_file)))
+    finally:
+        if not complete:
+            writer.close(complete=False)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
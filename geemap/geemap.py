@@ -10,19 +10,34 @@ import ipywidgets as widgets
 from bqplot import pyplot as plt
 from ipyleaflet import *
 from .basemaps import ee_basemaps
+from .blocks import read_image, iter_image_blocks, map_blocks
+from .chips import read_chips
+from .common import ee_object_bounds
 from .conversion import *
+from .cube import Cube, open_cube, write_cube
+from .download import download_file, extract_zip_url, get_session, configure_session
+from .jobs import JobQueue
+from .export import plan_export, plan_collection_export, check_rasterio, is_request_too_large, download_image_tiles, download_vector_pages, split_image_stack, read_image_stack
 from .legends import builtin_legends
+from .stats import StreamingStats, image_stats
+
+
+_ee_initialized = False
 
 
 def ee_initialize():
-    """Authenticates Earth Engine and initialize an Earth Engine session
+    """Authenticates Earth Engine and initialize an Earth Engine session. The session is only initialized once per Python process, so that creating many maps does not initialize it again.
 
     """
+    global _ee_initialized
+    if _ee_initialized:
+        return
     try:
         ee.Initialize()
     except Exception as e:
         ee.Authenticate()
         ee.Initialize()
+    _ee_initialized = True
 
 
 class Map(ipyleaflet.Map):
@@ -30,6 +45,7 @@ class Map(ipyleaflet.Map):
 
     Args:
         ipyleaflet (object): An ipyleaflet map instance.
+        lite_mode (bool, optional): If True, the map is created without the default controls, the inspector and plotting widgets, and their observers, which is useful for dashboards showing many maps. The DrawControl and the inspector are created on first use of draw_control, user_roi or inspector_control, and the other controls can be added with add_default_controls(). Defaults to False.
 
     Returns:
         object: ipyleaflet map object.
@@ -61,41 +77,31 @@ class Map(ipyleaflet.Map):
         else:
             kwargs['zoom'] = zoom
 
+        lite_mode = kwargs.pop('lite_mode', False)
+
         # Inherit the ipyleaflet Map class
         super().__init__(**kwargs)
         self.scroll_wheel_zoom = True
         self.layout.height = '550px'
-
-        layer_control = LayersControl(position='topright')
-        self.add_control(layer_control)
-        self.layer_control = layer_control
-
-        scale = ScaleControl(position='bottomleft')
-        self.add_control(scale)
-        self.scale_control = scale
-
-        fullscreen = FullScreenControl()
-        self.add_control(fullscreen)
-        self.fullscreen_control = fullscreen
-
-        measure = MeasureControl(
-            position='bottomleft',
-            active_color='orange',
-            primary_length_unit='kilometers'
-        )
-        self.add_control(measure)
-        self.measure_control = measure
+        self.lite_mode = lite_mode
+
+        # The controls are created by add_default_controls(), add_draw_control() and add_inspector(), or on first use in lite mode
+        self.layer_control = None
+        self.scale_control = None
+        self.fullscreen_control = None
+        self.measure_control = None
+        self._draw_control = None
+        self._inspector_control = None
+        self.inspector_output_control = None
+        self.plot_checkbox = None
+        self.inspector_checked = False
+        self.plot_checked = False
+
+        if not lite_mode:
+            self.add_default_controls()
 
         self.add_layer(ee_basemaps['ROADMAP'])
 
-        draw_control = DrawControl(marker={'shapeOptions': {'color': '#0000FF'}},
-                                   rectangle={'shapeOptions': {
-                                       'color': '#0000FF'}},
-                                   circle={'shapeOptions': {
-                                       'color': '#0000FF'}},
-                                   circlemarker={},
-                                   )
-
         self.draw_count = 0  # The number of shapes drawn by the user using the DrawControl
         # The list of Earth Engine Geometry objects converted from geojson
         self.draw_features = []
@@ -114,6 +120,85 @@ class Map(ipyleaflet.Map):
         self.ee_layer_names = []
         self.ee_raster_layers = []
         self.ee_raster_layer_names = []
+        self._view_cache = None  # The arrays read by view_to_numpy() for the current view
+
+        if not lite_mode:
+            self.add_draw_control()
+
+        # Dropdown widget for plotting
+        self.plot_dropdown_control = None
+        self.plot_dropdown_widget = None
+        self.plot_options = {}
+
+        self.plot_marker_cluster = MarkerCluster(name="Marker Cluster")
+        self.plot_coordinates = []
+        self.plot_markers = []
+        self.plot_last_click = []
+        self.plot_all_clicks = []
+
+        if not lite_mode:
+            self.add_inspector()
+
+    def add_default_controls(self):
+        """Adds the layer, scale, fullscreen and measure controls to the map, if not added yet.
+        """
+        self.add_layer_control()
+
+        if self.scale_control is None:
+            scale = ScaleControl(position='bottomleft')
+            self.add_control(scale)
+            self.scale_control = scale
+
+        if self.fullscreen_control is None:
+            fullscreen = FullScreenControl()
+            self.add_control(fullscreen)
+            self.fullscreen_control = fullscreen
+
+        if self.measure_control is None:
+            measure = MeasureControl(
+                position='bottomleft',
+                active_color='orange',
+                primary_length_unit='kilometers'
+            )
+            self.add_control(measure)
+            self.measure_control = measure
+
+    @property
+    def draw_control(self):
+        """The DrawControl of the map. In lite mode, it is added to the map on first use."""
+        if self._draw_control is None:
+            self.add_draw_control()
+        return self._draw_control
+
+    @property
+    def inspector_control(self):
+        """The control of the Inspector and Plotting checkboxes. In lite mode, it is added to the map on first use."""
+        if self._inspector_control is None:
+            self.add_inspector()
+        return self._inspector_control
+
+    @property
+    def user_roi(self):
+        """The ee.Geometry of the last shape drawn by the user, or None. In lite mode, the DrawControl is added to the map on first use."""
+        if self._draw_control is None:
+            self.add_draw_control()
+        if self.draw_last_feature is None:
+            return None
+        return self.draw_last_feature.geometry()
+
+    def add_draw_control(self):
+        """Adds the DrawControl to the map, if not added yet. The drawn shapes are converted to Earth Engine objects.
+        """
+        if self._draw_control is not None:
+            return
+
+        draw_control = DrawControl(marker={'shapeOptions': {'color': '#0000FF'}},
+                                   rectangle={'shapeOptions': {
+                                       'color': '#0000FF'}},
+                                   circle={'shapeOptions': {
+                                       'color': '#0000FF'}},
+                                   circlemarker={},
+                                   )
 
         # Handles draw events
         def handle_draw(target, action, geo_json):
@@ -145,18 +230,13 @@ class Map(ipyleaflet.Map):
 
         draw_control.on_draw(handle_draw)
         self.add_control(draw_control)
-        self.draw_control = draw_control
+        self._draw_control = draw_control
 
-        # Dropdown widget for plotting
-        self.plot_dropdown_control = None
-        self.plot_dropdown_widget = None
-        self.plot_options = {}
-
-        self.plot_marker_cluster = MarkerCluster(name="Marker Cluster")
-        self.plot_coordinates = []
-        self.plot_markers = []
-        self.plot_last_click = []
-        self.plot_all_clicks = []
+    def add_inspector(self):
+        """Adds the Inspector and Plotting checkboxes to the map, if not added yet.
+        """
+        if self._inspector_control is not None:
+            return
 
         # Adds Inspector widget
         inspector_checkbox = widgets.Checkbox(
@@ -180,7 +260,7 @@ class Map(ipyleaflet.Map):
 
         chk_control = WidgetControl(widget=vb, position='topright')
         self.add_control(chk_control)
-        self.inspector_control = chk_control
+        self._inspector_control = chk_control
 
         self.inspector_checked = inspector_checkbox.value
         self.plot_checked = plot_checkbox.value
@@ -194,6 +274,7 @@ class Map(ipyleaflet.Map):
         output = widgets.Output(layout={'border': '1px solid black'})
         output_control = WidgetControl(widget=output, position='topright')
         self.add_control(output_control)
+        self.inspector_output_control = output_control
 
         def plot_chk_changed(button):
 
@@ -432,6 +513,133 @@ class Map(ipyleaflet.Map):
 
     addLayer = add_ee_layer
 
+    def add_time_slider(self, ee_object, vis_params={}, labels=None, name='Time series', time_interval=1, position='bottomright', date_format='YYYY-MM-dd', opacity=1.0, workers=8):
+        """Adds a time slider to the map for stepping through the images of an ImageCollection. The system:index and labels of all frames are fetched with a single query, then the map ids of all frames are computed concurrently in the background and cached, and a single TileLayer is updated as the slider moves.
+
+        Args:
+            ee_object (object): The ee.ImageCollection to animate.
+            vis_params (dict, optional): The visualization parameters. Defaults to {}.
+            labels (list, optional): The labels to show for the frames. Defaults to None, which uses the image dates or the image ids.
+            name (str, optional): The name of the layer. Defaults to 'Time series'.
+            time_interval (float, optional): The time between frames in seconds when playing the animation. Defaults to 1.
+            position (str, optional): Position of the time slider. Defaults to 'bottomright'.
+            date_format (str, optional): The date format used for the default labels. Defaults to 'YYYY-MM-dd'.
+            opacity (float, optional): The layer's opacity represented as a number between 0 and 1. Defaults to 1.
+            workers (int, optional): The number of map ids to compute concurrently. Defaults to 8.
+        """
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not isinstance(ee_object, ee.ImageCollection):
+            print('The ee_object must be an ee.ImageCollection.')
+            return
+
+        try:
+            if labels is None:
+                def set_label(img):
+                    label = ee.Algorithms.If(img.get('system:time_start'),
+                                             ee.Date(img.get('system:time_start')).format(date_format), img.get('system:index'))
+                    return img.set('_frame', [img.get('system:index'), label])
+                frames = ee_object.map(set_label).aggregate_array(
+                    '_frame').getInfo()
+                ids = [frame[0] for frame in frames]
+                labels = [frame[1] for frame in frames]
+            else:
+                ids = ee_object.aggregate_array('system:index').getInfo()
+        except Exception as e:
+            print(e)
+            return
+
+        count = len(ids)
+        if count == 0:
+            print('The ImageCollection is empty.')
+            return
+        if len(labels) != count:
+            print('The number of labels must be equal to the number of images ({}).'.format(count))
+            return
+
+        def get_url(index):
+            image = _collection_image(ee_object, ids[index])
+            return image.getMapId(vis_params)['tile_fetcher'].url_format
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = [executor.submit(get_url, i) for i in range(count)]
+        executor.shutdown(wait=False)
+
+        try:
+            url = futures[0].result()
+        except Exception as e:
+            print(e)
+            return
+
+        try:
+            # Widgets are not thread-safe, so the frames computed by the worker threads are shown from the event loop of the kernel.
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        tile_layer = ipyleaflet.TileLayer(
+            url=url,
+            attribution='Google Earth Engine',
+            name=name,
+            opacity=opacity,
+            visible=True
+        )
+        self.add_layer(tile_layer)
+
+        play = widgets.Play(value=0, min=0, max=count - 1,
+                            step=1, interval=int(time_interval * 1000))
+        slider = widgets.IntSlider(
+            value=0, min=0, max=count - 1, step=1, readout=False)
+        slider.layout.width = '200px'
+        widgets.jslink((play, 'value'), (slider, 'value'))
+        label = widgets.Label(value=str(labels[0]))
+        close_button = widgets.ToggleButton(
+            value=False, tooltip='Close the time slider', icon='times', button_style='primary')
+        close_button.layout.width = '34px'
+
+        hbox = widgets.HBox([play, slider, label, close_button])
+        slider_control = WidgetControl(widget=hbox, position=position)
+        self.add_control(slider_control)
+
+        def set_frame(index, future):
+            if slider.value != index:
+                return
+            try:
+                tile_layer.url = future.result()
+            except Exception as e:
+                label.value = '{} (failed: {})'.format(labels[index], e)
+
+        def frame_done(index, future):
+            if loop is None:
+                set_frame(index, future)
+            else:
+                loop.call_soon_threadsafe(set_frame, index, future)
+
+        def slider_changed(change):
+            index = change['new']
+            label.value = str(labels[index])
+            future = futures[index]
+            if future.done():
+                set_frame(index, future)
+            else:
+                future.add_done_callback(
+                    lambda f, index=index: frame_done(index, f))
+
+        slider.observe(slider_changed, 'value')
+
+        def close_clicked(change):
+            if change['new']:
+                for future in futures:
+                    future.cancel()
+                if slider_control in self.controls:
+                    self.remove_control(slider_control)
+                if tile_layer in self.layers:
+                    self.remove_layer(tile_layer)
+                hbox.close()
+
+        close_button.observe(close_clicked, 'value')
+
     def set_center(self, lon, lat, zoom=None):
         """Centers the map view at a given coordinates with the given zoom level.
 
@@ -451,37 +659,53 @@ class Map(ipyleaflet.Map):
 
         Args:
             ee_object (Element|Geometry): An Earth Engine object to center on - a geometry, image or feature.
-            zoom (int, optional): The zoom level, from 1 to 24. Defaults to None.
+            zoom (int, optional): The zoom level, from 1 to 24. Defaults to None, which fits the map to the bounds of the object, up to the maximum zoom level of the map. The zoom level is kept for a single point.
         """
-        lat = 0
-        lon = 0
-        bounds = [[lat, lon], [lat, lon]]
-        if isinstance(ee_object, ee.geometry.Geometry):
-            centroid = ee_object.centroid()
-            lon, lat = centroid.getInfo()['coordinates']
-            bounds = [[lat, lon], [lat, lon]]
-        elif isinstance(ee_object, ee.featurecollection.FeatureCollection):
-            centroid = ee_object.geometry().centroid()
-            lon, lat = centroid.getInfo()['coordinates']
-            bounds = [[lat, lon], [lat, lon]]
-        elif isinstance(ee_object, ee.image.Image):
-            geometry = ee_object.geometry()
-            coordinates = geometry.getInfo()['coordinates'][0]
-            bounds = [coordinates[0][::-1], coordinates[2][::-1]]
-        elif isinstance(ee_object, ee.imagecollection.ImageCollection):
-            geometry = ee_object.geometry()
-            coordinates = geometry.getInfo()['coordinates'][0]
-            bounds = [coordinates[0][::-1], coordinates[2][::-1]]
-        else:
-            bounds = [[0, 0], [0, 0]]
+        from .tiles import bounds_to_zoom
 
-        lat = bounds[0][0]
-        lon = bounds[0][1]
+        try:
+            bounds = ee_object_bounds(ee_object)
+        except Exception as e:
+            print(e)
+            return
+
+        if bounds is None:
+            print('The ee_object is empty.')
+            return
+
+        (south, west), (north, east) = bounds
+        lat = (south + north) / 2
+        lon = (west + east) / 2
+
+        if zoom is None:
+            width, height = self.get_view_size()
+            zoom = bounds_to_zoom(bounds, width, height,
+                                  max_zoom=int(self.max_zoom))
+        elif zoom > self.max_zoom:
+            zoom = int(self.max_zoom)
 
         self.setCenter(lon, lat, zoom)
 
     centerObject = center_object
 
+    def get_view_size(self):
+        """Returns the size of the map view in pixels. Before the map is displayed, the size is estimated from the map layout.
+
+        Returns:
+            tuple: The (width, height) of the map view, in pixels.
+        """
+        if len(self.pixel_bounds) == 2:
+            (left, top), (right, bottom) = self.pixel_bounds
+            if right > left and bottom > top:
+                return int(right - left), int(bottom - top)
+
+        def to_pixels(value, default):
+            if isinstance(value, str) and value.endswith('px'):
+                return int(float(value[:-2]))
+            return default
+
+        return to_pixels(self.layout.width, 1000), to_pixels(self.layout.height, 550)
+
     def get_scale(self):
         """Returns the approximate pixel scale of the current map view, in meters.
 
@@ -567,6 +791,203 @@ class Map(ipyleaflet.Map):
             print(e)
             print("Failed to add the specified TileLayer.")
 
+    def add_vector_tiles(self, in_file, name=None, style=None, max_zoom=14, tolerance=1.0, thin_pixels=4):
+        """Adds a large local shapefile or GeoJSON to the map as vector tiles. The features are indexed in memory and served as Mapbox Vector Tiles from a local server, so only the tiles in view are sent to the browser. The server is bound to 127.0.0.1, so the tiles only load when the browser runs on the same machine as the Jupyter kernel.
+
+        Args:
+            in_file (str): File path of the input shapefile or GeoJSON.
+            name (str, optional): The layer name to use on the layer control. Defaults to the file name.
+            style (dict, optional): A Leaflet.VectorGrid style dictionary, such as {'color': '#3388ff', 'weight': 1, 'fill': True, 'fillOpacity': 0.3, 'radius': 2}. Defaults to None.
+            max_zoom (int, optional): The zoom level with the most detailed simplification. Tiles beyond it reuse the geometries simplified for max_zoom and keep all points, while points are thinned below it. Defaults to 14.
+            tolerance (float, optional): The simplification tolerance, in screen pixels. Defaults to 1.0.
+            thin_pixels (int, optional): The minimum distance in screen pixels between points shown at zoom levels below max_zoom. Defaults to 4.
+        """
+        from .tiles import get_tile_server
+        from .vectortiles import vector_tile_index
+
+        layer_name = os.path.splitext(os.path.basename(in_file))[0]
+        if name is None:
+            name = layer_name
+
+        if style is None:
+            style = {'color': '#3388ff', 'weight': 1, 'fill': True,
+                     'fillColor': '#3388ff', 'fillOpacity': 0.3, 'radius': 2}
+
+        try:
+            index = vector_tile_index(in_file, layer_name=layer_name, max_zoom=max_zoom,
+                                      tolerance=tolerance, thin_pixels=thin_pixels)
+            url = get_tile_server().add_provider(
+                index.get_tile, ext='pbf', content_type='application/x-protobuf')
+            vector_layer = ipyleaflet.VectorTileLayer(
+                url=url, vector_tile_layer_styles={layer_name: style}, name=name)
+            self.add_layer(vector_layer)
+        except Exception as e:
+            print(e)
+            print("Failed to add the vector tiles.")
+
+    def add_local_raster(self, source, vis_params=None, name=None, band_names=None, bounds=None, crs=None, transform=None, nodata=None, opacity=1.0):
+        """Adds a local GeoTIFF, such as one exported with ee_export_image(), or a numpy array to the map as a tile layer. Overviews are built once by block-mean downsampling (and cached on disk for GeoTIFFs), and the tiles are rendered on demand by a local tile server. The raster must be in EPSG:4326 or EPSG:3857.
+
+        Args:
+            source (str | array): The file path of a GeoTIFF, or a (y, x, band) or (y, x) numpy array.
+            vis_params (dict, optional): The visualization parameters: bands, min, max, gamma and palette. Defaults to None, which stretches the bands between their minimum and maximum.
+            name (str, optional): The name of the layer. Defaults to the file name, or 'Layer N' for arrays.
+            band_names (list, optional): The names of the bands, for selecting bands by name. Defaults to None.
+            bounds (tuple, optional): The bounds of a numpy array in EPSG:4326 as ((south, west), (north, east)). Defaults to None.
+            crs (str, optional): The CRS of a numpy array, 'EPSG:4326' or 'EPSG:3857', if transform is given instead of bounds. Defaults to None.
+            transform (list, optional): The affine transform of a numpy array as [x_res, 0, x0, 0, -y_res, y0]. Defaults to None.
+            nodata (float, optional): The nodata value of a numpy array. Defaults to None.
+            opacity (float, optional): The layer's opacity represented as a number between 0 and 1. Defaults to 1.
+        """
+        from .tiles import get_tile_server
+        from .rastertiles import raster_tile_index
+
+        if name is None:
+            if isinstance(source, str):
+                name = os.path.splitext(os.path.basename(source))[0]
+            else:
+                name = 'Layer ' + str(len(self.layers) + 1)
+
+        try:
+            index = raster_tile_index(source, vis_params=vis_params, band_names=band_names, bounds=bounds,
+                                      crs=crs, transform=transform, nodata=nodata)
+            url = get_tile_server().add_provider(index.get_tile)
+            tile_layer = ipyleaflet.TileLayer(
+                url=url, name=name, opacity=opacity, max_zoom=24, visible=True)
+            self.add_layer(tile_layer)
+        except Exception as e:
+            print(e)
+            print("Failed to add the local raster.")
+
+    def to_image(self, filename, width=None, height=None, workers=8):
+        """Saves the current map view as an image, without needing a browser. The visible tiles of the basemaps and Earth Engine layers are fetched concurrently and composited in layer order, honoring the layer opacity.
+
+        Args:
+            filename (str): Output filename for the image, such as map.png or map.jpg.
+            width (int, optional): The width of the image, in pixels. Defaults to None, which uses the width of the map view.
+            height (int, optional): The height of the image, in pixels. Defaults to None, which uses the height of the map view.
+            workers (int, optional): The number of tiles to fetch concurrently. Defaults to 8.
+        """
+        from PIL import Image
+        from .tiles import render_view
+
+        filename = os.path.abspath(filename)
+        if not os.path.exists(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+
+        view_width, view_height = self.get_view_size()
+        if width is None:
+            width = view_width
+        if height is None:
+            height = view_height
+
+        layers = []
+        for layer in self.layers:
+            if not isinstance(layer, ipyleaflet.TileLayer) or isinstance(layer, ipyleaflet.WMSLayer):
+                continue
+            if not layer.visible:
+                continue
+            layers.append({'url': layer.url, 'opacity': layer.opacity,
+                           'tms': layer.tms})
+
+        try:
+            image = render_view(layers, self.center, self.zoom,
+                                int(width), int(height), workers=workers)
+            img = Image.fromarray(image, 'RGBA')
+            if os.path.splitext(filename)[1].lower() in ['.jpg', '.jpeg']:
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[3])
+                img = background
+            img.save(filename)
+            print('Image saved to {}'.format(filename))
+        except Exception as e:
+            print(e)
+            print('Failed to save the map as an image.')
+
+    def view_to_numpy(self, layer_name=None, masked=False, workers=4):
+        """Reads the pixels of an Earth Engine layer in the current map view into a (y, x, band) numpy array, at the resolution of the screen (one pixel per screen pixel, in EPSG:3857). The view is read in one request, or a few concurrent requests for large views with many bands. The array is cached, so calling view_to_numpy() again before the map is panned or zoomed returns immediately.
+
+        Args:
+            layer_name (str, optional): The name of the layer. Defaults to None, which uses the last Earth Engine raster layer added to the map.
+            masked (bool, optional): Whether to return a numpy masked array, using the masks of the bands. Defaults to False.
+            workers (int, optional): The number of requests to make concurrently. Defaults to 4.
+
+        Returns:
+            array: The (y, x, band) numpy array of the view.
+        """
+        import math
+        from .tiles import TILE_SIZE, lonlat_to_pixel, pixel_to_lonlat, meters_per_pixel
+
+        if not self.ee_raster_layers:
+            print('There are no Earth Engine raster layers on the map.')
+            return
+        if layer_name is None:
+            layer_name = self.ee_raster_layer_names[-1]
+        if layer_name not in self.ee_raster_layer_names:
+            print('The layer name must be one of: {}'.format(
+                ', '.join(self.ee_raster_layer_names)))
+            return
+        ee_object = self.ee_raster_layers[self.ee_raster_layer_names.index(
+            layer_name)]
+
+        zoom = int(round(self.zoom))
+        width, height = self.get_view_size()
+        view = (tuple(self.center), zoom, width, height)
+        key = (layer_name, id(ee_object), masked)
+        # Only the arrays of the current view are kept.
+        if self._view_cache is None or self._view_cache[0] != view:
+            self._view_cache = (view, {})
+        if key in self._view_cache[1]:
+            return self._view_cache[1][key]
+
+        world = TILE_SIZE * 2 ** zoom
+        cx, cy = lonlat_to_pixel(self.center[1], self.center[0], zoom)
+        left = min(max(math.floor(cx - width / 2.0), 0), world - 1)
+        top = min(max(math.floor(cy - height / 2.0), 0), world - 1)
+        right = min(left + width, world)
+        bottom = min(top + height, world)
+        # The region is inset by a fraction of a pixel, so that it snaps to the screen pixels.
+        west, north = pixel_to_lonlat(left + 0.25, top + 0.25, zoom)
+        east, south = pixel_to_lonlat(right - 0.25, bottom - 0.25, zoom)
+        region = ee.Geometry.Rectangle([west, south, east, north])
+
+        image = ee_object
+        if isinstance(ee_object, ee.ImageCollection):
+            image = ee_object.mosaic()
+        try:
+            array = read_image(image, region=region, scale=meters_per_pixel(zoom),
+                               crs='EPSG:3857', masked=masked, workers=workers)
+        except Exception as e:
+            print(e)
+            print('Failed to read the map view.')
+            return
+        self._view_cache[1][key] = array
+        return array
+
+    def add_array_overlay(self, array, bounds, vis_params={}, name=None, band_names=None, opacity=1.0):
+        """Adds a numpy array, such as one returned by ee_to_numpy() or view_to_numpy(), to the map as an image overlay. The array is rendered locally with the same visualization parameters as add_ee_layer(), and embedded in the map as an in-memory PNG.
+
+        Args:
+            array (array): A (y, x) or (y, x, band) numpy array, or a numpy masked array.
+            bounds (tuple): The bounds of the array as ((south, west), (north, east)).
+            vis_params (dict, optional): The visualization parameters: bands, min, max, gamma and palette. Defaults to {}.
+            name (str, optional): The name of the layer. Defaults to 'Layer N'.
+            band_names (list, optional): The names of the bands of the array, for selecting bands by name. Defaults to None.
+            opacity (float, optional): The layer's opacity represented as a number between 0 and 1. Defaults to 1.
+        """
+        from .render import array_to_image_overlay
+
+        if name is None:
+            name = 'Layer ' + str(len(self.layers) + 1)
+        try:
+            overlay = array_to_image_overlay(array, bounds, vis_params=vis_params, band_names=band_names,
+                                             name=name, opacity=opacity)
+        except Exception as e:
+            print(e)
+            print('Failed to render the array.')
+            return
+        self.add_layer(overlay)
+
     def add_minimap(self, zoom=5, position="bottomright"):
         """Adds a minimap (overview) to the ipyleaflet map.
 
@@ -893,7 +1314,10 @@ class Map(ipyleaflet.Map):
     def add_layer_control(self):
         """Adds layer basemap to the map.
         """
-        pass
+        if self.layer_control is None:
+            layer_control = LayersControl(position='topright')
+            self.add_control(layer_control)
+            self.layer_control = layer_control
 
     addLayerControl = add_layer_control
 
@@ -905,8 +1329,10 @@ class Map(ipyleaflet.Map):
             right_layer (str, optional): The right tile layer. Defaults to 'ESRI'.
         """
         try:
-            self.remove_control(self.layer_control)
-            self.remove_control(self.inspector_control)
+            if self.layer_control is not None:
+                self.remove_control(self.layer_control)
+            if self._inspector_control is not None:
+                self.remove_control(self._inspector_control)
             if left_layer in ee_basemaps.keys():
                 left_layer = ee_basemaps[left_layer]
 
@@ -938,7 +1364,8 @@ class Map(ipyleaflet.Map):
 
         dropdown.observe(on_click, 'value')
         basemap_control = WidgetControl(widget=dropdown, position='topright')
-        self.remove_control(self.inspector_control)
+        if self._inspector_control is not None:
+            self.remove_control(self._inspector_control)
         # self.remove_control(self.layer_control)
         self.add_control(basemap_control)
 
@@ -1457,16 +1884,18 @@ def filter_polygons(ftr):
     return ee.Feature(polygons).copyProperties(ftr)
 
 
-def ee_export_vector(ee_object, filename, selectors=None):
-    """Exports Earth Engine FeatureCollection to other formats, including shp, csv, json, kml, and kmz.
+def ee_export_vector(ee_object, filename, selectors=None, page_size=10000, workers=4):
+    """Exports Earth Engine FeatureCollection to other formats, including shp, csv, json, kml, and kmz. Collections with more than page_size features are downloaded as pages, which are downloaded concurrently and appended in order to a single file as they arrive (csv, json and shp only).
 
     Args:
         ee_object (object): ee.FeatureCollection to export.
         filename (str): Output file name.
         selectors (list, optional): A list of attributes to export. Defaults to None.
+        page_size (int, optional): The maximum number of features per request. Defaults to 10000.
+        workers (int, optional): The number of pages to download concurrently. Defaults to 4.
     """
+    import math
     import requests
-    import zipfile
     ee_initialize()
 
     if not isinstance(ee_object, ee.FeatureCollection):
@@ -1478,10 +1907,6 @@ def ee_export_vector(ee_object, filename, selectors=None):
     basename = os.path.basename(filename)
     name = os.path.splitext(basename)[0]
     filetype = os.path.splitext(basename)[1][1:].lower()
-    filename_shp = filename
-
-    if filetype == 'shp':
-        filename = filename.replace('.shp', '.zip')
 
     if not (filetype.lower() in allowed_formats):
         print('The file type must be one of the following: {}'.format(
@@ -1501,43 +1926,49 @@ def ee_export_vector(ee_object, filename, selectors=None):
                     ', '.join(allowed_attributes)))
                 return
 
+    if filetype != 'kml' and filetype != 'kmz':
+        try:
+            count = ee_object.size().getInfo()
+            if count > page_size:
+                print('Downloading {} features as {} pages ...'.format(
+                    count, int(math.ceil(count / page_size))))
+                download_vector_pages(ee_object, filename, count, page_size=page_size,
+                                      selectors=selectors, workers=workers)
+                print('Data downloaded to {}'.format(filename))
+                return
+        except Exception as e:
+            print('An error occurred while downloading.')
+            print(e)
+            return
+
+    def fetch(url):
+        # Shapefiles are extracted from the zip file while it is being downloaded.
+        if filetype == 'shp':
+            extract_zip_url(url, os.path.dirname(filename))
+        else:
+            download_file(url, filename)
+
     try:
         print('Generating URL ...')
         url = ee_object.getDownloadURL(
             filetype=filetype, selectors=selectors, filename=name)
         print('Downloading data from {}\nPlease wait ...'.format(url))
-        r = requests.get(url, stream=True)
-
-        if r.status_code != 200:
+        try:
+            fetch(url)
+        except requests.HTTPError:
             print('An error occurred while downloading. \n Retrying ...')
-            try:
-                new_ee_object = ee_object.map(filter_polygons)
-                print('Generating URL ...')
-                url = new_ee_object.getDownloadURL(
-                    filetype=filetype, selectors=selectors, filename=name)
-                print('Downloading data from {}\nPlease wait ...'.format(url))
-                r = requests.get(url, stream=True)
-            except Exception as e:
-                print(e)
-
-        with open(filename, 'wb') as fd:
-            for chunk in r.iter_content(chunk_size=1024):
-                fd.write(chunk)
+            new_ee_object = ee_object.map(filter_polygons)
+            print('Generating URL ...')
+            url = new_ee_object.getDownloadURL(
+                filetype=filetype, selectors=selectors, filename=name)
+            print('Downloading data from {}\nPlease wait ...'.format(url))
+            fetch(url)
     except Exception as e:
         print('An error occurred while downloading.')
         print(e)
         return
 
-    try:
-        if filetype == 'shp':
-            z = zipfile.ZipFile(filename)
-            z.extractall(os.path.dirname(filename))
-            os.remove(filename)
-            filename = filename.replace('.zip', '.shp')
-
-        print('Data downloaded to {}'.format(filename))
-    except Exception as e:
-        print(e)
+    print('Data downloaded to {}'.format(filename))
 
 
 def ee_to_shp(ee_object, filename, selectors=None):
@@ -1580,8 +2011,8 @@ def ee_to_csv(ee_object, filename, selectors=None):
         print(e)
 
 
-def ee_export_image(ee_object, filename, scale=None, crs=None, region=None, file_per_band=False):
-    """Exports an ee.Image as a GeoTIFF.
+def ee_export_image(ee_object, filename, scale=None, crs=None, region=None, file_per_band=False, workers=4, dry_run=False):
+    """Exports an ee.Image as a GeoTIFF. Images exceeding the request size limit of getDownloadURL are split into a grid of tiles, which are downloaded concurrently and mosaicked into the output GeoTIFF (requires rasterio).
 
     Args:
         ee_object (object): The ee.Image to download.
@@ -1590,9 +2021,12 @@ def ee_export_image(ee_object, filename, scale=None, crs=None, region=None, file
         crs (str, optional): A default CRS string to use for any bands that do not explicitly specify one. Defaults to None.
         region (object, optional): A polygon specifying a region to download; ignored if crs and crs_transform is specified. Defaults to None.
         file_per_band (bool, optional): Whether to produce a different GeoTIFF per band. Defaults to False.
+        workers (int, optional): The number of tiles to download concurrently when the image is split into tiles. Defaults to 4.
+        dry_run (bool, optional): If True, only prints the estimated size of the export and returns the export plan without downloading. Defaults to False.
+
+    Returns:
+        dict: The export plan if dry_run is True, otherwise None.
     """
-    import requests
-    import zipfile
     ee_initialize()
 
     if not isinstance(ee_object, ee.Image):
@@ -1601,127 +2035,354 @@ def ee_export_image(ee_object, filename, scale=None, crs=None, region=None, file
 
     filename = os.path.abspath(filename)
     basename = os.path.basename(filename)
-    name = os.path.splitext(basename)[0]
     filetype = os.path.splitext(basename)[1][1:].lower()
-    filename_zip = filename.replace('.tif', '.zip')
 
     if filetype != 'tif':
         print('The filename must end with .tif')
         return
 
+    if scale is None:
+        scale = ee_object.projection().nominalScale().multiply(10)
+
+    if dry_run:
+        try:
+            plan = plan_export(ee_object, region=region, scale=scale, crs=crs)
+        except Exception as e:
+            print('An error occurred while planning the export.')
+            print(e)
+            return
+        print('Image size: {} x {} pixels, {} bands, {:.1f} MB. Requests needed: {}'.format(
+            plan['width'], plan['height'], len(plan['band_names']), plan['total_bytes'] / 1024 ** 2, plan['tile_count']))
+        return plan
+
     try:
+        _export_image(ee_object, filename, scale=scale, crs=crs, region=region,
+                      file_per_band=file_per_band, workers=workers)
+    except Exception as e:
+        print('An error occurred while downloading.')
+        print(e)
+        return
+
+    if file_per_band:
+        print('Data downloaded to {}'.format(os.path.dirname(filename)))
+    else:
+        print('Data downloaded to {}'.format(filename))
+
+
+def _export_image(ee_object, filename, plan=None, scale=None, crs=None, region=None, file_per_band=False, workers=4, verbose=True):
+    """Downloads an image, as a single request or as tiles according to its export plan. Without a plan, the image is first requested as a single download, and it is only planned and split into tiles if the request exceeds the size limit, so that small images need no extra query. Unlike ee_export_image(), errors are raised rather than printed.
+
+    Args:
+        ee_object (object): The ee.Image to download.
+        filename (str): Output filename for the exported image.
+        plan (dict, optional): The export plan returned by plan_export(). Defaults to None.
+        scale (float, optional): The scale of the export. Defaults to None.
+        crs (str, optional): The CRS of the export. Defaults to None.
+        region (object, optional): The region to download. Defaults to None.
+        file_per_band (bool, optional): Whether to produce a different GeoTIFF per band. Defaults to False.
+        workers (int, optional): The number of tiles to download concurrently when the image is split into tiles. Defaults to 4.
+        verbose (bool, optional): Whether to print the progress. Defaults to True.
+    """
+    if plan is None:
+        try:
+            _download_image(ee_object, filename, scale=scale, crs=crs, region=region,
+                            file_per_band=file_per_band, verbose=verbose)
+            return
+        except ee.EEException as e:
+            if not is_request_too_large(e):
+                raise
+        plan = plan_export(ee_object, region=region, scale=scale, crs=crs)
+
+    if plan['tile_count'] > 1:
+        if verbose:
+            print('The image ({} x {} pixels, {:.1f} MB) exceeds the request size limit. Downloading it as {} tiles ...'.format(
+                plan['width'], plan['height'], plan['total_bytes'] / 1024 ** 2, plan['tile_count']))
+        download_image_tiles(ee_object, filename, plan,
+                             file_per_band=file_per_band, workers=workers, verbose=verbose)
+        return
+
+    _download_image(ee_object, filename, scale=scale, crs=crs, region=region,
+                    file_per_band=file_per_band, verbose=verbose)
+
+
+def _download_image(ee_object, filename, scale=None, crs=None, region=None, file_per_band=False, verbose=True):
+    """Downloads an image with a single getDownloadURL request."""
+    if verbose:
         print('Generating URL ...')
-        params = {'name': name, 'filePerBand': file_per_band}
-        if scale is None:
-            scale = ee_object.projection().nominalScale().multiply(10)
-        params['scale'] = scale
-        if region is None:
-            region = ee_object.geometry()
-        params['region'] = region
-        if crs is not None:
-            params['crs'] = crs
-
-        url = ee_object.getDownloadURL(params)
+    name = os.path.splitext(os.path.basename(filename))[0]
+    params = {'name': name, 'filePerBand': file_per_band}
+    params['scale'] = scale
+    if region is None:
+        region = ee_object.geometry()
+    params['region'] = region
+    if crs is not None:
+        params['crs'] = crs
+
+    url = ee_object.getDownloadURL(params)
+    if verbose:
         print('Downloading data from {}\nPlease wait ...'.format(url))
-        r = requests.get(url, stream=True)
+    extract_zip_url(url, os.path.dirname(filename))
 
-        if r.status_code != 200:
-            print('An error occurred while downloading.')
-            return
 
-        with open(filename_zip, 'wb') as fd:
-            for chunk in r.iter_content(chunk_size=1024):
-                fd.write(chunk)
+def ee_export_image_collection(ee_object, out_dir, scale=None, crs=None, region=None, file_per_band=False, workers=4, retries=2, stack=False):
+    """Exports the images of an ee.ImageCollection as GeoTIFFs named after their system:index. The images are downloaded concurrently, and images that fail to download are retried. With stack=True, the collection is stacked into a single multiband image with toBands(), downloaded in as few requests as possible and split locally, which is much faster for long time series over small areas.
+
+    Args:
+        ee_object (object): The ee.ImageCollection to download.
+        out_dir (str): The output directory for the exported images.
+        scale (float, optional): A default scale to use for any bands that do not specify one; ignored if crs and crs_transform is specified. Defaults to None.
+        crs (str, optional): A default CRS string to use for any bands that do not explicitly specify one. Defaults to None.
+        region (object, optional): A polygon specifying a region to download; ignored if crs and crs_transform is specified. Defaults to None.
+        file_per_band (bool, optional): Whether to produce a different GeoTIFF per band. Defaults to False.
+        workers (int, optional): The number of images to download concurrently. Defaults to 4.
+        retries (int, optional): The number of times to retry an image that failed to download. Defaults to 2.
+        stack (bool, optional): Whether to download the collection as a single stacked image (requires rasterio). Defaults to False.
+
+    Returns:
+        list: The system:index of the images that failed to download.
+    """
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    ee_initialize()
+
+    if not isinstance(ee_object, ee.ImageCollection):
+        print('The ee_object must be an ee.ImageCollection.')
+        return
+
+    out_dir = os.path.abspath(out_dir)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
 
+    try:
+        if stack:
+            check_rasterio('stacked downloads')
+            ids = ee_object.aggregate_array('system:index').getInfo()
+        else:
+            # The system:index, footprints and band types of all images are fetched with a single query.
+            image_scale = scale
+            if image_scale is None:
+                def image_scale(image):
+                    return image.projection().nominalScale().multiply(10)
+            ids, plans = plan_collection_export(
+                ee_object, region=region, scale=image_scale, crs=crs)
+            if any(plan['tile_count'] > 1 for plan in plans.values()):
+                check_rasterio('mosaicking tiled downloads')
     except Exception as e:
-        print('An error occurred while downloading.')
         print(e)
         return
 
+    count = len(ids)
+    print("Total number of images: {}\n".format(count))
+    get_session(workers)
+
+    if stack:
+        tmp_dir = tempfile.mkdtemp(prefix='.stack_', dir=out_dir)
+        try:
+            filename, plan = _download_stack(
+                ee_object, tmp_dir, scale=scale, crs=crs, region=region, workers=workers)
+            split_image_stack(filename, out_dir, ids,
+                              plan['band_names'], file_per_band=file_per_band)
+        except Exception as e:
+            print('An error occurred while downloading.')
+            print(e)
+            return ids
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        print('{} images downloaded to {} in {} request(s)'.format(
+            count, out_dir, plan['tile_count']))
+        return []
+
+    def export(index):
+        image = _collection_image(ee_object, index)
+        filename = os.path.join(out_dir, index + '.tif')
+        plan = plans[index]
+
+        for attempt in range(retries + 1):
+            try:
+                # Images are downloaded concurrently, so the tiles of each image are downloaded one at a time.
+                _export_image(image, filename, plan, scale=plan['scale'], crs=crs, region=region,
+                              file_per_band=file_per_band, workers=1, verbose=False)
+                return
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                print('Retrying {} after an error: {}'.format(index, e))
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(export, index): index for index in ids}
+        finished = 0
+        for future in as_completed(futures):
+            index = futures[future]
+            finished += 1
+            try:
+                future.result()
+                print('Exported {}/{}: {}.tif'.format(finished, count, index))
+            except Exception as e:
+                failed.append(index)
+                print('Failed {}/{}: {}.tif\n{}'.format(finished, count, index, e))
+
+    print('\n{} of {} images downloaded to {}'.format(
+        count - len(failed), count, out_dir))
+    if failed:
+        print('Failed images: {}'.format(', '.join(failed)))
+    return failed
+
+
+def _collection_image(ee_object, index):
+    """Returns the image of an ee.ImageCollection with the given system:index. The filter is evaluated by the server as part of the download request."""
+    return ee.Image(ee_object.filter(ee.Filter.eq('system:index', index)).first())
+
+
+def _download_stack(ee_object, out_dir, scale=None, crs=None, region=None, workers=4):
+    """Stacks an ee.ImageCollection into a single multiband image with toBands() and downloads it as out_dir/stack.tif.
+
+    Returns:
+        tuple: The file path of the GeoTIFF and the export plan.
+    """
+    image = ee_object.toBands()
+    if scale is None:
+        scale = ee.Image(ee_object.first()).projection(
+        ).nominalScale().multiply(10)
+    plan = plan_export(image, region=region, scale=scale, crs=crs)
+    filename = os.path.join(out_dir, 'stack.tif')
+    _export_image(image, filename, plan, scale=scale, crs=crs,
+                  region=region, workers=workers, verbose=False)
+    return filename, plan
+
+
+def ee_image_collection_to_numpy(ee_object, region=None, scale=None, crs=None, workers=4):
+    """Downloads an ee.ImageCollection into a (time, band, y, x) numpy array. The collection is stacked into a single multiband image with toBands() and downloaded in as few requests as possible (requires rasterio). All images must have the same bands.
+
+    Args:
+        ee_object (object): The ee.ImageCollection to download.
+        region (object, optional): A polygon specifying a region to download. Defaults to None.
+        scale (float, optional): The scale of the download. Defaults to None.
+        crs (str, optional): The CRS of the download. Defaults to None.
+        workers (int, optional): The number of tiles to download concurrently. Defaults to 4.
+
+    Returns:
+        tuple: The (time, band, y, x) numpy array, the system:index of the images and the band names.
+    """
+    import shutil
+    import tempfile
+    ee_initialize()
+
+    if not isinstance(ee_object, ee.ImageCollection):
+        print('The ee_object must be an ee.ImageCollection.')
+        return
+
     try:
-        z = zipfile.ZipFile(filename_zip)
-        z.extractall(os.path.dirname(filename))
-        os.remove(filename_zip)
+        check_rasterio('stacked downloads')
+    except ImportError as e:
+        print(e)
+        return
 
-        if file_per_band:
-            print('Data downloaded to {}'.format(os.path.dirname(filename)))
-        else:
-            print('Data downloaded to {}'.format(filename))
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        ids = ee_object.aggregate_array('system:index').getInfo()
+        filename, plan = _download_stack(
+            ee_object, tmp_dir, scale=scale, crs=crs, region=region, workers=workers)
+        return read_image_stack(filename, ids, plan['band_names'])
     except Exception as e:
+        print('An error occurred while downloading.')
         print(e)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
-def ee_export_image_collection(ee_object, out_dir, scale=None, crs=None, region=None, file_per_band=False):
+def ee_to_cube(ee_object, region=None, scale=None, path=None, crs=None, chunks=(1, 256, 256), default_value=None, workers=4):
+    """Downloads an ee.ImageCollection into a chunked (time, band, y, x) data cube on disk, with the ids, dates and bands of the images. Chunks are downloaded concurrently and saved as compressed .npz files, and chunks that already exist are skipped, so an interrupted download can be resumed by calling ee_to_cube() again. The cube is read back lazily by slicing it into numpy arrays.
 
-    import requests
-    import zipfile
+    Args:
+        ee_object (object): The ee.ImageCollection to download. All images must have the same bands.
+        region (object, optional): A polygon specifying a region to download. Defaults to the footprint of the first image.
+        scale (float, optional): The scale in meters. Defaults to the nominal scale of the first image.
+        path (str, optional): The directory of the cube. Defaults to None, which uses a cube directory in the current working directory.
+        crs (str, optional): The CRS. Defaults to the CRS of the first image.
+        chunks (tuple, optional): The (time, height, width) of the chunks. Defaults to (1, 256, 256).
+        default_value (float, optional): A value for masked pixels. Defaults to None.
+        workers (int, optional): The number of chunks to download concurrently. Defaults to 4.
+
+    Returns:
+        Cube: The cube, which can be sliced like a numpy array, e.g., cube[0:10, 0, :, :].
+    """
     ee_initialize()
 
     if not isinstance(ee_object, ee.ImageCollection):
         print('The ee_object must be an ee.ImageCollection.')
         return
-
-    if not os.path.exists(out_dir):
-        os.makedirs(out_dir)
+    if path is None:
+        path = os.path.join(os.getcwd(), 'cube')
+    path = os.path.abspath(path)
 
     try:
+        return write_cube(ee_object, path, region=region, scale=scale, crs=crs, chunks=chunks,
+                          default_value=default_value, workers=workers)
+    except Exception as e:
+        print('An error occurred while downloading.')
+        print(e)
+
 
-        count = int(ee_object.size().getInfo())
-        print("Total number of images: {}\n".format(count))
+def extract_chips(ee_object, points, size=64, scale=None, out=None, crs=None, default_value=None, workers=4):
+    """Extracts square chips of an image centered on many points into a single (point, y, x, band) numpy array, such as for machine learning training sets. Nearby chips are grouped into shared requests, which are downloaded concurrently.
 
-        for i in range(0, count):
-            image = ee.Image(ee_object.toList(count).get(i))
-            name = image.get('system:index').getInfo() + '.tif'
-            filename = os.path.join(os.path.abspath(out_dir), name)
-            print('Exporting {}/{}: {}'.format(i+1, count, name))
-            ee_export_image(image, filename=filename, scale=scale,
-                            crs=crs, region=region, file_per_band=file_per_band)
-            print('\n')
+    Args:
+        ee_object (object): The ee.Image to extract the chips from.
+        points (object): The points, as an ee.FeatureCollection, a MultiPoint ee.Geometry or a list of (lon, lat) coordinates.
+        size (int, optional): The width and height of the chips, in pixels. Defaults to 64.
+        scale (float, optional): The scale in meters. Defaults to the nominal scale of the image.
+        out (str, optional): If given, the chips are stored in a numpy memmap in this .npy file, and the index of the chips in a .csv file with the same name. Defaults to None.
+        crs (str, optional): The CRS. Defaults to the CRS of the first band of the image.
+        default_value (float, optional): A value for masked pixels. Defaults to None.
+        workers (int, optional): The number of requests to download concurrently. Defaults to 4.
 
+    Returns:
+        tuple: The (point, y, x, band) numpy array and the index of the chips, a list of dictionaries with the id and projected coordinates of each point and the position of its chip.
+    """
+    ee_initialize()
+
+    if not isinstance(ee_object, ee.Image):
+        print('The ee_object must be an ee.Image.')
+        return
+
+    try:
+        return read_chips(ee_object, points, size=size, scale=scale, crs=crs, out=out,
+                          default_value=default_value, workers=workers)
     except Exception as e:
+        print('An error occurred while extracting the chips.')
         print(e)
 
 
-def ee_to_numpy(ee_object, bands=None, region=None, properties=None, default_value=None):
-    """Extracts a rectangular region of pixels from an image into a 2D numpy array per band.
+def ee_to_numpy(ee_object, bands=None, region=None, properties=None, default_value=None, scale=None, crs=None, masked=False, filename=None, workers=4):
+    """Extracts a rectangular region of pixels from an image into a 3D numpy array with the native data type of the bands. Large regions are split into blocks that fit the request size limit, which are downloaded concurrently.
 
     Args:
         ee_object (object): The image to sample.
         bands (list, optional): The list of band names to extract. Defaults to None.
-        region (object, optional): The region whose projected bounding box is used to sample the image. Defaults to the footprint in each band.
-        properties (list, optional): The properties to copy over from the sampled image. Defaults to all non-system properties.
+        region (object, optional): The region whose projected bounding box is used to sample the image. Defaults to the footprint of the image.
+        properties (list, optional): Not used; kept for backward compatibility. Defaults to None.
         default_value (float, optional): A default value used when a sampled pixel is masked or outside a band's footprint. Defaults to None.
+        scale (float, optional): The scale in meters. Defaults to the nominal scale of the image.
+        crs (str, optional): The CRS. Defaults to the CRS of the first band of the image.
+        masked (bool, optional): Whether to return a numpy masked array, using the masks of the bands, instead of a sentinel value. Defaults to False.
+        filename (str, optional): If given, the array is a numpy memmap stored in this .npy file, for outputs larger than memory. Defaults to None.
+        workers (int, optional): The number of blocks to fetch concurrently. Defaults to 4.
 
     Returns:
         array: A 3D numpy array.
     """
-    import numpy as np
     if not isinstance(ee_object, ee.Image):
         print('The input must be an ee.Image.')
         return
 
-    if region is None:
-        region = ee_object.geometry()
-
     try:
-
         if bands is not None:
             ee_object = ee_object.select(bands)
-        else:
-            bands = ee_object.bandNames().getInfo()
-
-        band_count = len(bands)
-        band_arrs = ee_object.sampleRectangle(
-            region=region, properties=properties, defaultValue=default_value)
-        band_values = []
-
-        for band in bands:
-            band_arr = band_arrs.get(band).getInfo()
-            band_value = np.array(band_arr)
-            band_values.append(band_value)
-
-        image = np.dstack(band_values)
-        return image
+        return read_image(ee_object, region=region, scale=scale, crs=crs, default_value=default_value,
+                          masked=masked, filename=filename, workers=workers)
 
     except Exception as e:
         print(e)
@@ -0,0 +1,410 @@
+"""Module for running export jobs from a persistent queue. The queue is stored in a SQLite database (~/.geemap/jobs.db by default), so that jobs interrupted by a kernel restart can be resumed, and finished jobs are not downloaded again.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import contextlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DB = os.path.join(os.path.expanduser('~'), '.geemap', 'jobs.db')
+
+STATUSES = ['pending', 'running', 'done', 'failed']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    output TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER,
+    error TEXT,
+    pid INTEGER,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+def _encode_params(params):
+    """Encodes job parameters as JSON. Earth Engine objects are serialized with ee.serializer."""
+    import ee
+
+    encoded = {}
+    for key, value in params.items():
+        if isinstance(value, ee.ComputedObject):
+            value = {'__ee__': ee.serializer.toJSON(value),
+                     'type': type(value).__name__}
+        encoded[key] = value
+    return json.dumps(encoded)
+
+
+def _decode_params(text):
+    import ee
+
+    params = json.loads(text)
+    for key, value in params.items():
+        if isinstance(value, dict) and '__ee__' in value:
+            obj = ee.deserializer.fromJSON(value['__ee__'])
+            cls = getattr(ee, value['type'], None)
+            params[key] = cls(obj) if cls is not None else obj
+    return params
+
+
+def _output_bytes(output):
+    """Returns the size of the output of a job. Outputs split across files, such as shapefiles or GeoTIFFs per band, are summed."""
+    if os.path.isdir(output):
+        directory, prefix = output, ''
+    else:
+        directory = os.path.dirname(output)
+        prefix = os.path.splitext(os.path.basename(output))[0] + '.'
+    if not os.path.isdir(directory):
+        return 0
+    paths = [os.path.join(directory, f)
+             for f in os.listdir(directory) if f.startswith(prefix)]
+    return sum(os.path.getsize(p) for p in paths if os.path.isfile(p))
+
+
+def _run_image(params, output):
+    from .geemap import _export_image
+
+    image = params.pop('ee_object')
+    scale = params.get('scale')
+    if scale is None:
+        scale = image.projection().nominalScale().multiply(10)
+    _export_image(image, output, scale=scale, verbose=False,
+                  **{k: v for k, v in params.items() if k != 'scale'})
+
+
+def _run_vector(params, output):
+    from .geemap import ee_export_vector
+
+    # ee_export_vector prints errors instead of raising them, and writes the output only once complete.
+    if os.path.exists(output):
+        os.remove(output)
+    ee_export_vector(params.pop('ee_object'), output, **params)
+    if not os.path.exists(output):
+        raise IOError('The export of {} failed.'.format(output))
+
+
+def _run_image_collection(params, output):
+    from .geemap import ee_export_image_collection
+
+    failed = ee_export_image_collection(params.pop('ee_object'), output, **params)
+    if failed is None or failed:
+        raise IOError('{} images failed to export.'.format(
+            'All' if failed is None else len(failed)))
+
+
+def _run_url(params, output):
+    from .download import download_file
+
+    download_file(params['url'], output, checksum=params.get('checksum'))
+
+
+JOB_TYPES = {
+    'image': _run_image,
+    'vector': _run_vector,
+    'image_collection': _run_image_collection,
+    'url': _run_url,
+}
+
+
+def _job_params(kind):
+    """Returns the required and optional parameters of a type of job, read from the signature of its export function.
+
+    Returns:
+        tuple: The sets of required and optional parameter names.
+    """
+    import inspect
+    from .geemap import _export_image, ee_export_vector, ee_export_image_collection
+
+    if kind == 'url':
+        return {'url'}, {'checksum'}
+    # The output and the arguments set by the runners are not parameters of the jobs.
+    function, skip = {
+        'image': (_export_image, ['filename', 'plan', 'verbose']),
+        'vector': (ee_export_vector, ['filename']),
+        'image_collection': (ee_export_image_collection, ['out_dir']),
+    }[kind]
+    required, optional = set(), set()
+    for name, parameter in inspect.signature(function).parameters.items():
+        if name in skip:
+            continue
+        if parameter.default is inspect.Parameter.empty:
+            required.add(name)
+        else:
+            optional.add(name)
+    return required, optional
+
+
+class JobQueue(object):
+    """A persistent queue of export jobs stored in a SQLite database. Jobs are run with bounded concurrency and retried when they fail. Jobs that were running when the process died are run again by the next call to run().
+
+    Args:
+        path (str, optional): The path of the SQLite database. Defaults to ~/.geemap/jobs.db.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = DEFAULT_DB
+        self.path = os.path.abspath(path)
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # A connection per operation, so that the queue can be used from several threads and processes. The transaction is committed, or rolled back on errors, and the connection is closed.
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _update(self, job_id, **values):
+        values['updated'] = time.time()
+        columns = ', '.join('{} = ?'.format(key) for key in values)
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET {} WHERE id = ?'.format(columns),
+                         list(values.values()) + [job_id])
+
+    def add(self, kind, output, **params):
+        """Adds a job to the queue. Adding a job with the same output as an unfinished job returns the existing job.
+
+        Args:
+            kind (str): The type of the job, one of 'image', 'vector', 'image_collection' or 'url'.
+            output (str): The output file (or directory for 'image_collection').
+            **params: The parameters of the export function, such as ee_object, scale and region. Earth Engine objects are serialized.
+
+        Returns:
+            int: The id of the job.
+        """
+        if kind not in JOB_TYPES:
+            raise ValueError('The job type must be one of: {}'.format(
+                ', '.join(JOB_TYPES)))
+        required, optional = _job_params(kind)
+        unknown = set(params) - required - optional
+        if unknown:
+            raise ValueError('Unknown parameters for a {} job: {}'.format(
+                kind, ', '.join(sorted(unknown))))
+        missing = required - set(params)
+        if missing:
+            raise ValueError('Missing parameters for a {} job: {}'.format(
+                kind, ', '.join(sorted(missing))))
+        output = os.path.abspath(output)
+        with self._connect() as conn:
+            row = conn.execute("SELECT id FROM jobs WHERE output = ? AND status != 'done'",
+                               (output,)).fetchone()
+            if row is not None:
+                return row['id']
+            now = time.time()
+            cursor = conn.execute('INSERT INTO jobs (kind, params, output, created, updated) VALUES (?, ?, ?, ?, ?)',
+                                  (kind, _encode_params(params), output, now, now))
+            return cursor.lastrowid
+
+    def add_image(self, ee_object, filename, **kwargs):
+        """Adds an ee_export_image() job to the queue.
+
+        Args:
+            ee_object (object): The ee.Image to download.
+            filename (str): Output filename for the exported image.
+            **kwargs: Other parameters of ee_export_image(), such as scale, crs, region and file_per_band.
+
+        Returns:
+            int: The id of the job.
+        """
+        return self.add('image', filename, ee_object=ee_object, **kwargs)
+
+    def add_vector(self, ee_object, filename, **kwargs):
+        """Adds an ee_export_vector() job to the queue.
+
+        Args:
+            ee_object (object): The ee.FeatureCollection to export.
+            filename (str): Output file name.
+            **kwargs: Other parameters of ee_export_vector(), such as selectors.
+
+        Returns:
+            int: The id of the job.
+        """
+        return self.add('vector', filename, ee_object=ee_object, **kwargs)
+
+    def add_image_collection(self, ee_object, out_dir, **kwargs):
+        """Adds an ee_export_image_collection() job to the queue.
+
+        Args:
+            ee_object (object): The ee.ImageCollection to download.
+            out_dir (str): The output directory for the exported images.
+            **kwargs: Other parameters of ee_export_image_collection(), such as scale, region and stack.
+
+        Returns:
+            int: The id of the job.
+        """
+        return self.add('image_collection', out_dir, ee_object=ee_object, **kwargs)
+
+    def list(self, status=None):
+        """Lists the jobs of the queue.
+
+        Args:
+            status (str, optional): Only lists jobs with this status, one of 'pending', 'running', 'done' or 'failed'. Defaults to None.
+
+        Returns:
+            list: The jobs as dictionaries, without their parameters.
+        """
+        query = 'SELECT id, kind, output, status, attempts, bytes, error, created, updated FROM jobs'
+        args = []
+        if status is not None:
+            query += ' WHERE status = ?'
+            args.append(status)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query + ' ORDER BY id', args)]
+
+    def retry(self, job_ids=None):
+        """Marks failed jobs as pending, so that they are run again.
+
+        Args:
+            job_ids (list, optional): The ids of the jobs to retry. Defaults to None, which retries all failed jobs.
+
+        Returns:
+            int: The number of jobs marked as pending.
+        """
+        query = "UPDATE jobs SET status = 'pending', attempts = 0, error = NULL WHERE status = 'failed'"
+        args = []
+        if job_ids:
+            query += ' AND id IN ({})'.format(', '.join('?' * len(job_ids)))
+            args = list(job_ids)
+        with self._connect() as conn:
+            return conn.execute(query, args).rowcount
+
+    def clear(self, status='done'):
+        """Removes jobs from the queue.
+
+        Args:
+            status (str, optional): The status of the jobs to remove. Defaults to 'done'. Use None to remove all jobs that are not running.
+
+        Returns:
+            int: The number of jobs removed.
+        """
+        with self._connect() as conn:
+            if status is None:
+                return conn.execute("DELETE FROM jobs WHERE status != 'running'").rowcount
+            return conn.execute('DELETE FROM jobs WHERE status = ?', (status,)).rowcount
+
+    def _recover(self):
+        """Marks jobs left running by processes that no longer exist as pending."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, pid FROM jobs WHERE status = 'running'").fetchall()
+        for row in rows:
+            if not _pid_exists(row['pid']):
+                self._update(row['id'], status='pending', pid=None)
+
+    def _claim(self, job_id):
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE jobs SET status = 'running', pid = ?, updated = ? WHERE id = ? AND status = 'pending'",
+                                  (os.getpid(), time.time(), job_id))
+            return cursor.rowcount == 1
+
+    def _run_job(self, job_id, retries, retry_delay, verbose):
+        if not self._claim(job_id):
+            return None
+        result = None
+        try:
+            result = self._run_claimed(job_id, retries, retry_delay, verbose)
+            return result
+        finally:
+            # A job interrupted in this process, whose pid is still alive, would otherwise be left running and never recovered.
+            if result is None:
+                self._update(job_id, status='pending', pid=None)
+
+    def _run_claimed(self, job_id, retries, retry_delay, verbose):
+        from .geemap import ee_initialize
+
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+        attempts = row['attempts']
+        while True:
+            attempts += 1
+            self._update(job_id, attempts=attempts)
+            try:
+                # Earth Engine objects can only be deserialized once the session is initialized.
+                if row['kind'] != 'url':
+                    ee_initialize()
+                JOB_TYPES[row['kind']](_decode_params(
+                    row['params']), row['output'])
+            except Exception as e:
+                error = '{}: {}'.format(type(e).__name__, e)
+                if attempts > retries:
+                    self._update(job_id, status='failed', error=error, pid=None)
+                    if verbose:
+                        print('Job {} failed: {}'.format(job_id, error))
+                    return 'failed'
+                self._update(job_id, error=error)
+                if verbose:
+                    print('Job {} failed, retrying: {}'.format(job_id, error))
+                time.sleep(retry_delay * 2 ** (attempts - 1))
+                continue
+
+            self._update(job_id, status='done', error=None, pid=None,
+                         bytes=_output_bytes(row['output']))
+            if verbose:
+                print('Job {} done: {}'.format(job_id, row['output']))
+            return 'done'
+
+    def run(self, workers=2, retries=2, retry_delay=5, verbose=True):
+        """Runs the pending jobs of the queue, including jobs interrupted by a previous crash or kernel restart.
+
+        Args:
+            workers (int, optional): The number of jobs to run concurrently. Defaults to 2.
+            retries (int, optional): The number of times to retry a failed job. Defaults to 2.
+            retry_delay (float, optional): The delay before the first retry, in seconds. The delay doubles after each attempt. Defaults to 5.
+            verbose (bool, optional): Whether to print the progress. Defaults to True.
+
+        Returns:
+            dict: The number of jobs that were done and that failed.
+        """
+        self._recover()
+        with self._connect() as conn:
+            job_ids = [row['id'] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = 'pending' ORDER BY id")]
+
+        summary = {'done': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._run_job, job_id, retries, retry_delay, verbose)
+                       for job_id in job_ids]
+            try:
+                for future in futures:
+                    result = future.result()
+                    if result is not None:
+                        summary[result] += 1
+            finally:
+                # Jobs that have not started are left pending if run() is interrupted.
+                for future in futures:
+                    future.cancel()
+        if verbose:
+            print('{done} jobs done, {failed} jobs failed.'.format(**summary))
+        return summary
+
+
+def _pid_exists(pid):
+    # os.kill() would terminate the process on Windows, where jobs left running are always recovered.
+    if pid is None or os.name == 'nt':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
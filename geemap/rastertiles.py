@@ -0,0 +1,327 @@
+"""Module for serving local rasters (e.g., GeoTIFFs exported with ee_export_image() and numpy arrays) to the map as XYZ tiles.
+An overview pyramid is built once by block-mean downsampling, and stored as memory-mapped .npy files for GeoTIFFs. Tiles are sampled from the overview level closest to their resolution and rendered on demand.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from .tiles import EARTH_RADIUS, TILE_SIZE, world_to_lonlat
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.geemap', 'raster_cache')
+
+# The coordinate reference systems whose pixels can be sampled analytically from Web Mercator tiles.
+SUPPORTED_CRS = ['EPSG:4326', 'EPSG:3857']
+
+# The number of rows downsampled at a time when building overviews.
+STRIP_ROWS = 1024
+
+
+def _block_mean(array, out, nodata=None, mask=None):
+    """Downsamples a (y, x, band) array by 2 with the mean of each 2 x 2 block, ignoring NaN, nodata and masked pixels. Blocks without valid pixels are NaN.
+
+    Args:
+        array (array): The (y, x, band) array, which can be a memmap.
+        out (array): The float32 output array, with shape ((y + 1) // 2, (x + 1) // 2, band).
+        nodata (float, optional): The nodata value of the array. Defaults to None.
+        mask (array, optional): A boolean (y, x, band) array of masked pixels. Defaults to None.
+    """
+    import numpy as np
+
+    height, width, bands = array.shape
+    for row in range(0, height, STRIP_ROWS):
+        strip = np.asarray(array[row:row + STRIP_ROWS], dtype='float32')
+        rows = strip.shape[0]
+        padded = np.full((rows + rows % 2, width + width % 2, bands), np.nan, dtype='float32')
+        padded[:rows, :width] = strip
+        window = padded[:rows, :width]
+        if nodata is not None:
+            window[window == nodata] = np.nan
+        if mask is not None:
+            window[np.asarray(mask[row:row + STRIP_ROWS])] = np.nan
+
+        blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2, bands)
+        valid = ~np.isnan(blocks)
+        total = np.where(valid, blocks, 0).sum(axis=(1, 3))
+        count = valid.sum(axis=(1, 3))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[row // 2:row // 2 + total.shape[0]] = np.where(count > 0, total / count, np.nan)
+
+
+def _read_geotiff(filename, cache_dir):
+    """Copies the bands of a GeoTIFF into a (y, x, band) .npy memmap in the cache directory, unless it is already cached.
+
+    Returns:
+        tuple: The memmap, the CRS, the transform, the nodata value and the band names.
+    """
+    import numpy as np
+    import rasterio
+    from rasterio.windows import Window
+
+    with rasterio.open(filename) as src:
+        crs = src.crs.to_string() if src.crs is not None else None
+        epsg = src.crs.to_epsg() if src.crs is not None else None
+        if epsg is not None:
+            crs = 'EPSG:{}'.format(epsg)
+        transform = list(src.transform)[:6]
+        nodata = src.nodata
+        band_names = [d or 'b{}'.format(i + 1)
+                      for i, d in enumerate(src.descriptions)]
+        path = os.path.join(cache_dir, 'level_0.npy')
+        if os.path.exists(path):
+            return np.load(path, mmap_mode='r'), crs, transform, nodata, band_names
+
+        tmp = path + '.part'
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=src.dtypes[0],
+                                        shape=(src.height, src.width, src.count))
+        for row in range(0, src.height, STRIP_ROWS):
+            rows = min(STRIP_ROWS, src.height - row)
+            data = src.read(window=Window(0, row, src.width, rows))
+            out[row:row + rows] = data.transpose(1, 2, 0)
+        out.flush()
+        del out
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode='r'), crs, transform, nodata, band_names
+
+
+class RasterTileIndex(object):
+    """An overview pyramid of a georeferenced (y, x, band) array, which renders XYZ tiles on demand. The array must be in EPSG:4326 or EPSG:3857 and not rotated, so that the pixels of a Web Mercator tile can be sampled directly.
+
+    Args:
+        array (array): The (y, x, band) or (y, x) numpy array, numpy masked array or memmap.
+        crs (str): The CRS of the array, 'EPSG:4326' or 'EPSG:3857'.
+        transform (list): The affine transform of the array, as [x_res, 0, x0, 0, -y_res, y0].
+        vis_params (dict, optional): The visualization parameters: bands, min, max, gamma and palette. Defaults to None, which stretches the first band (or first three bands) between their minimum and maximum.
+        band_names (list, optional): The names of the bands, for selecting bands by name. Defaults to None.
+        nodata (float, optional): The nodata value of the array. Defaults to None.
+        cache_dir (str, optional): A directory where the overviews are stored as .npy memmaps and reused. Defaults to None, which keeps the overviews in memory.
+        cache_size (int, optional): The number of rendered tiles to keep in memory. Defaults to 512.
+    """
+
+    def __init__(self, array, crs, transform, vis_params=None, band_names=None, nodata=None, cache_dir=None, cache_size=512):
+        import numpy as np
+
+        if crs not in SUPPORTED_CRS:
+            raise ValueError('The CRS must be one of {}, got {}. Reproject the raster first.'.format(
+                ', '.join(SUPPORTED_CRS), crs))
+        if transform[1] != 0 or transform[3] != 0:
+            raise ValueError('Rotated rasters are not supported.')
+
+        mask = None
+        if isinstance(array, np.ma.MaskedArray):
+            if array.mask is not np.ma.nomask:
+                mask = array.mask
+            array = array.data
+        if array.ndim == 2:
+            array = array[:, :, np.newaxis]
+            if mask is not None:
+                mask = mask[:, :, np.newaxis]
+
+        self.crs = crs
+        self.transform = list(transform)
+        self.band_names = band_names
+        self.nodata = nodata
+        self.cache_size = cache_size
+        self.levels = [array]
+        self._mask = mask
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Overviews are built until they fit a tile.
+        level = 1
+        while max(self.levels[-1].shape[:2]) > TILE_SIZE:
+            previous = self.levels[-1]
+            shape = ((previous.shape[0] + 1) // 2,
+                     (previous.shape[1] + 1) // 2, previous.shape[2])
+            path = None if cache_dir is None else os.path.join(
+                cache_dir, 'level_{}.npy'.format(level))
+            if path is not None and os.path.exists(path):
+                overview = np.load(path, mmap_mode='r')
+            else:
+                tmp = None if path is None else path + '.part'
+                overview = np.empty(shape, dtype='float32') if path is None else np.lib.format.open_memmap(
+                    tmp, mode='w+', dtype='float32', shape=shape)
+                _block_mean(previous, overview, nodata if level == 1 else None,
+                            mask if level == 1 else None)
+                if path is not None:
+                    overview.flush()
+                    del overview
+                    os.replace(tmp, path)
+                    overview = np.load(path, mmap_mode='r')
+            self.levels.append(overview)
+            level += 1
+
+        if vis_params is None:
+            vis_params = {}
+        vis_params = dict(vis_params)
+        if 'min' not in vis_params and 'max' not in vis_params:
+            # Stretches the bands between the extremes of the smallest overview.
+            coarsest = np.asarray(self.levels[-1], dtype='float64')
+            if len(self.levels) == 1:
+                coarsest = coarsest.copy()
+                if nodata is not None:
+                    coarsest[coarsest == nodata] = np.nan
+                if mask is not None:
+                    coarsest[mask] = np.nan
+            with np.errstate(invalid='ignore'):
+                vis_params['min'] = float(np.nanmin(coarsest)) if np.isfinite(coarsest).any() else 0.0
+                vis_params['max'] = float(np.nanmax(coarsest)) if np.isfinite(coarsest).any() else 1.0
+        self.vis_params = vis_params
+
+    @property
+    def bounds(self):
+        """The bounds of the array as ((south, west), (north, east))."""
+        height, width = self.levels[0].shape[:2]
+        x_res, _, x0, _, y_res, y0 = self.transform
+        x1, y1 = x0 + width * x_res, y0 + height * y_res
+        if self.crs == 'EPSG:3857':
+            size = 2 * math.pi * EARTH_RADIUS
+            (x0, y0), (x1, y1) = [world_to_lonlat(
+                x / size + 0.5, 0.5 - y / size) for x, y in [(x0, y0), (x1, y1)]]
+        return (min(y0, y1), min(x0, x1)), (max(y0, y1), max(x0, x1))
+
+    def _tile_coords(self, z, x, y):
+        """Returns the coordinates of the centers of the pixels of a tile in the CRS of the array, as a column vector and a row vector."""
+        import numpy as np
+
+        n = TILE_SIZE * 2 ** z
+        offsets = np.arange(TILE_SIZE) + 0.5
+        wx = (x * TILE_SIZE + offsets) / n
+        wy = (y * TILE_SIZE + offsets) / n
+        if self.crs == 'EPSG:3857':
+            size = 2 * math.pi * EARTH_RADIUS
+            return (wx - 0.5) * size, (0.5 - wy) * size
+        # Longitude only depends on the column of a pixel, and latitude on its row.
+        lon = wx * 360.0 - 180.0
+        lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * wy))))
+        return lon, lat
+
+    def get_tile(self, z, x, y):
+        """Returns a rendered PNG tile.
+
+        Args:
+            z (int): The zoom level of the tile.
+            x (int): The column of the tile.
+            y (int): The row of the tile.
+
+        Returns:
+            bytes: The PNG tile, or None if the tile does not intersect the array.
+        """
+        key = (z, x, y)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        data = self._render_tile(z, x, y)
+
+        with self._lock:
+            self._cache[key] = data
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return data
+
+    def read_tile(self, z, x, y):
+        """Samples the pixels of a tile from the overview level closest to its resolution.
+
+        Args:
+            z (int): The zoom level of the tile.
+            x (int): The column of the tile.
+            y (int): The row of the tile.
+
+        Returns:
+            array: The (256, 256, band) numpy masked array, or None if the tile does not intersect the array.
+        """
+        import numpy as np
+
+        cx, cy = self._tile_coords(z, x, y)
+        x_res, _, x0, _, y_res, y0 = self.transform
+        tile_res = abs(cx[1] - cx[0])
+        level = int(math.floor(math.log2(tile_res / abs(x_res)))) if tile_res > abs(x_res) else 0
+        level = min(max(level, 0), len(self.levels) - 1)
+        array = self.levels[level]
+        factor = 2 ** level
+
+        cols = np.floor((cx - x0) / (x_res * factor)).astype('int64')
+        rows = np.floor((cy - y0) / (y_res * factor)).astype('int64')
+        col_ok = (cols >= 0) & (cols < array.shape[1])
+        row_ok = (rows >= 0) & (rows < array.shape[0])
+        if not col_ok.any() or not row_ok.any():
+            return None
+
+        # Reads the bounding window once, then gathers the pixels of the tile from it.
+        np.clip(cols, 0, array.shape[1] - 1, out=cols)
+        np.clip(rows, 0, array.shape[0] - 1, out=rows)
+        c0, c1 = cols.min(), cols.max() + 1
+        r0, r1 = rows.min(), rows.max() + 1
+        window = np.asarray(array[r0:r1, c0:c1])
+        data = window[np.ix_(rows - r0, cols - c0)]
+
+        mask = ~(row_ok[:, np.newaxis] & col_ok[np.newaxis, :])
+        mask = np.repeat(mask[:, :, np.newaxis], data.shape[2], axis=2)
+        if level == 0:
+            if self.nodata is not None:
+                mask |= data == self.nodata
+            if self._mask is not None:
+                mask |= np.asarray(self._mask[r0:r1, c0:c1])[np.ix_(rows - r0, cols - c0)]
+        return np.ma.MaskedArray(data, mask=mask)
+
+    def _render_tile(self, z, x, y):
+        import io
+        from PIL import Image
+        from .render import render_array
+
+        data = self.read_tile(z, x, y)
+        if data is None:
+            return None
+        rgba = render_array(data, self.vis_params, self.band_names)
+        buffer = io.BytesIO()
+        Image.fromarray(rgba, 'RGBA').save(buffer, format='PNG', compress_level=1)
+        return buffer.getvalue()
+
+
+def raster_tile_index(source, vis_params=None, band_names=None, bounds=None, crs=None, transform=None, nodata=None, cache_dir=None):
+    """Builds a raster tile index from a GeoTIFF or a numpy array. The overviews of GeoTIFFs are cached on disk, keyed by the path, size and modification time of the file.
+
+    Args:
+        source (str | array): The file path of a GeoTIFF, or a (y, x, band) or (y, x) numpy array.
+        vis_params (dict, optional): The visualization parameters: bands, min, max, gamma and palette. Defaults to None.
+        band_names (list, optional): The names of the bands. Defaults to None, which uses the band descriptions of GeoTIFFs.
+        bounds (tuple, optional): The bounds of a numpy array in EPSG:4326 as ((south, west), (north, east)). Defaults to None.
+        crs (str, optional): The CRS of a numpy array, 'EPSG:4326' or 'EPSG:3857', if transform is given instead of bounds. Defaults to None.
+        transform (list, optional): The affine transform of a numpy array as [x_res, 0, x0, 0, -y_res, y0]. Defaults to None.
+        nodata (float, optional): The nodata value of a numpy array. Defaults to None.
+        cache_dir (str, optional): The directory of the overview cache. Defaults to ~/.geemap/raster_cache.
+
+    Returns:
+        object: The RasterTileIndex.
+    """
+    if isinstance(source, str):
+        source = os.path.abspath(source)
+        stat = os.stat(source)
+        key = '{}:{}:{}'.format(source, stat.st_size, stat.st_mtime)
+        cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR,
+                                 hashlib.sha1(key.encode('utf-8')).hexdigest())
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        array, crs, transform, nodata, names = _read_geotiff(source, cache_dir)
+        if band_names is None:
+            band_names = names
+        return RasterTileIndex(array, crs, transform, vis_params=vis_params, band_names=band_names,
+                               nodata=nodata, cache_dir=cache_dir)
+
+    if bounds is not None:
+        (south, west), (north, east) = bounds
+        height, width = source.shape[:2]
+        crs = 'EPSG:4326'
+        transform = [(east - west) / width, 0, west,
+                     0, -(north - south) / height, north]
+    elif crs is None or transform is None:
+        raise ValueError('Either bounds, or crs and transform, must be given for numpy arrays.')
+    return RasterTileIndex(source, crs, transform, vis_params=vis_params, band_names=band_names,
+                           nodata=nodata)
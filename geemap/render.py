@@ -0,0 +1,240 @@
+"""Module for rendering numpy arrays locally with the same visualization parameters as Earth Engine map layers (bands, min, max, gamma and palette). The rendering uses lookup tables, so that each pixel is only indexed into a table once per band.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import re
+
+# The number of levels between min and max of floating point bands.
+LUT_SIZE = 1024
+
+
+def _as_list(value):
+    """Converts a visualization parameter, which can be a comma separated string, a number or a list, to a list."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _per_band(value, count, default):
+    values = [float(v) for v in _as_list(value)] or [default]
+    if len(values) == 1:
+        values = values * count
+    if len(values) != count:
+        raise ValueError('Expected 1 or {} values, got {}.'.format(
+            count, len(values)))
+    return values
+
+
+def parse_color(color):
+    """Converts a color of an Earth Engine palette, such as 'FF0000', '#ff0000' or 'red', to an RGB tuple.
+
+    Args:
+        color (str): The color.
+
+    Returns:
+        tuple: The (red, green, blue) values, from 0 to 255.
+    """
+    from PIL import ImageColor
+
+    if isinstance(color, (list, tuple)):
+        return tuple(int(c) for c in color[:3])
+    if re.match(r'^[0-9a-fA-F]{6}$|^[0-9a-fA-F]{3}$', color):
+        color = '#' + color
+    return ImageColor.getrgb(color)[:3]
+
+
+def _palette_lut(palette, levels):
+    """Interpolates the colors of a palette at the given levels, as an RGBA lookup table."""
+    import numpy as np
+
+    colors = np.array([parse_color(c) for c in palette], dtype='float64')
+    if len(colors) == 1:
+        colors = np.vstack([colors, colors])
+    positions = np.linspace(0, 1, len(colors))
+    lut = np.full((len(levels), 4), 255, dtype='uint8')
+    for channel in range(3):
+        lut[:, channel] = np.round(np.interp(
+            levels, positions, colors[:, channel]))
+    return lut
+
+
+def _band_index(band, vmin, vmax):
+    """Maps the values of a band to lookup table indexes.
+
+    Returns:
+        tuple: The indexes and the normalized value, from 0 to 1, of each entry of the lookup table.
+    """
+    import numpy as np
+
+    scale = 1.0 / (vmax - vmin) if vmax != vmin else 0.0
+    if band.dtype.kind == 'b' or (band.dtype.kind in 'ui' and band.dtype.itemsize <= 2):
+        if band.dtype.kind == 'b':
+            band = band.view('uint8')
+        # Small integer bands index a table over all their possible values directly, without arithmetic.
+        unsigned = np.dtype('uint{}'.format(8 * band.dtype.itemsize))
+        values = np.arange(2 ** (8 * band.dtype.itemsize),
+                           dtype=unsigned).view(band.dtype).astype('float64')
+        normalized = np.clip((values - vmin) * scale, 0, 1)
+        return band.view(unsigned), normalized
+
+    # Other bands, including 32 and 64 bit integers, are quantized to LUT_SIZE levels, in float32 and in place. fmax() also replaces NaN with 0.
+    factor = scale * (LUT_SIZE - 1)
+    t = np.multiply(band, factor, dtype='float32')
+    t += 0.5 - vmin * factor
+    np.fmax(t, 0, out=t)
+    np.minimum(t, LUT_SIZE - 1, out=t)
+    return t.astype('uint16'), np.linspace(0, 1, LUT_SIZE)
+
+
+def render_array(array, vis_params=None, band_names=None):
+    """Renders a numpy array to an RGBA image with Earth Engine visualization parameters. Masked and NaN pixels are transparent.
+
+    Args:
+        array (array): A (y, x) or (y, x, band) numpy array, or a numpy masked array, such as one returned by ee_to_numpy().
+        vis_params (dict, optional): The visualization parameters, as in Map.addLayer(): bands, min, max, gamma and palette. Defaults to None, which renders the first band (or first three bands) from 0 to 1.
+        band_names (list, optional): The names of the bands of the array, for selecting bands by name. Defaults to None.
+
+    Returns:
+        array: The (y, x, 4) uint8 RGBA numpy array.
+    """
+    import numpy as np
+
+    if vis_params is None:
+        vis_params = {}
+    mask = np.ma.getmask(array)
+    data = np.ma.getdata(array)
+    if data.ndim == 2:
+        data = data[:, :, np.newaxis]
+        if mask is not np.ma.nomask:
+            mask = mask[:, :, np.newaxis]
+    if data.ndim != 3:
+        raise ValueError('The array must have 2 or 3 dimensions.')
+
+    bands = _as_list(vis_params.get('bands'))
+    if not bands:
+        bands = list(range(3 if data.shape[2] >= 3 else 1))
+    indexes = []
+    for band in bands:
+        if isinstance(band, str) and not band.isdigit():
+            if band_names is None or band not in band_names:
+                raise ValueError(
+                    'Band {} not found in the band names.'.format(band))
+            band = band_names.index(band)
+        indexes.append(int(band))
+    if len(indexes) not in (1, 3):
+        raise ValueError('Either 1 or 3 bands must be specified.')
+
+    count = len(indexes)
+    mins = _per_band(vis_params.get('min'), count, 0.0)
+    maxs = _per_band(vis_params.get('max'), count, 1.0)
+    gammas = _per_band(vis_params.get('gamma'), count, 1.0)
+    palette = _as_list(vis_params.get('palette'))
+    if palette and count != 1:
+        raise ValueError('A palette can only be used with a single band.')
+
+    height, width = data.shape[:2]
+    rgba = np.empty((height, width, 4), dtype='uint8')
+    # The lookup tables hold whole RGBA pixels, viewed as uint32, so that each lookup writes a pixel at once.
+    pixels = rgba.view('uint32')[:, :, 0]
+    if count == 1:
+        index, normalized = _band_index(data[:, :, indexes[0]], mins[0], maxs[0])
+        levels = normalized if gammas[0] == 1 else normalized ** (1.0 / gammas[0])
+        if palette:
+            lut = _palette_lut(palette, levels)
+        else:
+            lut = np.full((len(levels), 4), 255, dtype='uint8')
+            lut[:, :3] = np.round(levels * 255)[:, np.newaxis]
+        np.take(lut.view('uint32')[:, 0], index, out=pixels, mode='clip')
+    else:
+        for channel, band in enumerate(indexes):
+            index, normalized = _band_index(
+                data[:, :, band], mins[channel], maxs[channel])
+            levels = normalized if gammas[channel] == 1 else normalized ** (
+                1.0 / gammas[channel])
+            lut = np.zeros((len(levels), 4), dtype='uint8')
+            lut[:, channel] = np.round(levels * 255)
+            if channel == 0:
+                lut[:, 3] = 255
+                np.take(lut.view('uint32')[:, 0], index, out=pixels, mode='clip')
+            else:
+                pixels |= lut.view('uint32')[:, 0].take(index, mode='clip')
+
+    invalid = None
+    if mask is not np.ma.nomask:
+        invalid = mask[:, :, indexes[0]] if count == 1 else mask[:, :, indexes].any(axis=2)
+    selected = [data[:, :, band] for band in indexes]
+    if any(band.dtype.kind == 'f' for band in selected):
+        nan = np.zeros((height, width), dtype='bool')
+        for band in selected:
+            if band.dtype.kind == 'f':
+                nan |= np.isnan(band)
+        invalid = nan if invalid is None else invalid | nan
+    if invalid is not None:
+        np.copyto(pixels, 0, where=invalid)
+    return rgba
+
+
+def array_to_png(array, vis_params=None, band_names=None, compress_level=1):
+    """Renders a numpy array to PNG bytes with Earth Engine visualization parameters.
+
+    Args:
+        array (array): A (y, x) or (y, x, band) numpy array, or a numpy masked array.
+        vis_params (dict, optional): The visualization parameters: bands, min, max, gamma and palette. Defaults to None.
+        band_names (list, optional): The names of the bands of the array. Defaults to None.
+        compress_level (int, optional): The zlib compression level of the PNG, from 0 to 9. Defaults to 1, which is fast.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    import io
+    from PIL import Image
+
+    rgba = render_array(array, vis_params, band_names)
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, 'RGBA').save(
+        buffer, format='PNG', compress_level=compress_level)
+    return buffer.getvalue()
+
+
+def array_to_data_url(array, vis_params=None, band_names=None):
+    """Renders a numpy array to an in-memory PNG data URL, such as for an ipyleaflet ImageOverlay.
+
+    Args:
+        array (array): A (y, x) or (y, x, band) numpy array, or a numpy masked array.
+        vis_params (dict, optional): The visualization parameters: bands, min, max, gamma and palette. Defaults to None.
+        band_names (list, optional): The names of the bands of the array. Defaults to None.
+
+    Returns:
+        str: The data URL.
+    """
+    import base64
+
+    png = array_to_png(array, vis_params, band_names)
+    return 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+
+
+def array_to_image_overlay(array, bounds, vis_params=None, band_names=None, name='Image', opacity=1.0):
+    """Creates an ipyleaflet ImageOverlay showing a numpy array rendered with Earth Engine visualization parameters.
+
+    Args:
+        array (array): A (y, x) or (y, x, band) numpy array, or a numpy masked array.
+        bounds (tuple): The bounds of the array as ((south, west), (north, east)).
+        vis_params (dict, optional): The visualization parameters: bands, min, max, gamma and palette. Defaults to None.
+        band_names (list, optional): The names of the bands of the array. Defaults to None.
+        name (str, optional): The name of the layer. Defaults to 'Image'.
+        opacity (float, optional): The opacity of the layer. Defaults to 1.0.
+
+    Returns:
+        object: The ipyleaflet ImageOverlay.
+    """
+    import ipyleaflet
+
+    (south, west), (north, east) = bounds
+    return ipyleaflet.ImageOverlay(url=array_to_data_url(array, vis_params, band_names),
+                                   bounds=((south, west), (north, east)), name=name, opacity=opacity)
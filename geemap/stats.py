@@ -0,0 +1,219 @@
+"""Module for computing raster statistics in a single pass over image blocks, such as those yielded by iter_image_blocks(). The statistics use constant memory and can be merged across workers.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import numpy as np
+
+
+class StreamingStats(object):
+    """Accumulates the count, min, max, mean, variance and histogram of each band of a raster, one block at a time. The mean and variance are updated with the parallel form of Welford's algorithm (Chan et al.), and the histograms have a fixed number of bins whose range doubles as needed, so percentiles are approximate.
+
+    Args:
+        bins (int, optional): The number of bins of the histograms. Must be even. Defaults to 256.
+        range (tuple, optional): The initial (min, max) range of the histograms, which is extended when values fall outside of it. Defaults to None, which uses the range of the first block.
+        band_names (list, optional): The names of the bands. Defaults to None.
+    """
+
+    def __init__(self, bins=256, range=None, band_names=None):
+        if bins % 2:
+            raise ValueError('The number of bins must be even.')
+        self.bins = bins
+        self.initial_range = range
+        self.band_names = band_names
+        self.bands = None
+
+    def _init_bands(self, bands):
+        self.bands = bands
+        self.count = np.zeros(bands, dtype='int64')
+        self.min = np.full(bands, np.inf)
+        self.max = np.full(bands, -np.inf)
+        self.mean = np.zeros(bands)
+        self._m2 = np.zeros(bands)
+        self._counts = np.zeros((bands, self.bins), dtype='int64')
+        self._lo = np.full(bands, np.nan)
+        self._width = np.full(bands, np.nan)
+
+    def _expand(self, band, low, high):
+        """Doubles the width of the bins of a band until its histogram covers [low, high]."""
+        if np.isnan(self._lo[band]):
+            if self.initial_range is not None:
+                low = min(low, self.initial_range[0])
+                high = max(high, self.initial_range[1])
+            span = high - low
+            # Bins must have a positive width, even if all values are equal.
+            self._width[band] = span / self.bins if span > 0 else max(
+                abs(low) * 1e-6, 1e-6)
+            self._lo[band] = low
+            return
+
+        half = self.bins // 2
+        while low < self._lo[band] or high > self._lo[band] + self.bins * self._width[band]:
+            counts = self._counts[band]
+            merged = counts[0::2] + counts[1::2]
+            counts[:] = 0
+            if low < self._lo[band]:
+                counts[half:] = merged
+                self._lo[band] -= self.bins * self._width[band]
+            else:
+                counts[:half] = merged
+            self._width[band] *= 2
+
+    def update(self, block):
+        """Adds the pixels of a block. NaN and masked pixels are ignored.
+
+        Args:
+            block (array): A (y, x, band) or (y, x) numpy array, or a numpy masked array.
+        """
+        block = np.ma.asarray(block)
+        if block.ndim == 2:
+            block = block[:, :, np.newaxis]
+        if self.bands is None:
+            self._init_bands(block.shape[-1])
+        elif block.shape[-1] != self.bands:
+            raise ValueError('Expected {} bands, got {}.'.format(
+                self.bands, block.shape[-1]))
+
+        for band in range(self.bands):
+            values = block[:, :, band]
+            values = np.asarray(values.compressed(), dtype='float64')
+            values = values[~np.isnan(values)]
+            n = values.size
+            if n == 0:
+                continue
+
+            low, high = values.min(), values.max()
+            mean = values.mean()
+            m2 = np.square(values - mean).sum()
+            self._combine(band, n, low, high, mean, m2)
+
+            self._expand(band, low, high)
+            index = ((values - self._lo[band]) /
+                     self._width[band]).astype('int64')
+            np.clip(index, 0, self.bins - 1, out=index)
+            self._counts[band] += np.bincount(index, minlength=self.bins)
+
+    def _combine(self, band, n, low, high, mean, m2):
+        total = self.count[band] + n
+        delta = mean - self.mean[band]
+        self.mean[band] += delta * n / total
+        self._m2[band] += m2 + delta ** 2 * self.count[band] * n / total
+        self.count[band] = total
+        self.min[band] = min(self.min[band], low)
+        self.max[band] = max(self.max[band], high)
+
+    def merge(self, other):
+        """Merges the statistics accumulated by another StreamingStats, such as one from another worker.
+
+        Args:
+            other (StreamingStats): The statistics to merge into this one.
+
+        Returns:
+            StreamingStats: This object.
+        """
+        if other.bands is None:
+            return self
+        if self.bands is None:
+            self._init_bands(other.bands)
+        for band in range(self.bands):
+            if other.count[band] == 0:
+                continue
+            self._combine(band, other.count[band], other.min[band], other.max[band],
+                          other.mean[band], other._m2[band])
+            other_edges = other._edges(band)
+            self._expand(band, other_edges[0], other_edges[-1])
+            # The counts of the other histogram are spread uniformly within its bins. The cumulative counts are rounded, so that the total is preserved.
+            cdf = np.concatenate([[0], np.cumsum(other._counts[band])])
+            cdf = np.round(np.interp(self._edges(band), other_edges, cdf))
+            self._counts[band] += np.diff(cdf).astype('int64')
+        return self
+
+    def _edges(self, band):
+        return self._lo[band] + self._width[band] * np.arange(self.bins + 1)
+
+    @property
+    def variance(self):
+        """The population variance of each band."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self._m2 / self.count, np.nan)
+
+    @property
+    def std(self):
+        """The population standard deviation of each band."""
+        return np.sqrt(self.variance)
+
+    def histogram(self, band=0):
+        """Returns the histogram of a band.
+
+        Args:
+            band (int | str, optional): The index or name of the band. Defaults to 0.
+
+        Returns:
+            tuple: The counts and the bin edges, like numpy.histogram().
+        """
+        band = self._band_index(band)
+        return self._counts[band].copy(), self._edges(band)
+
+    def percentile(self, q):
+        """Returns approximate percentiles of each band, interpolated within the bins of the histograms.
+
+        Args:
+            q (float | list): The percentile or percentiles to compute, between 0 and 100.
+
+        Returns:
+            array: The percentiles, with shape (band,) or (len(q), band).
+        """
+        q = np.asarray(q, dtype='float64')
+        result = np.full(q.shape + (self.bands,), np.nan)
+        for band in range(self.bands):
+            if self.count[band] == 0:
+                continue
+            cdf = np.concatenate([[0], np.cumsum(self._counts[band])])
+            values = np.interp(q / 100.0 * cdf[-1], cdf, self._edges(band))
+            result[..., band] = np.clip(
+                values, self.min[band], self.max[band])
+        return result
+
+    def _band_index(self, band):
+        if isinstance(band, str):
+            return self.band_names.index(band)
+        return band
+
+    def to_dict(self):
+        """Returns the statistics of each band as a dictionary keyed by band name (or index).
+
+        Returns:
+            dict: The count, min, max, mean, std and median of each band.
+        """
+        names = self.band_names or list(range(self.bands or 0))
+        median = self.percentile(50)
+        return {name: {'count': int(self.count[i]), 'min': float(self.min[i]), 'max': float(self.max[i]),
+                       'mean': float(self.mean[i]), 'std': float(self.std[i]), 'median': float(median[i])}
+                for i, name in enumerate(names)}
+
+
+def image_stats(image, region=None, scale=None, crs=None, bins=256, block_shape=(512, 512), workers=4):
+    """Computes the statistics of each band of an image locally, in a single pass over its blocks as they are downloaded, without holding the image in memory. Masked pixels are ignored.
+
+    Args:
+        image (object): The ee.Image.
+        region (object, optional): The region. Defaults to the footprint of the image.
+        scale (float, optional): The scale in meters. Defaults to the nominal scale of the image.
+        crs (str, optional): The CRS. Defaults to the CRS of the first band of the image.
+        bins (int, optional): The number of bins of the histograms. Defaults to 256.
+        block_shape (tuple, optional): The (height, width) of the blocks, in pixels. Defaults to (512, 512).
+        workers (int, optional): The number of blocks to download concurrently. Defaults to 4.
+
+    Returns:
+        StreamingStats: The statistics.
+    """
+    from .blocks import _iter_blocks, _plan_read
+
+    # The band names come from the plan, so that no other request is needed.
+    planned = _plan_read(image, region, scale, crs,
+                         masked=True, tile_shape=block_shape)
+    stats = StreamingStats(bins=bins, band_names=planned[2])
+    for window, block in _iter_blocks(planned, masked=True, workers=workers):
+        stats.update(block)
+    return stats
@@ -0,0 +1,392 @@
+"""Module for working with web map tiles, such as Web Mercator tile math and a local tile server for serving data to the ipyleaflet map.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from .download import get_session, get_timeout
+
+TILE_SIZE = 256
+EARTH_RADIUS = 6378137.0
+MAX_LATITUDE = 85.0511287798
+
+
+def lonlat_to_world(lon, lat):
+    """Converts longitude/latitude to normalized Web Mercator coordinates, where (0, 0) is the top-left corner of the world and (1, 1) the bottom-right corner.
+
+    Args:
+        lon (float): The longitude, in degrees.
+        lat (float): The latitude, in degrees.
+
+    Returns:
+        tuple: The normalized (x, y) coordinates.
+    """
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = (lon + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def world_to_lonlat(x, y):
+    """Converts normalized Web Mercator coordinates to longitude/latitude.
+
+    Args:
+        x (float): The normalized x coordinate.
+        y (float): The normalized y coordinate.
+
+    Returns:
+        tuple: The (lon, lat) coordinates, in degrees.
+    """
+    lon = x * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lon, lat
+
+
+def lonlat_to_pixel(lon, lat, zoom, tile_size=TILE_SIZE):
+    """Converts longitude/latitude to global pixel coordinates at the given zoom level.
+
+    Args:
+        lon (float): The longitude, in degrees.
+        lat (float): The latitude, in degrees.
+        zoom (int): The zoom level.
+        tile_size (int, optional): The tile size in pixels. Defaults to 256.
+
+    Returns:
+        tuple: The global (x, y) pixel coordinates.
+    """
+    x, y = lonlat_to_world(lon, lat)
+    size = tile_size * 2 ** zoom
+    return x * size, y * size
+
+
+def pixel_to_lonlat(px, py, zoom, tile_size=TILE_SIZE):
+    """Converts global pixel coordinates at the given zoom level to longitude/latitude.
+
+    Args:
+        px (float): The global x pixel coordinate.
+        py (float): The global y pixel coordinate.
+        zoom (int): The zoom level.
+        tile_size (int, optional): The tile size in pixels. Defaults to 256.
+
+    Returns:
+        tuple: The (lon, lat) coordinates, in degrees.
+    """
+    size = tile_size * 2 ** zoom
+    return world_to_lonlat(px / size, py / size)
+
+
+def tile_bounds(z, x, y):
+    """Returns the normalized Web Mercator bounds of a tile.
+
+    Args:
+        z (int): The zoom level of the tile.
+        x (int): The column of the tile.
+        y (int): The row of the tile.
+
+    Returns:
+        tuple: The (xmin, ymin, xmax, ymax) bounds of the tile.
+    """
+    n = 2 ** z
+    return x / n, y / n, (x + 1) / n, (y + 1) / n
+
+
+def tile_lonlat_bounds(z, x, y):
+    """Returns the bounds of a tile in longitude/latitude.
+
+    Args:
+        z (int): The zoom level of the tile.
+        x (int): The column of the tile.
+        y (int): The row of the tile.
+
+    Returns:
+        tuple: The (west, south, east, north) bounds of the tile, in degrees.
+    """
+    xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+    west, north = world_to_lonlat(xmin, ymin)
+    east, south = world_to_lonlat(xmax, ymax)
+    return west, south, east, north
+
+
+def meters_per_pixel(zoom, lat=0, tile_size=TILE_SIZE):
+    """Returns the ground resolution of a Web Mercator pixel at the given zoom level and latitude.
+
+    Args:
+        zoom (int): The zoom level.
+        lat (float, optional): The latitude, in degrees. Defaults to 0.
+        tile_size (int, optional): The tile size in pixels. Defaults to 256.
+
+    Returns:
+        float: The pixel size, in meters.
+    """
+    return 2 * math.pi * EARTH_RADIUS * math.cos(math.radians(lat)) / (tile_size * 2 ** zoom)
+
+
+def bounds_to_zoom(bounds, width, height, max_zoom=24, tile_size=TILE_SIZE):
+    """Returns the highest zoom level at which the given bounds fit in a map view of the given size.
+
+    Args:
+        bounds (list): The bounds as [[south, west], [north, east]].
+        width (int): The width of the map view, in pixels.
+        height (int): The height of the map view, in pixels.
+        max_zoom (int, optional): The maximum zoom level to return. Defaults to 24.
+        tile_size (int, optional): The tile size in pixels. Defaults to 256.
+
+    Returns:
+        int: The zoom level, or None if the bounds are a single point, which fits at any zoom level.
+    """
+    (south, west), (north, east) = bounds
+    xmin, ymax = lonlat_to_world(west, south)
+    xmax, ymin = lonlat_to_world(east, north)
+    # A side without extent, such as that of a horizontal line, does not limit the zoom level.
+    zooms = [math.log2(size / (extent * tile_size))
+             for size, extent in [(width, xmax - xmin), (height, ymax - ymin)] if extent > 0]
+    if not zooms:
+        return None
+    return int(max(0, min(math.floor(min(zooms)), max_zoom)))
+
+
+def format_tile_url(url, z, x, y, tms=False, subdomain='a'):
+    """Fills in a tile URL template, such as https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png
+
+    Args:
+        url (str): The URL template of the tile layer.
+        z (int): The zoom level of the tile.
+        x (int): The column of the tile.
+        y (int): The row of the tile.
+        tms (bool, optional): Whether the tile rows are numbered from the bottom (TMS). Defaults to False.
+        subdomain (str, optional): The subdomain to use for {s}. Defaults to 'a'.
+
+    Returns:
+        str: The tile URL.
+    """
+    if tms:
+        y = 2 ** z - 1 - y
+    return url.replace('{s}', subdomain).replace('{z}', str(z)).replace('{x}', str(x)).replace('{y}', str(y)).replace('{r}', '')
+
+
+def fetch_tile(url, session=None, timeout=None):
+    """Downloads and decodes a raster tile.
+
+    Args:
+        url (str): The URL of the tile.
+        session (object, optional): The requests session to use. Defaults to None, which uses the shared session of geemap.
+        timeout (float, optional): The timeout of the request in seconds. Defaults to None, which uses the timeout of the shared session.
+
+    Returns:
+        array: The tile as a (height, width, 4) uint8 RGBA numpy array, or None if the tile does not exist.
+    """
+    import io
+    import numpy as np
+    from PIL import Image
+
+    if session is None:
+        session = get_session()
+    r = session.get(url, timeout=get_timeout(timeout))
+    if r.status_code in (204, 404) or not r.content:
+        return None
+    r.raise_for_status()
+    with Image.open(io.BytesIO(r.content)) as img:
+        return np.asarray(img.convert('RGBA'))
+
+
+def render_view(layers, center, zoom, width, height, workers=8, tile_size=TILE_SIZE):
+    """Renders a map view to an image by fetching the visible tiles of every layer concurrently and compositing them.
+
+    Args:
+        layers (list): The tile layers from bottom to top. Each layer is a dictionary with a 'url' template and optionally 'opacity' and 'tms'.
+        center (tuple): The (lat, lon) of the center of the view.
+        zoom (int): The zoom level of the view.
+        width (int): The width of the image, in pixels.
+        height (int): The height of the image, in pixels.
+        workers (int, optional): The number of tiles to fetch concurrently. Defaults to 8.
+        tile_size (int, optional): The tile size in pixels. Defaults to 256.
+
+    Returns:
+        array: The composited view as a (height, width, 4) uint8 RGBA numpy array.
+    """
+    import numpy as np
+
+    zoom = int(round(zoom))
+    n = 2 ** zoom
+    cx, cy = lonlat_to_pixel(center[1], center[0], zoom, tile_size)
+    left = int(math.floor(cx - width / 2.0))
+    top = int(math.floor(cy - height / 2.0))
+
+    col0, col1 = left // tile_size, (left + width - 1) // tile_size
+    row0 = max(top // tile_size, 0)
+    row1 = min((top + height - 1) // tile_size, n - 1)
+    tile_keys = [(col, row) for row in range(row0, row1 + 1)
+                 for col in range(col0, col1 + 1)]
+
+    session = get_session(workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for layer in layers:
+            layer_futures = {}
+            for col, row in tile_keys:
+                url = format_tile_url(layer['url'], zoom, col % n, row,
+                                      tms=layer.get('tms', False))
+                layer_futures[(col, row)] = executor.submit(
+                    fetch_tile, url, session)
+            futures.append(layer_futures)
+
+        # Composites the layers with premultiplied alpha, in layer order.
+        out_rgb = np.zeros((height, width, 3), dtype=np.float32)
+        out_alpha = np.zeros((height, width, 1), dtype=np.float32)
+
+        for layer, layer_futures in zip(layers, futures):
+            opacity = layer.get('opacity', 1.0)
+            if opacity <= 0:
+                continue
+            canvas = np.zeros((height, width, 4), dtype=np.uint8)
+            for (col, row), future in layer_futures.items():
+                try:
+                    tile = future.result()
+                except Exception as e:
+                    print('Failed to fetch tile {}/{}/{}: {}'.format(zoom, col % n, row, e))
+                    continue
+                if tile is None:
+                    continue
+                x0 = col * tile_size - left
+                y0 = row * tile_size - top
+                tx0, ty0 = max(0, -x0), max(0, -y0)
+                tx1 = min(tile.shape[1], width - x0)
+                ty1 = min(tile.shape[0], height - y0)
+                if tx1 <= tx0 or ty1 <= ty0:
+                    continue
+                canvas[y0 + ty0:y0 + ty1, x0 + tx0:x0 + tx1] = tile[ty0:ty1, tx0:tx1]
+
+            src_alpha = canvas[:, :, 3:4].astype(np.float32) * (opacity / 255.0)
+            out_rgb *= 1 - src_alpha
+            out_rgb += canvas[:, :, :3] * src_alpha
+            out_alpha *= 1 - src_alpha
+            out_alpha += src_alpha
+
+    rgb = np.divide(out_rgb, out_alpha, out=np.zeros_like(out_rgb),
+                    where=out_alpha > 0)
+    image = np.empty((height, width, 4), dtype=np.uint8)
+    image[:, :, :3] = np.clip(np.round(rgb), 0, 255)
+    image[:, :, 3:] = np.clip(np.round(out_alpha * 255), 0, 255)
+    return image
+
+
+class _TileRequestHandler(BaseHTTPRequestHandler):
+    """Serves tiles registered with the TileServer, at URLs like /<key>/<z>/<x>/<y>.<ext>"""
+
+    path_pattern = re.compile(r'^/(\w+)/(\d+)/(\d+)/(\d+)\.(\w+)$')
+
+    def do_GET(self):
+        match = self.path_pattern.match(self.path.split('?')[0])
+        provider = None
+        if match is not None:
+            provider = self.server.tile_server.providers.get(match.group(1))
+
+        if provider is None:
+            self.send_error(404)
+            return
+
+        func, content_type = provider
+        z, x, y = [int(v) for v in match.group(2, 3, 4)]
+        try:
+            data = func(z, x, y)
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+
+        if data is None:
+            self.send_response(204)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TileServer(object):
+    """A local HTTP server running in a background thread, which serves tiles generated on demand by Python functions.
+
+    Args:
+        host (str, optional): The host to bind to. Defaults to '127.0.0.1'.
+        port (int, optional): The port to bind to. Defaults to 0, which picks a free port.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.providers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer((host, port), _TileRequestHandler)
+        self._server.tile_server = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def add_provider(self, func, ext='png', content_type='image/png'):
+        """Registers a tile function with the server.
+
+        Args:
+            func (function): A function taking (z, x, y) and returning the encoded tile as bytes, or None for an empty tile.
+            ext (str, optional): The file extension used in the tile URL. Defaults to 'png'.
+            content_type (str, optional): The Content-Type of the tiles. Defaults to 'image/png'.
+
+        Returns:
+            str: The URL template of the tiles, such as http://127.0.0.1:8000/1/{z}/{x}/{y}.png
+        """
+        with self._lock:
+            self._count += 1
+            key = str(self._count)
+            self.providers[key] = (func, content_type)
+        return 'http://{}:{}/{}/{{z}}/{{x}}/{{y}}.{}'.format(self.host, self.port, key, ext)
+
+    def remove_provider(self, url):
+        """Unregisters a tile function from the server.
+
+        Args:
+            url (str): The URL template returned by add_provider().
+        """
+        key = url.split('/')[3]
+        with self._lock:
+            self.providers.pop(key, None)
+
+    def shutdown(self):
+        """Stops the server.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_tile_server = None
+_tile_server_lock = threading.Lock()
+
+
+def get_tile_server():
+    """Returns the shared local tile server, starting it if needed.
+
+    Returns:
+        object: The TileServer instance.
+    """
+    global _tile_server
+    with _tile_server_lock:
+        if _tile_server is None:
+            _tile_server = TileServer()
+    return _tile_server
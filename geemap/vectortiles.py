@@ -0,0 +1,559 @@
+"""Module for serving large local vector datasets (e.g., shapefiles and GeoJSON) to the map as Mapbox Vector Tiles.
+Features are projected and indexed once. Tiles are generated on demand, with geometries simplified and points thinned according to the zoom level.
+"""
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from .tiles import lonlat_to_world, TILE_SIZE
+
+# Geometry types defined by the Mapbox Vector Tile specification
+MVT_POINT = 1
+MVT_LINESTRING = 2
+MVT_POLYGON = 3
+
+
+def read_features(in_file):
+    """Reads the features of a shapefile or GeoJSON file.
+
+    Args:
+        in_file (str): File path of the input shapefile or GeoJSON.
+
+    Returns:
+        list: A list of GeoJSON features.
+    """
+    in_file = os.path.abspath(in_file)
+    if not os.path.exists(in_file):
+        raise FileNotFoundError('The input file does not exist: {}'.format(in_file))
+
+    ext = os.path.splitext(in_file)[1].lower()
+    if ext == '.shp':
+        import shapefile
+        reader = shapefile.Reader(in_file)
+        field_names = [field[0] for field in reader.fields[1:]]
+        features = []
+        for sr in reader.iterShapeRecords():
+            features.append({'type': 'Feature',
+                             'geometry': sr.shape.__geo_interface__,
+                             'properties': dict(zip(field_names, sr.record))})
+        return features
+    elif ext in ['.json', '.geojson']:
+        with open(in_file) as f:
+            geo_json = json.load(f)
+        if geo_json['type'] == 'FeatureCollection':
+            return geo_json['features']
+        elif geo_json['type'] == 'Feature':
+            return [geo_json]
+        else:
+            return [{'type': 'Feature', 'geometry': geo_json, 'properties': {}}]
+    else:
+        raise ValueError('The input file must be a shapefile or GeoJSON.')
+
+
+def _project_coords(coords):
+    return [lonlat_to_world(c[0], c[1]) for c in coords]
+
+
+def _project_geometry(geometry):
+    """Projects a GeoJSON geometry to normalized Web Mercator coordinates.
+
+    Returns:
+        tuple: The MVT geometry type and a list of parts. Points are a list of coordinates, lines a list of lines, and polygons a list of polygons (lists of rings).
+    """
+    if geometry is None:
+        return None, []
+    geom_type = geometry['type']
+    coords = geometry.get('coordinates')
+    if geom_type == 'Point':
+        return MVT_POINT, _project_coords([coords])
+    elif geom_type == 'MultiPoint':
+        return MVT_POINT, _project_coords(coords)
+    elif geom_type == 'LineString':
+        return MVT_LINESTRING, [_project_coords(coords)]
+    elif geom_type == 'MultiLineString':
+        return MVT_LINESTRING, [_project_coords(line) for line in coords]
+    elif geom_type == 'Polygon':
+        return MVT_POLYGON, [[_project_coords(ring) for ring in coords]]
+    elif geom_type == 'MultiPolygon':
+        return MVT_POLYGON, [[_project_coords(ring) for ring in polygon] for polygon in coords]
+    else:
+        return None, []
+
+
+def _bbox(points):
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _simplify(points, tolerance):
+    """Simplifies a line with the Douglas-Peucker algorithm, keeping the end points.
+    """
+    if len(points) <= 2 or tolerance <= 0:
+        return points
+    sq_tolerance = tolerance * tolerance
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = points[first]
+        bx, by = points[last]
+        dx, dy = bx - ax, by - ay
+        seg_len = dx * dx + dy * dy
+        max_dist = 0
+        index = first
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if seg_len == 0:
+                dist = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = max(0, min(1, ((px - ax) * dx + (py - ay) * dy) / seg_len))
+                dist = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if dist > max_dist:
+                max_dist = dist
+                index = i
+        if max_dist > sq_tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def _clip_polygon(ring, xmin, ymin, xmax, ymax):
+    """Clips a ring to a rectangle using the Sutherland-Hodgman algorithm.
+    """
+    def clip(points, inside, intersect):
+        output = []
+        if not points:
+            return output
+        prev = points[-1]
+        for curr in points:
+            if inside(curr):
+                if not inside(prev):
+                    output.append(intersect(prev, curr))
+                output.append(curr)
+            elif inside(prev):
+                output.append(intersect(prev, curr))
+            prev = curr
+        return output
+
+    def at_x(x):
+        return lambda a, b: (x, a[1] + (b[1] - a[1]) * (x - a[0]) / (b[0] - a[0]))
+
+    def at_y(y):
+        return lambda a, b: (a[0] + (b[0] - a[0]) * (y - a[1]) / (b[1] - a[1]), y)
+
+    points = clip(ring, lambda p: p[0] >= xmin, at_x(xmin))
+    points = clip(points, lambda p: p[0] <= xmax, at_x(xmax))
+    points = clip(points, lambda p: p[1] >= ymin, at_y(ymin))
+    points = clip(points, lambda p: p[1] <= ymax, at_y(ymax))
+    return points
+
+
+def _clip_line(line, xmin, ymin, xmax, ymax):
+    """Clips a line to a rectangle using the Liang-Barsky algorithm. Returns a list of lines.
+    """
+    lines = []
+    current = []
+    for i in range(len(line) - 1):
+        (x0, y0), (x1, y1) = line[i], line[i + 1]
+        dx, dy = x1 - x0, y1 - y0
+        t0, t1 = 0.0, 1.0
+        visible = True
+        for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+            if p == 0:
+                if q < 0:
+                    visible = False
+                    break
+            else:
+                t = q / p
+                if p < 0:
+                    t0 = max(t0, t)
+                else:
+                    t1 = min(t1, t)
+                if t0 > t1:
+                    visible = False
+                    break
+        if not visible:
+            if current:
+                lines.append(current)
+                current = []
+            continue
+        start = (x0 + t0 * dx, y0 + t0 * dy)
+        end = (x0 + t1 * dx, y0 + t1 * dy)
+        if not current:
+            current.append(start)
+        current.append(end)
+        if t1 < 1.0:
+            lines.append(current)
+            current = []
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _ring_area(ring):
+    area = 0
+    for i in range(len(ring)):
+        x0, y0 = ring[i - 1]
+        x1, y1 = ring[i]
+        area += x0 * y1 - x1 * y0
+    return area
+
+
+def _dedupe(points):
+    output = []
+    for p in points:
+        if not output or p != output[-1]:
+            output.append(p)
+    return output
+
+
+def _varint(value):
+    output = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            output.append(byte | 0x80)
+        else:
+            output.append(byte)
+            return bytes(output)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 31)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, data):
+    return _field(number, 2) + _varint(len(data)) + data
+
+
+def _packed_field(number, values):
+    return _bytes_field(number, b''.join(_varint(v) for v in values))
+
+
+def _encode_value(value):
+    """Encodes a property value as a MVT Value message.
+    """
+    if isinstance(value, bool):
+        return _field(7, 0) + _varint(int(value))
+    elif isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        if value >= 0:
+            return _field(5, 0) + _varint(value)
+        return _field(6, 0) + _varint(((value << 1) ^ (value >> 63)) & 0xFFFFFFFFFFFFFFFF)
+    elif isinstance(value, float):
+        return _field(3, 1) + struct.pack('<d', value)
+    else:
+        return _bytes_field(1, str(value).encode('utf-8'))
+
+
+def _encode_geometry(geom_type, parts):
+    """Encodes tile-space geometry parts as MVT geometry commands.
+    """
+    commands = []
+    cx, cy = 0, 0
+
+    def move(points):
+        nonlocal cx, cy
+        for x, y in points:
+            commands.append(_zigzag(x - cx))
+            commands.append(_zigzag(y - cy))
+            cx, cy = x, y
+
+    if geom_type == MVT_POINT:
+        commands.append((1 & 0x7) | (len(parts) << 3))
+        move(parts)
+    elif geom_type == MVT_LINESTRING:
+        for line in parts:
+            commands.append(1 | (1 << 3))
+            move(line[:1])
+            commands.append(2 | ((len(line) - 1) << 3))
+            move(line[1:])
+    else:
+        for polygon in parts:
+            for ring in polygon:
+                commands.append(1 | (1 << 3))
+                move(ring[:1])
+                commands.append(2 | ((len(ring) - 1) << 3))
+                move(ring[1:])
+                commands.append(7 | (1 << 3))
+    return commands
+
+
+class VectorTileIndex(object):
+    """An in-memory tile index of vector features, which generates Mapbox Vector Tiles on demand.
+
+    Args:
+        features (list): A list of GeoJSON features in EPSG:4326.
+        layer_name (str, optional): The name of the layer inside the vector tiles. Defaults to 'layer'.
+        max_zoom (int, optional): The zoom level with the most detailed simplification. Tiles beyond it reuse the geometries simplified for max_zoom and keep all points, while points are thinned below it. Defaults to 14.
+        tolerance (float, optional): The simplification tolerance, in screen pixels. Defaults to 1.0.
+        thin_pixels (int, optional): The size in screen pixels of the grid cells used to thin points. Only one point per cell is kept. Defaults to 4.
+        extent (int, optional): The extent of the tile coordinates. Defaults to 4096.
+        buffer (int, optional): The buffer around each tile, in tile coordinates. Defaults to 64.
+        cache_size (int, optional): The number of encoded tiles to keep in memory. Defaults to 512.
+        simplify_cache_size (int, optional): The number of simplified geometries, per feature and zoom level, to keep in memory. Defaults to 10000.
+    """
+
+    index_zoom = 7
+
+    def __init__(self, features, layer_name='layer', max_zoom=14, tolerance=1.0, thin_pixels=4, extent=4096, buffer=64, cache_size=512, simplify_cache_size=10000):
+        self.layer_name = layer_name
+        self.max_zoom = max_zoom
+        self.tolerance = tolerance
+        self.thin_pixels = thin_pixels
+        self.extent = extent
+        self.buffer = buffer
+        self.cache_size = cache_size
+        self.simplify_cache_size = simplify_cache_size
+
+        self._types = []
+        self._parts = []
+        self._properties = []
+        self._bboxes = []
+        self._simplified = OrderedDict()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Features are bucketed into a grid of cells at index_zoom. Features that cover too many cells are checked for every tile.
+        self._grid = {}
+        self._large = []
+        n = 2 ** self.index_zoom
+
+        for feature in features:
+            geom_type, parts = _project_geometry(feature.get('geometry'))
+            if geom_type is None or not parts:
+                continue
+            if geom_type == MVT_POINT:
+                points = parts
+            elif geom_type == MVT_LINESTRING:
+                points = [p for line in parts for p in line]
+            else:
+                points = [p for polygon in parts for p in polygon[0]]
+            if not points:
+                continue
+
+            fid = len(self._types)
+            bbox = _bbox(points)
+            self._types.append(geom_type)
+            self._parts.append(parts)
+            self._properties.append(self._clean_properties(
+                feature.get('properties')))
+            self._bboxes.append(bbox)
+
+            col0, row0 = int(bbox[0] * n), int(bbox[1] * n)
+            col1, row1 = min(int(bbox[2] * n), n - 1), min(int(bbox[3] * n), n - 1)
+            if (col1 - col0 + 1) * (row1 - row0 + 1) > 64:
+                self._large.append(fid)
+                continue
+            for col in range(col0, col1 + 1):
+                for row in range(row0, row1 + 1):
+                    self._grid.setdefault((col, row), []).append(fid)
+
+    def __len__(self):
+        return len(self._types)
+
+    @staticmethod
+    def _clean_properties(properties):
+        if not properties:
+            return {}
+        output = {}
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if not isinstance(value, (str, bool, int, float)):
+                value = str(value)
+            output[str(key)] = value
+        return output
+
+    def _candidates(self, xmin, ymin, xmax, ymax):
+        n = 2 ** self.index_zoom
+        fids = set(self._large)
+        for col in range(max(int(xmin * n), 0), min(int(xmax * n), n - 1) + 1):
+            for row in range(max(int(ymin * n), 0), min(int(ymax * n), n - 1) + 1):
+                fids.update(self._grid.get((col, row), []))
+        output = []
+        for fid in sorted(fids):
+            bxmin, bymin, bxmax, bymax = self._bboxes[fid]
+            if bxmin <= xmax and bxmax >= xmin and bymin <= ymax and bymax >= ymin:
+                output.append(fid)
+        return output
+
+    def _simplified_parts(self, fid, z):
+        """Returns the geometry parts of a feature simplified for the given zoom level. The most recently used ones are cached per zoom level.
+        """
+        geom_type = self._types[fid]
+        if geom_type == MVT_POINT:
+            return self._parts[fid]
+        key = (fid, z)
+        with self._lock:
+            parts = self._simplified.get(key)
+            if parts is not None:
+                self._simplified.move_to_end(key)
+                return parts
+
+        tolerance = self.tolerance / (TILE_SIZE * 2 ** z)
+        if geom_type == MVT_LINESTRING:
+            parts = [_simplify(line, tolerance)
+                     for line in self._parts[fid]]
+        else:
+            parts = [[_simplify(ring, tolerance) for ring in polygon]
+                     for polygon in self._parts[fid]]
+
+        with self._lock:
+            self._simplified[key] = parts
+            while len(self._simplified) > self.simplify_cache_size:
+                self._simplified.popitem(last=False)
+        return parts
+
+    def get_tile(self, z, x, y):
+        """Returns an encoded vector tile.
+
+        Args:
+            z (int): The zoom level of the tile.
+            x (int): The column of the tile.
+            y (int): The row of the tile.
+
+        Returns:
+            bytes: The Mapbox Vector Tile, or None if the tile is empty.
+        """
+        key = (z, x, y)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        data = self._encode_tile(z, x, y)
+
+        with self._lock:
+            self._cache[key] = data
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return data
+
+    def _encode_tile(self, z, x, y):
+        n = 2 ** z
+        pad = self.buffer / self.extent / n
+        xmin, ymin = x / n - pad, y / n - pad
+        xmax, ymax = (x + 1) / n + pad, (y + 1) / n + pad
+        level = min(z, self.max_zoom)
+
+        def to_tile(points):
+            return _dedupe([(int(round((px * n - x) * self.extent)), int(round((py * n - y) * self.extent)))
+                            for px, py in points])
+
+        thin_cells = set()
+        thin_size = self.thin_pixels * self.extent / TILE_SIZE
+
+        keys = OrderedDict()
+        values = OrderedDict()
+        encoded_features = []
+
+        for fid in self._candidates(xmin, ymin, xmax, ymax):
+            geom_type = self._types[fid]
+            parts = self._simplified_parts(fid, level)
+            tile_parts = []
+
+            if geom_type == MVT_POINT:
+                for px, py in parts:
+                    if not (xmin <= px <= xmax and ymin <= py <= ymax):
+                        continue
+                    tx = int(round((px * n - x) * self.extent))
+                    ty = int(round((py * n - y) * self.extent))
+                    if z < self.max_zoom and self.thin_pixels > 0:
+                        cell = (int(tx // thin_size), int(ty // thin_size))
+                        if cell in thin_cells:
+                            continue
+                        thin_cells.add(cell)
+                    tile_parts.append((tx, ty))
+            elif geom_type == MVT_LINESTRING:
+                for line in parts:
+                    for clipped in _clip_line(line, xmin, ymin, xmax, ymax):
+                        clipped = to_tile(clipped)
+                        if len(clipped) >= 2:
+                            tile_parts.append(clipped)
+            else:
+                for polygon in parts:
+                    rings = []
+                    for index, ring in enumerate(polygon):
+                        clipped = to_tile(_clip_polygon(
+                            ring, xmin, ymin, xmax, ymax))
+                        if len(clipped) > 1 and clipped[0] == clipped[-1]:
+                            clipped = clipped[:-1]
+                        if len(clipped) < 3:
+                            if index == 0:
+                                break
+                            continue
+                        area = _ring_area(clipped)
+                        if area == 0:
+                            if index == 0:
+                                break
+                            continue
+                        # Exterior rings must have a positive area and interior rings a negative area.
+                        if (index == 0) != (area > 0):
+                            clipped = clipped[::-1]
+                        rings.append(clipped)
+                    if rings:
+                        tile_parts.append(rings)
+
+            if not tile_parts:
+                continue
+
+            tags = []
+            for prop_key, prop_value in self._properties[fid].items():
+                if prop_key not in keys:
+                    keys[prop_key] = len(keys)
+                value_key = (type(prop_value).__name__, prop_value)
+                if value_key not in values:
+                    values[value_key] = len(values)
+                tags.extend([keys[prop_key], values[value_key]])
+
+            feature = _field(1, 0) + _varint(fid)
+            if tags:
+                feature += _packed_field(2, tags)
+            feature += _field(3, 0) + _varint(geom_type)
+            feature += _packed_field(4,
+                                     _encode_geometry(geom_type, tile_parts))
+            encoded_features.append(feature)
+
+        if not encoded_features:
+            return None
+
+        layer = _field(15, 0) + _varint(2)
+        layer += _bytes_field(1, self.layer_name.encode('utf-8'))
+        for feature in encoded_features:
+            layer += _bytes_field(2, feature)
+        for key in keys:
+            layer += _bytes_field(3, key.encode('utf-8'))
+        for value_key in values:
+            layer += _bytes_field(4, _encode_value(value_key[1]))
+        layer += _field(5, 0) + _varint(self.extent)
+        return _bytes_field(3, layer)
+
+
+def vector_tile_index(in_file, layer_name=None, **kwargs):
+    """Builds a vector tile index from a shapefile or GeoJSON file.
+
+    Args:
+        in_file (str): File path of the input shapefile or GeoJSON.
+        layer_name (str, optional): The name of the layer inside the vector tiles. Defaults to the file name.
+        **kwargs: Keyword arguments passed to VectorTileIndex, such as max_zoom, tolerance and thin_pixels.
+
+    Returns:
+        object: The VectorTileIndex.
+    """
+    if layer_name is None:
+        layer_name = os.path.splitext(os.path.basename(in_file))[0]
+    features = read_features(in_file)
+    return VectorTileIndex(features, layer_name=layer_name, **kwargs)
@@ -50,6 +50,7 @@ setup(
         ],
     },
     install_requires=install_requires,
+    extras_require={'rasterio': ['rasterio']},
     dependency_links=dependency_links,
     license="MIT license",
     long_description=readme + '\n\n' + history,
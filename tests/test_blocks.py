@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.blocks` module."""
+
+
+import io
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from geemap import blocks
+
+
+def _band_sum(block):
+    return block.sum(axis=2, dtype='float32')
+
+
+class TestBlocks(unittest.TestCase):
+    """Tests for `geemap.blocks` module."""
+
+    def test_decode_npy(self):
+        """Test decoding a structured NPY download without copying it."""
+        values = np.zeros((3, 4), dtype=[('B1', 'uint8'), ('B2', 'float32')])
+        values['B1'] = np.arange(12).reshape(3, 4)
+        values['B2'] = 0.5
+        buffer = io.BytesIO()
+        np.save(buffer, values)
+
+        decoded = blocks._decode_npy(buffer.getvalue())
+        self.assertEqual(decoded.shape, (3, 4))
+        self.assertEqual(decoded.dtype.names, ('B1', 'B2'))
+        self.assertTrue(np.array_equal(decoded['B1'], values['B1']))
+        self.assertFalse(decoded.flags.owndata)
+
+    def test_band_dtype(self):
+        """Test mapping Earth Engine band types to numpy dtypes."""
+        self.assertEqual(blocks.band_dtype(
+            {'precision': 'int', 'min': 0, 'max': 255}), np.uint8)
+        self.assertEqual(blocks.band_dtype(
+            {'precision': 'int', 'min': -32768, 'max': 32767}), np.int16)
+        self.assertEqual(blocks.band_dtype({'precision': 'float'}), np.float32)
+        self.assertEqual(blocks.band_dtype(
+            {'precision': 'double'}), np.float64)
+
+    def test_fetch_blocks(self):
+        """Test that blocks are downloaded concurrently with bounded read-ahead."""
+        plan = {'crs': 'EPSG:4326', 'tiles': [{'index': i} for i in range(20)]}
+        lock = threading.Lock()
+        state = {'started': 0, 'consumed': 0, 'ahead': 0}
+
+        def fetch_block(image, block, crs):
+            with lock:
+                state['started'] += 1
+                state['ahead'] = max(
+                    state['ahead'], state['started'] - state['consumed'])
+            time.sleep(0.01)
+            return block['index']
+
+        original = blocks._fetch_block
+        blocks._fetch_block = fetch_block
+        try:
+            indexes = []
+            for block, values in blocks._fetch_blocks(None, plan, workers=3, read_ahead=2):
+                with lock:
+                    state['consumed'] += 1
+                indexes.append(values)
+        finally:
+            blocks._fetch_block = original
+        self.assertEqual(sorted(indexes), list(range(20)))
+        self.assertLessEqual(state['ahead'], 5)
+
+    def test_map_blocks(self):
+        """Test applying a function to blocks on a process pool through shared memory."""
+        data = np.arange(300 * 200 * 2, dtype='uint16').reshape(300, 200, 2)
+        tiles = [{'row_off': r, 'col_off': c, 'height': min(128, 300 - r), 'width': min(128, 200 - c)}
+                 for r in range(0, 300, 128) for c in range(0, 200, 128)]
+        plan = {'height': 300, 'width': 200, 'crs': 'EPSG:4326',
+                'crs_transform': [1, 0, 0, 0, -1, 0], 'tiles': tiles}
+
+        def plan_read(image, region, scale, crs, default_value, masked=False, tile_shape=None):
+            return image, plan, ['B1', 'B2'], [], np.dtype('uint16')
+
+        def fetch_blocks(image, plan, workers=4, read_ahead=None):
+            for block in plan['tiles']:
+                window = data[block['row_off']:block['row_off'] + block['height'],
+                              block['col_off']:block['col_off'] + block['width']]
+                values = np.zeros(window.shape[:2], dtype=[
+                                  ('B1', 'uint16'), ('B2', 'uint16')])
+                values['B1'], values['B2'] = window[:, :, 0], window[:, :, 1]
+                yield block, values
+
+        originals = blocks._plan_read, blocks._fetch_blocks
+        blocks._plan_read, blocks._fetch_blocks = plan_read, fetch_blocks
+        try:
+            result = blocks.map_blocks(
+                _band_sum, None, block_shape=(128, 128), processes=2)
+        finally:
+            blocks._plan_read, blocks._fetch_blocks = originals
+        self.assertEqual(result.shape, (300, 200, 1))
+        self.assertEqual(result.dtype, np.float32)
+        self.assertTrue(np.array_equal(result[:, :, 0], _band_sum(data)))
+
+
+if __name__ == '__main__':
+    unittest.main()
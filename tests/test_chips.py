@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.chips` module."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from geemap import blocks, chips
+
+
+class TestChips(unittest.TestCase):
+    """Tests for `geemap.chips` module."""
+
+    def setUp(self):
+        """Set up a temporary directory."""
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_group_chips(self):
+        """Test that nearby chips share windows, and that windows fit the limits."""
+        random = np.random.RandomState(0)
+        cluster = [(int(c), int(r)) for c, r in random.randint(0, 100, (50, 2))]
+        scattered = [(int(c), int(r)) for c, r in random.randint(0, 20000, (20, 2))]
+        origins = cluster + scattered + [(5, 5), (5, 5)]
+        windows = chips._group_chips(origins, 16, 500)
+
+        covered = sorted(i for window in windows for i in window[4])
+        self.assertEqual(covered, list(range(len(origins))))
+        for col0, row0, width, height, indices in windows:
+            self.assertLessEqual(max(width, height), 500)
+            for i in indices:
+                col, row = origins[i]
+                self.assertTrue(col0 <= col and col + 16 <= col0 + width)
+                self.assertTrue(row0 <= row and row + 16 <= row0 + height)
+        self.assertLess(len(windows), len(origins) // 2)
+
+    def test_read_chips(self):
+        """Test cutting chips from shared requests into a memmap with an index."""
+        # A 1 meter grid whose pixel (col, row) has the value col + 1000 * row.
+        xy = [[10.5, -20.5], [13.5, -22.5], [900.5, -5.5]]
+        info = {'crs': 'EPSG:3857', 'x_res': 1, 'y_res': 1, 'band_names': ['B1'],
+                'band_types': {'B1': {'precision': 'int', 'min': -2 ** 31, 'max': 2 ** 31 - 1}},
+                'xy': xy, 'ids': ['a', 'b', 'c']}
+        requests = []
+
+        def fetch_block(image, block, crs):
+            requests.append(block)
+            cols = np.arange(block['width']) + block['col_off']
+            rows = np.arange(block['height']) + block['row_off']
+            values = np.zeros((block['height'], block['width']), dtype=[('B1', 'int32')])
+            values['B1'] = cols[np.newaxis, :] + 1000 * rows[:, np.newaxis]
+            return values
+
+        out = os.path.join(self.tmp_dir, 'chips.npy')
+        with mock.patch.object(chips, '_query_points', return_value=info), \
+                mock.patch.object(blocks, '_fetch_block', fetch_block):
+            array, index = chips.read_chips(None, None, size=4, out=out)
+
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(array.shape, (3, 4, 4, 1))
+        self.assertEqual(array.dtype, np.int32)
+        for chip, (x, y) in zip(np.load(out), xy):
+            col, row = int(x) - 2, int(-y) - 2
+            self.assertEqual(chip[0, 0, 0], col + 1000 * row)
+            self.assertEqual(chip[3, 3, 0], col + 3 + 1000 * (row + 3))
+        self.assertEqual(index[1]['id'], 'b')
+        with open(os.path.join(self.tmp_dir, 'chips.csv')) as f:
+            self.assertEqual(f.readline().strip(), 'id,index,x,y,col_off,row_off,x0,y0')
+
+
+if __name__ == '__main__':
+    unittest.main()
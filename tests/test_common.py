@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.common` module."""
+
+
+import unittest
+from unittest import mock
+
+import ee
+
+from geemap import common
+
+
+def _ee_object(spec, key):
+    """Builds a mock Earth Engine object, which serializes to the given key."""
+    ee_object = mock.MagicMock(spec=spec)
+    ee_object.serialize.return_value = key
+    return ee_object
+
+
+class TestCommon(unittest.TestCase):
+    """Tests for `geemap.common` module."""
+
+    def setUp(self):
+        """Set up an empty bounds cache."""
+        common._bounds_cache.clear()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        common._bounds_cache.clear()
+
+    def test_ee_object_bounds(self):
+        """Test computing the bounds of geometries, images and collections."""
+        ring = [[[-100, 30], [-90, 30], [-90, 40], [-100, 40], [-100, 30]]]
+        geometry = _ee_object(ee.Geometry, 'geometry')
+        geometry.bounds.return_value.coordinates.return_value.getInfo.return_value = ring
+        self.assertEqual(common.ee_object_bounds(geometry), [[30, -100], [40, -90]])
+        geometry.bounds.assert_called_once_with(100)
+
+        image = _ee_object(ee.Image, 'image')
+        image.geometry.return_value.bounds.return_value.coordinates.return_value.getInfo.return_value = ring
+        self.assertEqual(common.ee_object_bounds(image), [[30, -100], [40, -90]])
+
+        collection = _ee_object(ee.FeatureCollection, 'collection')
+        result = collection.map.return_value.reduceColumns.return_value.getInfo
+        result.return_value = {'min': [-100, 30], 'max': [-80, 45]}
+        with mock.patch.object(ee, 'Reducer'):
+            self.assertEqual(common.ee_object_bounds(collection), [[30, -100], [45, -80]])
+
+        empty = _ee_object(ee.ImageCollection, 'empty')
+        empty.map.return_value.reduceColumns.return_value.getInfo.return_value = {
+            'min': [None, None], 'max': [None, None]}
+        with mock.patch.object(ee, 'Reducer'):
+            self.assertIsNone(common.ee_object_bounds(empty))
+
+        with self.assertRaises(TypeError):
+            common.ee_object_bounds(_ee_object(ee.Number, 'number'))
+
+    def test_bounds_cache(self):
+        """Test caching the bounds by the serialized object and the maximum error."""
+        ring = [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]
+        geometry = _ee_object(ee.Geometry, 'geometry')
+        get_info = geometry.bounds.return_value.coordinates.return_value.getInfo
+        get_info.return_value = ring
+        common.ee_object_bounds(geometry)
+        common.ee_object_bounds(geometry)
+        self.assertEqual(get_info.call_count, 1)
+
+        # The same object built again is found in the cache.
+        same = _ee_object(ee.Geometry, 'geometry')
+        self.assertEqual(common.ee_object_bounds(same), [[0, 0], [1, 1]])
+        same.bounds.assert_not_called()
+
+        common.ee_object_bounds(geometry, max_error=1)
+        self.assertEqual(get_info.call_count, 2)
+
+        with mock.patch.object(common, '_bounds_cache_size', 2):
+            for key in ['a', 'b', 'c']:
+                other = _ee_object(ee.Geometry, key)
+                other.bounds.return_value.coordinates.return_value.getInfo.return_value = ring
+                common.ee_object_bounds(other)
+            self.assertEqual([key[0] for key in common._bounds_cache], ['b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
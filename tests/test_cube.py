@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.cube` module."""
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from geemap import cube
+
+
+class TestCube(unittest.TestCase):
+    """Tests for `geemap.cube` module."""
+
+    def setUp(self):
+        """Set up a cube of 5 images of 2 bands, stored in chunks of (2, 4, 3)."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data = np.arange(5 * 2 * 10 * 7, dtype='int16').reshape(5, 2, 10, 7)
+        meta = {'shape': [5, 2, 10, 7], 'chunks': [2, 4, 3], 'dtype': '<i2', 'ids': list('abcde'),
+                'dates': [None] * 5, 'bands': ['B1', 'B2'], 'crs': 'EPSG:4326',
+                'crs_transform': [1, 0, 0, 0, -1, 0], 'fill_value': -1}
+        with open(os.path.join(self.tmp_dir, cube.META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+        def fetch_block(image, block, crs):
+            # A toBands() download of the images of a time chunk.
+            t, rows, cols = image
+            window = self.data[t, :, rows, cols]
+            fields = [('{}_{}'.format(i, band), 'int16')
+                      for i in range(window.shape[0]) for band in ['B1', 'B2']]
+            values = np.zeros(window.shape[2:], dtype=fields)
+            for index, name in enumerate(values.dtype.names):
+                values[name] = window[index // 2, index % 2]
+            return values
+
+        with mock.patch.object(cube, '_fetch_block', fetch_block):
+            for t in range(3):
+                for y in range(3):
+                    for x in range(3):
+                        if (t, y, x) == (1, 1, 1):
+                            continue
+                        window = (slice(2 * t, 2 * t + 2), slice(4 * y, 4 * y + 4),
+                                  slice(3 * x, 3 * x + 3))
+                        shape = self.data[window[0], :, window[1], window[2]].shape
+                        cube._write_chunk(window, None, None, os.path.join(
+                            self.tmp_dir, cube._chunk_name(t, y, x)), shape, np.dtype('int16'))
+        self.data[2:4, :, 4:8, 3:6] = -1
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_getitem(self):
+        """Test reading slices of a cube lazily."""
+        c = cube.open_cube(self.tmp_dir)
+        self.assertEqual(c.shape, (5, 2, 10, 7))
+        self.assertEqual(c.missing, [(1, 1, 1)])
+        self.assertTrue(np.array_equal(np.asarray(c), self.data))
+        for key in [0, -1, (slice(1, 4), 1), (Ellipsis, slice(2, 9), 5),
+                    (slice(None, None, 2), slice(None), slice(9, 0, -3)),
+                    (3, 0, slice(3, 8), slice(1, 6, 2))]:
+            self.assertTrue(np.array_equal(c[key], self.data[key]), key)
+        with self.assertRaises(IndexError):
+            c[5]
+
+    def test_write_cube(self):
+        """Test downloading a cube, with each time chunk selected by the system:index of its images."""
+        out_dir = os.path.join(self.tmp_dir, 'out')
+        ids = list('abcde')
+        tiles = [{'col_off': col, 'row_off': row, 'width': min(3, 7 - col), 'height': min(4, 10 - row)}
+                 for row in range(0, 10, 4) for col in range(0, 7, 3)]
+        plan = {'height': 10, 'width': 7, 'tiles': tiles, 'crs': 'EPSG:4326',
+                'crs_transform': [1, 0, 0, 0, -1, 0]}
+        groups = []
+
+        def time_group(collection, group_ids):
+            groups.append(list(group_ids))
+            return [ids.index(index) for index in group_ids]
+
+        def fetch_block(image, block, crs):
+            rows = slice(block['row_off'], block['row_off'] + block['height'])
+            cols = slice(block['col_off'], block['col_off'] + block['width'])
+            fields = [('{}_{}'.format(ids[t], band), 'int16')
+                      for t in image for band in ['B1', 'B2']]
+            values = np.zeros((block['height'], block['width']), dtype=fields)
+            for index, name in enumerate(values.dtype.names):
+                values[name] = self.data[image[index // 2], index % 2, rows, cols]
+            return values
+
+        with mock.patch.object(cube, '_collection_info', return_value=(ids, [None] * 5, ['B1', 'B2'])), \
+                mock.patch.object(cube, '_time_group', time_group), \
+                mock.patch.object(cube, '_plan_read', return_value=(None, plan, None, None, np.dtype('int16'))), \
+                mock.patch.object(cube, '_fetch_block', fetch_block):
+            c = cube.write_cube(None, out_dir, region='region', scale=1, chunks=(2, 4, 3),
+                                verbose=False)
+        self.assertEqual(groups, [['a', 'b'], ['a', 'b'], ['c', 'd'], ['e']])
+        self.assertEqual(c.missing, [])
+        self.assertTrue(np.array_equal(np.asarray(c), self.data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.download` module."""
+
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from geemap.download import download_file, extract_zip_url
+
+DATA = bytes(range(256)) * 12288
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves the data of the server, honoring Range requests unless the server disables them. The first response can be cut short to simulate a dropped connection."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.error is not None:
+            status, message = server.error
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(message)))
+            self.end_headers()
+            self.wfile.write(message)
+            return
+        if server.failures > 0:
+            server.failures -= 1
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        start = 0
+        status = 200
+        range_header = self.headers.get('Range')
+        if range_header and server.ranges:
+            start = int(range_header.split('=')[1].split('-')[0])
+            status = 206
+        data = server.data
+        body = data[start:]
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"v1"')
+        if status == 206:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(data) - 1, len(data)))
+        self.end_headers()
+
+        if server.drop_after is not None:
+            body = body[:server.drop_after]
+            server.drop_after = None
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDownload(unittest.TestCase):
+    """Tests for `geemap.download` module."""
+
+    def setUp(self):
+        """Set up a local HTTP server standing in for the download service."""
+        self.server = HTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.requests = []
+        self.server.data = DATA
+        self.server.ranges = True
+        self.server.drop_after = None
+        self.server.failures = 0
+        self.server.error = None
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/data.bin'.format(
+            self.server.server_address[1])
+        self.out_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.out_dir, 'data.bin')
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.out_dir)
+
+    def _read(self):
+        with open(self.filename, 'rb') as f:
+            return f.read()
+
+    def test_resume(self):
+        """Test resuming an interrupted download with a Range request."""
+        self.server.drop_after = 1500000
+        download_file(self.url, self.filename)
+        self.assertEqual(self._read(), DATA)
+        self.assertFalse(os.path.exists(self.filename + '.part'))
+        # Only whole chunks of 1 MB are written before the connection drops.
+        self.assertEqual(self.server.requests[-1]['Range'], 'bytes=1048576-')
+        self.assertEqual(self.server.requests[-1]['If-Range'], '"v1"')
+
+    def test_no_range_support(self):
+        """Test restarting the download when the server ignores Range requests."""
+        with open(self.filename + '.part', 'wb') as f:
+            f.write(DATA[:5000])
+        self.server.ranges = False
+        download_file(self.url, self.filename)
+        self.assertEqual(self._read(), DATA)
+
+    def test_stale_part(self):
+        """Test that a .part file left by a download from another URL is not resumed."""
+        with open(self.filename + '.part', 'wb') as f:
+            f.write(b'x' * 40000)
+        with open(self.filename + '.part.json', 'w') as f:
+            json.dump({'url': self.url + '?old', 'validator': '"v1"'}, f)
+        download_file(self.url, self.filename)
+        self.assertEqual(self._read(), DATA)
+        self.assertNotIn('Range', self.server.requests[-1])
+
+        # Without a validator, the .part file can not be checked either.
+        with open(self.filename + '.part', 'wb') as f:
+            f.write(b'x' * 40000)
+        with open(self.filename + '.part.json', 'w') as f:
+            json.dump({'url': self.url, 'validator': None}, f)
+        download_file(self.url, self.filename)
+        self.assertEqual(self._read(), DATA)
+        self.assertNotIn('Range', self.server.requests[-1])
+
+    def test_retry(self):
+        """Test retrying requests after 5xx responses with the shared session."""
+        self.server.failures = 2
+        download_file(self.url, self.filename)
+        self.assertEqual(self._read(), DATA)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_checksum(self):
+        """Test verifying the checksum of the downloaded file."""
+        checksum = 'sha256:' + hashlib.sha256(DATA).hexdigest()
+        download_file(self.url, self.filename, checksum=checksum)
+        self.assertEqual(self._read(), DATA)
+
+        os.remove(self.filename)
+        with self.assertRaises(IOError):
+            download_file(self.url, self.filename, checksum='md5:0')
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertFalse(os.path.exists(self.filename + '.part'))
+
+    def _zip(self, streamed, stored=False):
+        """Builds a zip file. Zip files written to a non-seekable stream use data descriptors."""
+        buffer = io.BytesIO()
+        target = _Unseekable(buffer) if streamed else buffer
+        with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.writestr('image.tif', DATA)
+            z.writestr('image.tfw', b'1 0 0 -1 0 0')
+            if stored:
+                z.writestr('readme.txt', b'stored', zipfile.ZIP_STORED)
+        return buffer.getvalue()
+
+    def test_extract_zip_stream(self):
+        """Test extracting a zip file while it is being downloaded."""
+        # Stored members with data descriptors can not be streamed and fall back to a spooled buffer.
+        cases = [(False, True, 1), (True, False, 1), (True, True, 2)]
+        for streamed, stored, request_count in cases:
+            self.server.requests = []
+            self.server.data = self._zip(streamed, stored)
+            out_dir = os.path.join(self.out_dir, str(len(self.server.data)))
+            members = extract_zip_url(self.url, out_dir)
+            self.assertEqual(len(self.server.requests), request_count)
+            self.assertEqual(sorted(members), sorted(os.listdir(out_dir)))
+            self.assertEqual(len(members), 3 if stored else 2)
+            with open(os.path.join(out_dir, 'image.tif'), 'rb') as f:
+                self.assertEqual(f.read(), DATA)
+
+    def test_extract_zip_members(self):
+        """Test extracting only the requested members."""
+        self.server.data = self._zip(False, True)
+        members = extract_zip_url(self.url, self.out_dir, members=['*.tif'])
+        self.assertEqual(members, ['image.tif'])
+        self.assertEqual(sorted(os.listdir(self.out_dir)), ['image.tif'])
+
+    def test_extract_zip_errors(self):
+        """Test that HTTP errors keep their message and that invalid zip files are not downloaded again."""
+        import requests
+
+        self.server.error = (403, b'Permission denied.')
+        with self.assertRaises(requests.HTTPError) as context:
+            extract_zip_url(self.url, self.out_dir)
+        self.assertIn('Permission denied.', str(context.exception))
+        self.server.error = None
+
+        for streamed in [False, True]:
+            self.server.requests = []
+            data = bytearray(self._zip(streamed))
+            # Corrupts the compressed data of the first member, after its local file header.
+            data[100:110] = bytes(10)
+            self.server.data = bytes(data)
+            with self.assertRaises(IOError):
+                extract_zip_url(self.url, self.out_dir)
+            self.assertEqual(len(self.server.requests), 1)
+            self.assertFalse(os.path.exists(
+                os.path.join(self.out_dir, 'image.tif')))
+
+
+class _Unseekable(object):
+    """A write-only file object without seek support."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.export` module."""
+
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from geemap import export
+
+
+class TestExport(unittest.TestCase):
+    """Tests for `geemap.export` module."""
+
+    def setUp(self):
+        """Set up a GeoTIFF standing in for an image collection stacked with toBands()."""
+        import rasterio
+        from rasterio.transform import from_origin
+
+        self.out_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.out_dir, 'stack.tif')
+        self.ids = ['1', '1_2', '20200101']
+        self.band_names = ['{}_{}'.format(index, band)
+                           for index in self.ids for band in ['B1', 'B2']]
+        self.data = np.arange(6 * 4 * 5, dtype='uint16').reshape(6, 4, 5)
+        with rasterio.open(self.filename, 'w', driver='GTiff', width=5, height=4, count=6, dtype='uint16',
+                           crs='EPSG:4326', transform=from_origin(0, 0, 1, 1)) as dst:
+            dst.write(self.data)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.out_dir)
+
+    def test_split_image_stack(self):
+        """Test splitting a stacked image into one GeoTIFF per image."""
+        import rasterio
+
+        files = export.split_image_stack(
+            self.filename, self.out_dir, self.ids, self.band_names)
+        self.assertEqual([os.path.basename(f) for f in files],
+                         ['1.tif', '1_2.tif', '20200101.tif'])
+        with rasterio.open(files[1]) as src:
+            self.assertEqual(src.descriptions, ('B1', 'B2'))
+            self.assertTrue(np.array_equal(src.read(), self.data[2:4]))
+
+    def test_read_image_stack(self):
+        """Test reading a stacked image into a (time, band, y, x) array."""
+        data, ids, names = export.read_image_stack(
+            self.filename, self.ids, self.band_names)
+        self.assertEqual(data.shape, (3, 2, 4, 5))
+        self.assertEqual(ids, self.ids)
+        self.assertEqual(names, ['B1', 'B2'])
+        self.assertTrue(np.array_equal(data[2, 1], self.data[5]))
+
+    def _plan(self, width, height, band_types, **kwargs):
+        """Plans an export of a width x height image at a scale of 1, with a mocked server query."""
+        info = {'projection': {'crs': 'EPSG:32610', 'transform': [1, 0, 0, 0, -1, 0]},
+                'bounds': [[[0, 0], [width, 0], [width, height], [0, height], [0, 0]]],
+                'band_names': list(band_types), 'band_types': band_types}
+        with mock.patch.object(export, 'ee') as ee:
+            ee.Dictionary.return_value.getInfo.return_value = info
+            return export.plan_export(mock.MagicMock(), region={'type': 'Polygon'}, scale=1, **kwargs)
+
+    def test_plan_export(self):
+        """Test sizing the export and its tiles."""
+        uint8 = {'type': 'PixelType', 'precision': 'int', 'min': 0, 'max': 255}
+        int16 = {'type': 'PixelType', 'precision': 'int', 'min': -32768, 'max': 32767}
+        double = {'type': 'PixelType', 'precision': 'double'}
+
+        plan = self._plan(300, 200, {'B1': uint8, 'B2': int16, 'B3': double})
+        self.assertEqual(plan['crs'], 'EPSG:32610')
+        self.assertEqual(plan['crs_transform'], [1, 0, 0, 0, -1, 200])
+        self.assertEqual((plan['width'], plan['height'], plan['pixels']), (300, 200, 60000))
+        self.assertEqual(plan['bytes_per_band'], {
+                         'B1': 60000, 'B2': 120000, 'B3': 480000})
+        # The bands are written to a single GeoTIFF with the widest data type.
+        self.assertEqual(plan['total_bytes'], 60000 * 8 * 3)
+        self.assertEqual(plan['tile_count'], 1)
+
+        # Rows and columns are sized separately, so a long strip needs as few requests as the grid dimension limit allows.
+        plan = self._plan(12000, 10, {'B1': uint8})
+        self.assertEqual(plan['tile_grid'], (2, 1))
+        self.assertEqual([(t['width'], t['height']) for t in plan['tiles']], [(6000, 10), (6000, 10)])
+        self.assertEqual(plan['tiles'][1]['crs_transform'], [1, 0, 6000, 0, -1, 10])
+        self.assertEqual(self._plan(10, 12000, {'B1': uint8})['tile_grid'], (1, 2))
+
+        plan = self._plan(1000, 1000, {'B1': double, 'B2': double}, max_bytes=1000000)
+        self.assertEqual(plan['tile_grid'], (4, 4))
+        for tile in plan['tiles']:
+            self.assertLessEqual(tile['width'] * tile['height'] * 16, 1000000)
+        self.assertEqual(sum(t['width'] * t['height'] for t in plan['tiles']), 1000000)
+
+        plan = self._plan(1000, 1000, {'B1': uint8}, tile_shape=(256, 512))
+        self.assertEqual(plan['tile_grid'], (2, 4))
+        with self.assertRaises(ValueError):
+            self._plan(1000, 1000, {'B1': uint8}, max_pixels=1000, tile_shape=(256, 256))
+
+    def test_plan_collection_export(self):
+        """Test planning the export of the images of a collection with a single query."""
+        uint8 = {'type': 'PixelType', 'precision': 'int', 'min': 0, 'max': 255}
+        infos = [{'projection': {'crs': 'EPSG:32610', 'transform': [scale, 0, 0, 0, -scale, 0]},
+                  'bounds': [[[0, 0], [3000, 0], [3000, 2000], [0, 2000], [0, 0]]],
+                  'band_names': ['B1'], 'band_types': {'B1': uint8}, 'scale': scale} for scale in [10, 100]]
+        with mock.patch.object(export, 'ee') as ee:
+            ee.Dictionary.return_value.getInfo.return_value = {'ids': ['a', 'b'], 'plans': infos}
+            ids, plans = export.plan_collection_export(mock.MagicMock(), scale=lambda image: 10)
+            self.assertEqual(ee.Dictionary.return_value.getInfo.call_count, 1)
+        self.assertEqual(ids, ['a', 'b'])
+        self.assertEqual([(plans[i]['width'], plans[i]['height'], plans[i]['scale']) for i in ids],
+                         [(300, 200, 10), (30, 20, 100)])
+
+    def _tiled_plan(self, width, height, tile_width, tile_height):
+        tiles = [{'col_off': col, 'row_off': row, 'width': min(tile_width, width - col),
+                  'height': min(tile_height, height - row),
+                  'crs_transform': [1, 0, col, 0, -1, -row]}
+                 for row in range(0, height, tile_height) for col in range(0, width, tile_width)]
+        return {'crs': 'EPSG:4326', 'width': width, 'height': height, 'tiles': tiles}
+
+    def test_download_image_tiles(self):
+        """Test mosaicking downloaded tiles into one GeoTIFF per band, with a bounded number of tiles on disk."""
+        import rasterio
+        from rasterio.transform import from_origin
+
+        data = np.arange(2 * 23 * 17, dtype='uint16').reshape(2, 23, 17)
+        plan = self._tiled_plan(17, 23, 5, 4)
+        lock = threading.Lock()
+        on_disk = []
+
+        def download_tile(image, tile, name, file_per_band, out_dir):
+            with lock:
+                tmp_dir = os.path.dirname(out_dir)
+                on_disk.append(len([d for d in os.listdir(tmp_dir)
+                                    if os.path.isdir(os.path.join(tmp_dir, d))]))
+            rows = slice(tile['row_off'], tile['row_off'] + tile['height'])
+            cols = slice(tile['col_off'], tile['col_off'] + tile['width'])
+            members = []
+            for index, band in enumerate(['B1', 'B2']):
+                members.append('{}.{}.tif'.format(name, band))
+                with rasterio.open(os.path.join(out_dir, members[-1]), 'w', driver='GTiff',
+                                   width=tile['width'], height=tile['height'], count=1, dtype='uint16', crs='EPSG:4326',
+                                   transform=from_origin(tile['col_off'], -tile['row_off'], 1, 1)) as dst:
+                    dst.write(data[index, rows, cols], 1)
+            return members
+
+        filename = os.path.join(self.out_dir, 'image.tif')
+        with mock.patch.object(export, '_download_tile', download_tile):
+            export.download_image_tiles(None, filename, plan, file_per_band=True,
+                                        workers=2, verbose=False)
+        self.assertEqual(len(on_disk), len(plan['tiles']))
+        self.assertLessEqual(max(on_disk), 4)
+        self.assertEqual(sorted(os.listdir(self.out_dir)),
+                         ['image.B1.tif', 'image.B2.tif', 'stack.tif'])
+        for index, band in enumerate(['B1', 'B2']):
+            with rasterio.open(os.path.join(self.out_dir, 'image.{}.tif'.format(band))) as src:
+                self.assertEqual(src.transform, from_origin(0, 0, 1, 1))
+                self.assertTrue(np.array_equal(src.read(1), data[index]))
+
+    def test_download_image_tiles_failure(self):
+        """Test that a failed tile leaves neither a partial GeoTIFF nor temporary files."""
+        import rasterio
+        from rasterio.transform import from_origin
+
+        def download_tile(image, tile, name, file_per_band, out_dir):
+            if tile['index'] == 3:
+                raise IOError('An error occurred while downloading tile 3')
+            with rasterio.open(os.path.join(out_dir, name + '.tif'), 'w', driver='GTiff', width=tile['width'],
+                               height=tile['height'], count=1, dtype='uint8', crs='EPSG:4326',
+                               transform=from_origin(tile['col_off'], -tile['row_off'], 1, 1)) as dst:
+                dst.write(np.ones((tile['height'], tile['width']), dtype='uint8'), 1)
+            return [name + '.tif']
+
+        filename = os.path.join(self.out_dir, 'image.tif')
+        with mock.patch.object(export, '_download_tile', download_tile):
+            with self.assertRaises(IOError):
+                export.download_image_tiles(None, filename, self._tiled_plan(10, 10, 4, 4),
+                                            workers=1, verbose=False)
+        self.assertEqual(os.listdir(self.out_dir), ['stack.tif'])
+
+    def _write_pages(self, writer_class, files, out_file):
+        writer = writer_class(out_file)
+        for page_file in files:
+            writer.append(page_file)
+        return writer.close()
+
+    def test_merge_pages(self):
+        """Test appending pages of a feature collection to a single file."""
+        import shapefile
+
+        csv_files = []
+        pages = ['id,name\n1,a\n', 'name,id\nb,2\n', 'id,area\n3,1.5\n']
+        for index, page in enumerate(pages):
+            csv_files.append(os.path.join(self.out_dir, '{}.csv'.format(index)))
+            with open(csv_files[-1], 'w') as f:
+                f.write(page)
+        out_file = os.path.join(self.out_dir, 'out.csv')
+        self._write_pages(export._CsvPages, csv_files[:2], out_file)
+        with open(out_file) as f:
+            self.assertEqual(f.read(), 'id,name\n1,a\n2,b\n')
+        # Columns only found in later pages are kept.
+        self._write_pages(export._CsvPages, csv_files, out_file)
+        with open(out_file) as f:
+            self.assertEqual(
+                f.read(), 'id,name,area\n1,a,\n2,b,\n3,,1.5\n')
+
+        json_files = []
+        for index in range(2):
+            json_files.append(os.path.join(
+                self.out_dir, '{}.json'.format(index)))
+            with open(json_files[-1], 'w') as f:
+                json.dump({'type': 'FeatureCollection', 'features': [
+                    {'type': 'Feature', 'geometry': None, 'properties': {'id': index}}]}, f)
+        out_file = os.path.join(self.out_dir, 'out.json')
+        self._write_pages(export._GeoJSONPages, json_files, out_file)
+        with open(out_file) as f:
+            data = json.load(f)
+        self.assertEqual([f['properties']['id']
+                          for f in data['features']], [0, 1])
+
+        # The type of the code field differs between pages, so it is written as text sized to its longest value.
+        shp_files = []
+        for index, (name, code) in enumerate([('a', 12.25), ('a much longer name', 'x')]):
+            shp_files.append(os.path.join(self.out_dir, '{}.shp'.format(index)))
+            with shapefile.Writer(shp_files[-1], shapeType=shapefile.POINT) as w:
+                w.field('name', 'C', size=30)
+                if index == 0:
+                    w.field('code', 'N', size=18, decimal=8)
+                else:
+                    w.field('code', 'C', size=1)
+                w.point(index, index)
+                w.record(name, code)
+        out_file = os.path.join(self.out_dir, 'out.shp')
+        files = self._write_pages(export._ShapefilePages, shp_files, out_file)
+        self.assertEqual(sorted(os.path.basename(f) for f in files), ['out.dbf', 'out.shp', 'out.shx'])
+        with shapefile.Reader(out_file) as reader:
+            self.assertEqual([list(field) for field in reader.fields[1:]], [['name', 'C', 18, 0], ['code', 'C', 5, 0]])
+            self.assertEqual([list(r) for r in reader.records()],
+                             [['a', '12.25'], ['a much longer name', 'x']])
+            self.assertEqual([list(map(list, s.points)) for s in reader.shapes()], [[[0, 0]], [[1, 1]]])
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir, 'out.records')))
+
+    def test_download_vector_pages(self):
+        """Test appending pages in order as they are downloaded, with a bounded number of pages on disk."""
+        ranges = [(str(index), str(index + 1)) for index in range(5)]
+        ranges[-1] = ('4', None)
+        events = []
+        lock = threading.Lock()
+        page3 = threading.Event()
+
+        def download_file(url, page_file):
+            index = int(os.path.basename(page_file)[4:-4])
+            if index == 0:
+                # The first page is the slowest, so later pages wait for it to be appended.
+                self.assertTrue(page3.wait(10))
+            with open(page_file, 'w') as f:
+                f.write('id\n{}\n'.format(index))
+            with lock:
+                pages_on_disk = [f for f in os.listdir(os.path.dirname(page_file)) if f.startswith('page')]
+                events.append((index, len(pages_on_disk)))
+            if index == 3:
+                page3.set()
+
+        collection = mock.MagicMock()
+        collection.filter.return_value = collection
+        collection.getDownloadURL.side_effect = lambda filetype, selectors, filename: filename
+        filename = os.path.join(self.out_dir, 'out.csv')
+        with mock.patch.object(export, 'ee'), \
+                mock.patch.object(export, '_page_ranges', return_value=ranges), \
+                mock.patch('geemap.download.download_file', download_file):
+            export.download_vector_pages(collection, filename, 5, page_size=1, workers=2, verbose=False)
+
+        with open(filename) as f:
+            self.assertEqual(f.read(), 'id\n0\n1\n2\n3\n4\n')
+        # Page 4 is only downloaded once page 0 is appended, and appended pages are deleted.
+        self.assertEqual(events[-1][0], 4)
+        self.assertLessEqual(max(count for index, count in events), 4)
+        self.assertEqual(sorted(os.listdir(self.out_dir)), ['out.csv', 'stack.tif'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,18 @@
 """Tests for `geemap` package."""
 
 
+import asyncio
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
 import unittest
+from unittest import mock
+
+import ee
+import numpy as np
 from click.testing import CliRunner
 
 from geemap import geemap
@@ -22,6 +33,327 @@ class TestGeemap(unittest.TestCase):
     def test_000_something(self):
         """Test something."""
 
+    def _map(self, **kwargs):
+        with mock.patch.object(geemap, 'ee_initialize'):
+            return geemap.Map(lite_mode=True, **kwargs)
+
+    def test_ee_initialize(self):
+        """Test initializing the Earth Engine session only once per process."""
+        with mock.patch.object(geemap, '_ee_initialized', False), \
+                mock.patch.object(ee, 'Initialize') as initialize:
+            geemap.ee_initialize()
+            geemap.ee_initialize()
+            self.assertEqual(initialize.call_count, 1)
+
+        # A failed initialization is attempted again by the next call.
+        with mock.patch.object(geemap, '_ee_initialized', False), \
+                mock.patch.object(ee, 'Initialize', side_effect=ee.EEException('No credentials')) as initialize, \
+                mock.patch.object(ee, 'Authenticate', side_effect=ee.EEException('No browser')):
+            for _ in range(2):
+                with self.assertRaises(ee.EEException):
+                    geemap.ee_initialize()
+            self.assertEqual(initialize.call_count, 2)
+
+    def test_lite_mode(self):
+        """Test creating the controls of a map in lite mode on first use."""
+        from ipyleaflet import DrawControl
+
+        with mock.patch.object(geemap, 'ee_initialize'):
+            full = geemap.Map()
+        self.assertIn(full.draw_control, full.controls)
+        self.assertIn(full.inspector_control, full.controls)
+
+        m = self._map()
+        self.assertEqual(len(m.controls), len(full.controls) - 7)
+        self.assertFalse(any(isinstance(c, DrawControl) for c in m.controls))
+        self.assertIsNone(m.user_roi)
+        draw_control = m.draw_control
+        self.assertIn(draw_control, m.controls)
+        self.assertIs(m.draw_control, draw_control)
+        self.assertEqual(len([c for c in m.controls if isinstance(c, DrawControl)]), 1)
+
+        # The drawn shapes are converted to Earth Engine objects.
+        geometry = {'type': 'Point', 'coordinates': [-100, 40]}
+        with mock.patch.object(geemap, 'ee') as fake_ee, \
+                mock.patch.object(geemap, 'geojson_to_ee', return_value='geometry'), \
+                mock.patch.object(geemap, 'ee_tile_layer', return_value=geemap.ipyleaflet.TileLayer()):
+            draw_control._draw_callbacks(draw_control, action='created', geo_json={
+                'type': 'Feature', 'geometry': geometry})
+        fake_ee.Feature.assert_called_once_with('geometry')
+        self.assertIs(m.user_roi, fake_ee.Feature.return_value.geometry.return_value)
+
+        inspector_control = m.inspector_control
+        self.assertIn(inspector_control, m.controls)
+        self.assertIn(m.inspector_output_control, m.controls)
+
+    def test_view_to_numpy(self):
+        """Test reading the map view at screen resolution."""
+        import math
+        from geemap import tiles
+
+        def read_image(image, region=None, scale=None, crs=None, masked=False, workers=4):
+            # Emulates the pixel grid of EPSG:3857 at the scale of the zoom level, as snapped by plan_export().
+            west, south, east, north = region
+            zoom = int(round(math.log2(tiles.meters_per_pixel(0) / scale)))
+            left, top = tiles.lonlat_to_pixel(west, north, zoom)
+            right, bottom = tiles.lonlat_to_pixel(east, south, zoom)
+            shape = (math.ceil(bottom) - math.floor(top), math.ceil(right) - math.floor(left), 2)
+            return np.zeros(shape, dtype='uint8')
+
+        m = self._map(center=(0, 0), zoom=2)
+        m.layout.width = '300px'
+        m.layout.height = '200px'
+        self.assertEqual(m.get_view_size(), (300, 200))
+        m.ee_raster_layers = [mock.MagicMock(spec=ee.Image)]
+        m.ee_raster_layer_names = ['Image']
+
+        with mock.patch.object(ee.Geometry, 'Rectangle', side_effect=lambda coords: coords) as rectangle, \
+                mock.patch.object(geemap, 'read_image', side_effect=read_image) as read:
+            array = m.view_to_numpy()
+            self.assertEqual(array.shape, (200, 300, 2))
+            west, south, east, north = rectangle.call_args[0][0]
+            # The view is 300 x 200 pixels of a 1024 pixel wide world, centered on (0, 0).
+            self.assertAlmostEqual(west, -(150 - 0.25) * 360 / 1024)
+            self.assertAlmostEqual(east, (150 - 0.25) * 360 / 1024)
+            self.assertAlmostEqual(north, -south)
+            self.assertEqual(tiles.lonlat_to_pixel(0, north, 2)[1], 412.25)
+            self.assertEqual(read.call_args[1]['crs'], 'EPSG:3857')
+            self.assertEqual(read.call_args[1]['scale'], tiles.meters_per_pixel(2))
+
+            # The array is cached until the view changes.
+            self.assertIs(m.view_to_numpy(), array)
+            self.assertEqual(read.call_count, 1)
+
+            # The view is clipped to the world at low zoom levels.
+            m.zoom = 0
+            self.assertEqual(m.view_to_numpy().shape, (200, 256, 2))
+            west, south, east, north = rectangle.call_args[0][0]
+            self.assertAlmostEqual(west, -180 + 0.25 * 360 / 256)
+            self.assertEqual(read.call_count, 2)
+
+    def test_center_object(self):
+        """Test fitting the map to the bounds of an object."""
+        m = self._map(center=(0, 0), zoom=3)
+        m.layout.width = '512px'
+        m.layout.height = '512px'
+        with mock.patch.object(geemap, 'ee_object_bounds', return_value=[[-45, -90], [45, 90]]):
+            m.center_object(None)
+        # Half of the world is 512 pixels wide at zoom 2.
+        self.assertEqual(m.zoom, 2)
+
+        # The zoom level is clamped to the maximum zoom level of the map.
+        with mock.patch.object(geemap, 'ee_object_bounds', return_value=[[40, -100], [40.0001, -99.9999]]):
+            m.center_object(None)
+        self.assertEqual(m.zoom, m.max_zoom)
+        self.assertEqual(m.center, [40.00005, -99.99995])
+        m.center_object(None, zoom=30)
+        self.assertEqual(m.zoom, m.max_zoom)
+
+        # The zoom level is kept for a point.
+        m.zoom = 5
+        with mock.patch.object(geemap, 'ee_object_bounds', return_value=[[10, 20], [10, 20]]):
+            m.center_object(None)
+        self.assertEqual(m.zoom, 5)
+        self.assertEqual(m.center, [10, 20])
+
+    def _time_slider(self, m, release):
+        """Adds a time slider for a collection of 3 images, whose map ids are computed once release is set."""
+        collection = mock.MagicMock(spec=ee.ImageCollection)
+        collection.map.return_value.aggregate_array.return_value.getInfo.return_value = [
+            ['a', '2020-01-01'], ['b', '2020-01-02'], ['c', '2020-01-03']]
+        requested = []
+
+        def collection_image(ee_object, index):
+            image = mock.MagicMock()
+
+            def get_map_id(vis_params):
+                requested.append(index)
+                if index != 'a':
+                    release.wait(10)
+                if index == 'c':
+                    raise ee.EEException('Too many requests')
+                return {'tile_fetcher': mock.Mock(url_format='https://tiles/{}/{{z}}/{{x}}/{{y}}'.format(index))}
+            image.getMapId.side_effect = get_map_id
+            return image
+
+        # The worker threads look up the images after add_time_slider() returns, so the patch is kept until the test ends.
+        patcher = mock.patch.object(geemap, '_collection_image', collection_image)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        m.add_time_slider(collection, {'min': 0, 'max': 1})
+        # The ids and labels are fetched with a single query.
+        self.assertEqual(collection.map.return_value.aggregate_array.return_value.getInfo.call_count, 1)
+        hbox = m.controls[-1].widget
+        return m.layers[-1], hbox.children[1], hbox.children[2], requested
+
+    def _wait(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            threading.Event().wait(0.05)
+        self.fail('Timed out')
+
+    def test_time_slider(self):
+        """Test stepping through the frames of a time slider."""
+        m = self._map()
+        release = threading.Event()
+        layer, slider, label, requested = self._time_slider(m, release)
+        self.assertEqual(layer.url, 'https://tiles/a/{z}/{x}/{y}')
+        self.assertEqual(label.value, '2020-01-01')
+
+        # A frame whose map id is not ready yet is shown once it is.
+        slider.value = 1
+        self.assertEqual(label.value, '2020-01-02')
+        self.assertEqual(layer.url, 'https://tiles/a/{z}/{x}/{y}')
+        release.set()
+        self._wait(lambda: layer.url == 'https://tiles/b/{z}/{x}/{y}')
+
+        slider.value = 2
+        self._wait(lambda: 'failed' in label.value)
+        self.assertEqual(layer.url, 'https://tiles/b/{z}/{x}/{y}')
+        self.assertEqual(sorted(requested), ['a', 'b', 'c'])
+
+    def test_time_slider_event_loop(self):
+        """Test that frames computed by the worker threads are shown from the thread of the event loop."""
+        m = self._map()
+        release = threading.Event()
+        threads = []
+
+        async def main():
+            layer, slider, label, requested = self._time_slider(m, release)
+            layer.observe(lambda change: threads.append(threading.current_thread()), 'url')
+            slider.value = 1
+            release.set()
+            for _ in range(100):
+                if threads:
+                    break
+                await asyncio.sleep(0.05)
+            return layer
+
+        layer = asyncio.run(main())
+        self.assertEqual(layer.url, 'https://tiles/b/{z}/{x}/{y}')
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_export_image(self):
+        """Test that images are only planned when the single request exceeds the size limit, or for a dry run."""
+        image = mock.MagicMock(spec=ee.Image)
+        filename = os.path.join(tempfile.gettempdir(), 'image.tif')
+        plan = {'width': 20000, 'height': 20000, 'band_names': ['B1'], 'total_bytes': 4e8, 'tile_count': 16}
+        with mock.patch.object(geemap, 'ee_initialize'), \
+                mock.patch.object(geemap, 'plan_export', return_value=plan) as plan_export, \
+                mock.patch.object(geemap, 'extract_zip_url') as extract, \
+                mock.patch.object(geemap, 'download_image_tiles') as download_tiles, \
+                mock.patch('sys.stdout', new_callable=io.StringIO):
+            geemap.ee_export_image(image, filename, scale=30)
+            plan_export.assert_not_called()
+            self.assertEqual(image.getDownloadURL.call_count, 1)
+            self.assertEqual(extract.call_count, 1)
+            download_tiles.assert_not_called()
+
+            image.getDownloadURL.side_effect = ee.EEException(
+                'Total request size (1600000000 bytes) must be less than or equal to 50331648 bytes.')
+            geemap.ee_export_image(image, filename, scale=30, workers=2)
+            self.assertEqual(plan_export.call_count, 1)
+            self.assertEqual(download_tiles.call_args[0][2], plan)
+            self.assertEqual(download_tiles.call_args[1]['workers'], 2)
+
+            # Other errors are not retried as tiles.
+            image.getDownloadURL.side_effect = ee.EEException('Image.select: Pattern did not match any bands.')
+            geemap.ee_export_image(image, filename, scale=30)
+            self.assertEqual(plan_export.call_count, 1)
+
+            self.assertIs(geemap.ee_export_image(image, filename, scale=30, dry_run=True), plan)
+            self.assertEqual(plan_export.call_count, 2)
+            self.assertEqual(download_tiles.call_count, 1)
+
+    def test_export_image_collection(self):
+        """Test downloading the images of a collection concurrently and retrying failed images."""
+        ids = ['a', 'b', 'c']
+        plans = {index: {'scale': 30, 'tile_count': 1} for index in ids}
+        barrier = threading.Barrier(3, timeout=10)
+        attempts = {index: 0 for index in ids}
+        lock = threading.Lock()
+
+        def export_image(image, filename, plan, scale=None, workers=4, **kwargs):
+            with lock:
+                attempts[image] += 1
+                attempt = attempts[image]
+            if attempt == 1:
+                # All images are downloaded at the same time.
+                barrier.wait()
+            if image == 'c' or (image == 'b' and attempt == 1):
+                raise IOError('HTTP 500')
+            self.assertEqual((scale, workers), (30, 1))
+            with open(filename, 'w') as f:
+                f.write(image)
+
+        out_dir = tempfile.mkdtemp()
+        try:
+            with mock.patch.object(geemap, 'ee_initialize'), \
+                    mock.patch.object(geemap, 'plan_collection_export', return_value=(ids, plans)) as plan, \
+                    mock.patch.object(geemap, '_collection_image', lambda collection, index: index), \
+                    mock.patch.object(geemap, '_export_image', export_image):
+                failed = geemap.ee_export_image_collection(mock.MagicMock(spec=ee.ImageCollection), out_dir,
+                                                           workers=3, retries=1)
+            self.assertEqual(plan.call_count, 1)
+            self.assertEqual(failed, ['c'])
+            self.assertEqual(attempts, {'a': 1, 'b': 2, 'c': 2})
+            self.assertEqual(sorted(os.listdir(out_dir)), ['a.tif', 'b.tif'])
+        finally:
+            shutil.rmtree(out_dir)
+
+    def test_export_without_rasterio(self):
+        """Test that exports needing rasterio fail before anything is downloaded when it is not installed."""
+        plans = {'a': {'scale': 30, 'tile_count': 1}, 'b': {'scale': 30, 'tile_count': 4}}
+        collection = mock.MagicMock(spec=ee.ImageCollection)
+        out_dir = tempfile.mkdtemp()
+        try:
+            with mock.patch.dict(sys.modules, {'rasterio': None}), \
+                    mock.patch.object(geemap, 'ee_initialize'), \
+                    mock.patch.object(geemap, 'plan_collection_export', return_value=(['a', 'b'], plans)), \
+                    mock.patch.object(geemap, '_export_image') as export_image, \
+                    mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                self.assertIsNone(geemap.ee_export_image_collection(collection, out_dir))
+                self.assertIsNone(geemap.ee_export_image_collection(collection, out_dir, stack=True))
+                self.assertIsNone(geemap.ee_image_collection_to_numpy(collection))
+            export_image.assert_not_called()
+            collection.aggregate_array.assert_not_called()
+            self.assertEqual(stdout.getvalue().count('pip install geemap[rasterio]'), 3)
+        finally:
+            shutil.rmtree(out_dir)
+
+    def test_export_image_collection_stack(self):
+        """Test downloading a collection as a single stacked image and splitting it per image."""
+        import rasterio
+        from rasterio.transform import from_origin
+
+        ids = ['20200101', '20200102']
+        band_names = ['{}_{}'.format(index, band) for index in ids for band in ['B1', 'B2']]
+        data = np.arange(4 * 3 * 2, dtype='uint8').reshape(4, 3, 2)
+        collection = mock.MagicMock(spec=ee.ImageCollection)
+        collection.aggregate_array.return_value.getInfo.return_value = ids
+
+        def export_image(image, filename, plan, **kwargs):
+            self.assertIs(image, collection.toBands.return_value)
+            with rasterio.open(filename, 'w', driver='GTiff', width=2, height=3, count=4, dtype='uint8',
+                               crs='EPSG:4326', transform=from_origin(0, 0, 1, 1)) as dst:
+                dst.write(data)
+
+        out_dir = tempfile.mkdtemp()
+        try:
+            with mock.patch.object(geemap, 'ee_initialize'), \
+                    mock.patch.object(geemap, 'plan_export', return_value={'band_names': band_names, 'tile_count': 1}), \
+                    mock.patch.object(geemap, '_export_image', export_image):
+                failed = geemap.ee_export_image_collection(
+                    collection, out_dir, scale=30, stack=True)
+            self.assertEqual(failed, [])
+            self.assertEqual(sorted(os.listdir(out_dir)), ['20200101.tif', '20200102.tif'])
+            with rasterio.open(os.path.join(out_dir, '20200102.tif')) as src:
+                self.assertEqual(src.descriptions, ('B1', 'B2'))
+                self.assertTrue(np.array_equal(src.read(), data[2:]))
+        finally:
+            shutil.rmtree(out_dir)
+
     def test_command_line_interface(self):
         """Test the CLI."""
         runner = CliRunner()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.jobs` module."""
+
+
+import functools
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+from click.testing import CliRunner
+
+from geemap import cli
+from geemap import jobs
+from geemap.jobs import JobQueue
+
+
+class _Handler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestJobs(unittest.TestCase):
+    """Tests for `geemap.jobs` module."""
+
+    def setUp(self):
+        """Set up a job database and a local HTTP server standing in for the download service."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.tmp_dir, 'data')
+        self.out_dir = os.path.join(self.tmp_dir, 'out')
+        os.makedirs(self.data_dir)
+        with open(os.path.join(self.data_dir, 'a.bin'), 'wb') as f:
+            f.write(b'a' * 1000)
+
+        handler = functools.partial(_Handler, directory=self.data_dir)
+        self.server = HTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        self.db = os.path.join(self.tmp_dir, 'jobs.db')
+        self.queue = JobQueue(self.db)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run(self):
+        """Test running jobs, retrying failed jobs and resuming after a crash."""
+        done_id = self.queue.add('url', os.path.join(
+            self.out_dir, 'a.bin'), url=self.url + 'a.bin')
+        failed_id = self.queue.add('url', os.path.join(
+            self.out_dir, 'b.bin'), url=self.url + 'b.bin')
+        self.assertEqual(self.queue.add('url', os.path.join(
+            self.out_dir, 'a.bin'), url=self.url + 'a.bin'), done_id)
+
+        summary = self.queue.run(retries=1, retry_delay=0, verbose=False)
+        self.assertEqual(summary, {'done': 1, 'failed': 1})
+        jobs = {job['id']: job for job in self.queue.list()}
+        self.assertEqual(jobs[done_id]['status'], 'done')
+        self.assertEqual(jobs[done_id]['bytes'], 1000)
+        self.assertEqual(jobs[failed_id]['status'], 'failed')
+        self.assertEqual(jobs[failed_id]['attempts'], 2)
+
+        # A job left running by a process that died is run again.
+        with open(os.path.join(self.data_dir, 'b.bin'), 'wb') as f:
+            f.write(b'b' * 10)
+        self.queue.retry()
+        self.queue._update(failed_id, status='running', pid=2 ** 22 + 1)
+        summary = JobQueue(self.db).run(verbose=False)
+        self.assertEqual(summary, {'done': 1, 'failed': 0})
+        self.assertEqual(len(self.queue.list('done')), 2)
+
+    def test_interrupted(self):
+        """Test that a job interrupted in this process is left pending rather than running."""
+        job_id = self.queue.add('url', os.path.join(self.out_dir, 'a.bin'),
+                                url=self.url + 'a.bin')
+
+        def interrupt(params, output):
+            raise KeyboardInterrupt()
+
+        with mock.patch.dict(jobs.JOB_TYPES, {'url': interrupt}):
+            with self.assertRaises(KeyboardInterrupt):
+                self.queue.run(verbose=False)
+        job = self.queue.list()[0]
+        self.assertEqual((job['id'], job['status']), (job_id, 'pending'))
+        self.assertEqual(self.queue.run(verbose=False), {'done': 1, 'failed': 0})
+
+    def test_ee_initialize(self):
+        """Test that Earth Engine is initialized before the parameters of a job are deserialized."""
+        import ee
+        from geemap import geemap
+
+        output = os.path.join(self.out_dir, 'image.tif')
+        JobQueue(self.db).add_image(ee.ComputedObject(None, None, 'image'), output, scale=30)
+        initialize = mock.MagicMock()
+        deserialize = ee.deserializer.fromJSON
+
+        def from_json(text):
+            if not initialize.called:
+                raise ee.EEException('Earth Engine client library not initialized.')
+            return deserialize(text)
+
+        run_image = mock.MagicMock()
+        with mock.patch.object(geemap, '_ee_initialized', False), \
+                mock.patch.object(ee, 'Initialize', initialize), \
+                mock.patch.object(ee.deserializer, 'fromJSON', side_effect=from_json), \
+                mock.patch.dict(jobs.JOB_TYPES, {'image': run_image}):
+            summary = JobQueue(self.db).run(retries=0, verbose=False)
+        self.assertEqual(summary, {'done': 1, 'failed': 0})
+        initialize.assert_called_once_with()
+        params, job_output = run_image.call_args[0]
+        self.assertEqual(job_output, output)
+        self.assertEqual(params['scale'], 30)
+        self.assertIsInstance(params['ee_object'], ee.ComputedObject)
+
+    def test_add_params(self):
+        """Test rejecting parameters that the export functions do not accept."""
+        output = os.path.join(self.out_dir, 'image.tif')
+        with self.assertRaises(ValueError):
+            self.queue.add('image', output, ee_object=None, dry_run=True)
+        with self.assertRaises(ValueError):
+            self.queue.add_image(None, output, scales=30)
+        with self.assertRaises(ValueError):
+            self.queue.add('url', output, checksum='md5:0')
+        self.assertEqual(self.queue.list(), [])
+
+    def test_connections_closed(self):
+        """Test that connections are closed after each operation."""
+        with self.queue._connect() as conn:
+            conn.execute('SELECT COUNT(*) FROM jobs')
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute('SELECT COUNT(*) FROM jobs')
+
+    def test_cli(self):
+        """Test the jobs command line interface."""
+        self.queue.add('url', os.path.join(self.out_dir, 'a.bin'),
+                       url=self.url + 'a.bin')
+        runner = CliRunner()
+        result = runner.invoke(cli.main, ['jobs', '--db', self.db, 'run'])
+        self.assertEqual(result.exit_code, 0)
+        result = runner.invoke(cli.main, ['jobs', '--db', self.db, 'list'])
+        self.assertIn('done', result.output)
+        result = runner.invoke(cli.main, ['jobs', '--db', self.db, 'clear'])
+        self.assertIn('1 jobs removed', result.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
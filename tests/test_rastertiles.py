@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.rastertiles` module."""
+
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from geemap import rastertiles
+
+
+class TestRasterTiles(unittest.TestCase):
+    """Tests for `geemap.rastertiles` module."""
+
+    def setUp(self):
+        """Set up a temporary directory."""
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_block_mean(self):
+        """Test downsampling with odd sizes and invalid pixels."""
+        array = np.arange(15, dtype='float32').reshape(3, 5, 1)
+        array[0, 0, 0] = np.nan
+        array[2, 4, 0] = -1
+        out = np.empty((2, 3, 1), dtype='float32')
+        rastertiles._block_mean(array, out, nodata=-1)
+        self.assertEqual(out[0, 0, 0], (1 + 5 + 6) / 3.0)
+        self.assertEqual(out[1, 1, 0], 12.5)
+        self.assertTrue(np.isnan(out[1, 2, 0]))
+
+    def test_read_tile(self):
+        """Test sampling tiles from the overview levels of an array."""
+        # A 0.01 degree grid over (0, 0) to (10, 10), whose pixels hold their column.
+        array = np.tile(np.arange(1000, dtype='int16'), (1000, 1))
+        index = rastertiles.raster_tile_index(array, bounds=((0, 0), (10, 10)))
+        self.assertEqual([level.shape[0] for level in index.levels], [1000, 500, 250])
+        self.assertEqual(index.bounds, ((0, 0), (10, 10)))
+
+        # At zoom 0, the raster covers a few pixels of the world, sampled from the coarsest level.
+        tile = index.read_tile(0, 0, 0)
+        self.assertEqual(tile.shape, (256, 256, 1))
+        self.assertTrue(tile.mask[0, 0, 0])
+        self.assertFalse(tile.mask[126, 129, 0])
+
+        # At zoom 12, tile pixels are smaller than the raster pixels, which are read at full resolution.
+        tile = index.read_tile(12, 2048 + 5, 2047)
+        self.assertFalse(tile.mask.any())
+        lon = ((2048 + 5) * 256 + 0.5) / (256 * 2 ** 12) * 360 - 180
+        self.assertEqual(tile[0, 0, 0], int(lon / 0.01))
+        self.assertIsNone(index.read_tile(12, 0, 0))
+
+    def test_geotiff(self):
+        """Test serving tiles of a GeoTIFF with cached overviews."""
+        import rasterio
+
+        filename = os.path.join(self.tmp_dir, 'image.tif')
+        data = np.random.RandomState(0).randint(0, 255, (3, 600, 700)).astype('uint8')
+        with rasterio.open(filename, 'w', driver='GTiff', width=700, height=600, count=3, dtype='uint8',
+                           crs='EPSG:3857', transform=rasterio.Affine(100, 0, 0, 0, -100, 60000)) as dst:
+            dst.write(data)
+
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        index = rastertiles.raster_tile_index(
+            filename, vis_params={'min': 0, 'max': 255}, cache_dir=cache_dir)
+        self.assertTrue(np.array_equal(index.levels[0], data.transpose(1, 2, 0)))
+        self.assertEqual(len(os.listdir(os.path.join(cache_dir, os.listdir(cache_dir)[0]))), 3)
+
+        png = index.get_tile(8, 128, 127)
+        with Image.open(io.BytesIO(png)) as img:
+            self.assertEqual(img.size, (256, 256))
+        self.assertIs(index.get_tile(8, 128, 127), png)
+        self.assertIsNone(index.get_tile(8, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
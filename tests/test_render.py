@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.render` module."""
+
+
+import base64
+import io
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from geemap import render
+
+
+class TestRender(unittest.TestCase):
+    """Tests for `geemap.render` module."""
+
+    def test_palette(self):
+        """Test rendering a float band with a palette, min and max."""
+        array = np.array([[0, 50, 100, 200], [-10, np.nan, 25, 75]], dtype='float32')
+        rgba = render.render_array(array, {'min': 0, 'max': 100, 'palette': '000000,#ff0000,blue'})
+        self.assertEqual(rgba.shape, (2, 4, 4))
+        self.assertEqual(rgba.dtype, np.uint8)
+        self.assertEqual(rgba[0, 0].tolist(), [0, 0, 0, 255])
+        self.assertEqual(rgba[0, 1].tolist(), [255, 0, 0, 255])
+        self.assertEqual(rgba[0, 2].tolist(), [0, 0, 255, 255])
+        self.assertEqual(rgba[0, 3].tolist(), [0, 0, 255, 255])
+        self.assertEqual(rgba[1, 0].tolist(), [0, 0, 0, 255])
+        self.assertEqual(rgba[1, 1, 3], 0)
+        self.assertEqual(rgba[1, 2, :3].tolist(), [128, 0, 0])
+
+    def test_rgb(self):
+        """Test rendering integer bands selected by name, with gamma and a mask."""
+        array = np.ma.MaskedArray(np.zeros((2, 2, 4), dtype='int16'))
+        array[0, 0] = [1000, 2000, 3000, 4000]
+        array[1, 1] = np.ma.masked
+        vis = {'bands': ['B4', 'B3', 'B2'], 'min': 0, 'max': [4000, 3000, 2000], 'gamma': 2}
+        rgba = render.render_array(array, vis, band_names=['B1', 'B2', 'B3', 'B4'])
+        self.assertEqual(rgba[0, 0].tolist(), [255, 255, 255, 255])
+        self.assertEqual(rgba[0, 1].tolist(), [0, 0, 0, 255])
+        self.assertEqual(rgba[1, 1, 3], 0)
+
+        array = np.full((1, 1, 3), 1000, dtype='uint16')
+        rgba = render.render_array(array, {'min': 0, 'max': 4000, 'gamma': 2})
+        self.assertEqual(rgba[0, 0, 0], round(255 * 0.25 ** 0.5))
+
+    def test_wide_integers(self):
+        """Test rendering 32 bit integer bands, which are quantized rather than indexed directly."""
+        for dtype, values in [('uint32', [0, 2 ** 31, 2 ** 32 - 1]), ('int32', [-2 ** 31, 0, 2 ** 31 - 1])]:
+            array = np.array([values], dtype=dtype)
+            rgba = render.render_array(array, {'min': values[0], 'max': values[2], 'palette': ['black', 'white']})
+            self.assertEqual(rgba[0, :, 0].tolist(), [0, 128, 255])
+
+    def test_data_url(self):
+        """Test encoding a rendered array as a PNG data URL."""
+        url = render.array_to_data_url(np.linspace(0, 1, 12).reshape(3, 4))
+        self.assertTrue(url.startswith('data:image/png;base64,'))
+        png = base64.b64decode(url.split(',', 1)[1])
+        with Image.open(io.BytesIO(png)) as img:
+            self.assertEqual(img.size, (4, 3))
+            self.assertEqual(img.mode, 'RGBA')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.stats` module."""
+
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from geemap import blocks
+from geemap.stats import StreamingStats, image_stats
+
+
+class TestStats(unittest.TestCase):
+    """Tests for `geemap.stats` module."""
+
+    def setUp(self):
+        """Set up a raster split into blocks whose range grows from block to block."""
+        random = np.random.RandomState(0)
+        self.data = random.normal(100, 20, size=(400, 300, 2))
+        self.data[:, :, 1] *= np.linspace(0.1, 5, 400)[:, np.newaxis]
+        self.blocks = [self.data[row:row + 100] for row in range(0, 400, 100)]
+
+    def _check(self, stats):
+        values = self.data.reshape(-1, 2)
+        self.assertTrue(np.array_equal(stats.count, [values.shape[0]] * 2))
+        self.assertTrue(np.allclose(stats.min, values.min(axis=0)))
+        self.assertTrue(np.allclose(stats.max, values.max(axis=0)))
+        self.assertTrue(np.allclose(stats.mean, values.mean(axis=0)))
+        self.assertTrue(np.allclose(stats.variance, values.var(axis=0)))
+        for band in range(2):
+            counts, edges = stats.histogram(band)
+            self.assertEqual(counts.sum(), values.shape[0])
+            width = edges[1] - edges[0]
+            expected = np.percentile(values[:, band], [5, 50, 95])
+            actual = stats.percentile([5, 50, 95])[:, band]
+            self.assertTrue(np.all(np.abs(actual - expected) <= 2 * width))
+
+    def test_update(self):
+        """Test accumulating statistics block by block."""
+        stats = StreamingStats(bins=128)
+        for block in self.blocks:
+            stats.update(block)
+        self._check(stats)
+
+    def test_merge(self):
+        """Test merging statistics accumulated by separate workers."""
+        parts = [StreamingStats(bins=128), StreamingStats(bins=128)]
+        for index, block in enumerate(self.blocks):
+            parts[index % 2].update(block)
+        self._check(parts[0].merge(parts[1]))
+
+    def test_masked(self):
+        """Test that masked and NaN pixels are ignored."""
+        block = np.ma.MaskedArray([[1.0, 2.0], [np.nan, 100.0]],
+                                  mask=[[False, False], [False, True]])
+        stats = StreamingStats()
+        stats.update(block)
+        self.assertEqual(stats.count[0], 2)
+        self.assertEqual(stats.max[0], 2.0)
+
+    def test_image_stats(self):
+        """Test computing the statistics of an image with the band names of its plan, without another request."""
+        tiles = [{'row_off': row, 'col_off': 0, 'height': 100, 'width': 300} for row in range(0, 400, 100)]
+        plan = {'crs': 'EPSG:4326', 'tiles': tiles}
+        image = mock.MagicMock()
+
+        def fetch_blocks(image, plan, workers=4, read_ahead=None):
+            for block, data in zip(plan['tiles'], self.blocks):
+                values = np.zeros(data.shape[:2], dtype=[(name, 'float64') for name in ['B1', 'B2', 'B1_mask', 'B2_mask']])
+                values['B1'], values['B2'] = data[:, :, 0], data[:, :, 1]
+                values['B1_mask'] = values['B2_mask'] = 1
+                yield block, values
+
+        planned = (image, plan, ['B1', 'B2'], ['B1_mask', 'B2_mask'], np.dtype('float64'))
+        with mock.patch.object(blocks, '_plan_read', return_value=planned) as plan_read, \
+                mock.patch.object(blocks, '_fetch_blocks', fetch_blocks):
+            stats = image_stats(image, scale=30, bins=128)
+        self.assertEqual(plan_read.call_count, 1)
+        image.bandNames.assert_not_called()
+        self.assertEqual(stats.band_names, ['B1', 'B2'])
+        self._check(stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
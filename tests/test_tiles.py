@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.tiles` module."""
+
+
+import io
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from geemap import tiles
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new('RGBA', (256, 256), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class TestTiles(unittest.TestCase):
+    """Tests for `geemap.tiles` module."""
+
+    def setUp(self):
+        """Set up a local tile server standing in for the basemap and Earth Engine tile services."""
+        self.server = tiles.TileServer()
+        self.requested = []
+
+        def basemap(z, x, y):
+            self.requested.append((z, x, y))
+            return _png((0, 0, 255, 255))
+
+        self.basemap_url = self.server.add_provider(basemap)
+        self.overlay_url = self.server.add_provider(
+            lambda z, x, y: _png((255, 0, 0, 255)))
+        self.empty_url = self.server.add_provider(lambda z, x, y: None)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.server.shutdown()
+
+    def test_tile_math(self):
+        """Test the round trip between longitude/latitude and pixels."""
+        px, py = tiles.lonlat_to_pixel(-100, 40, 4)
+        lon, lat = tiles.pixel_to_lonlat(px, py, 4)
+        self.assertAlmostEqual(lon, -100)
+        self.assertAlmostEqual(lat, 40)
+        self.assertEqual(tiles.lonlat_to_pixel(0, 0, 0), (128, 128))
+
+    def test_render_view(self):
+        """Test compositing layers in order with opacity."""
+        layers = [{'url': self.basemap_url},
+                  {'url': self.overlay_url, 'opacity': 0.5},
+                  {'url': self.empty_url}]
+        image = tiles.render_view(layers, (40, -100), 4, 300, 200)
+        self.assertEqual(image.shape, (200, 300, 4))
+        self.assertTrue(np.all(image[:, :, 0] == 128))
+        self.assertTrue(np.all(image[:, :, 1] == 0))
+        self.assertTrue(np.all(image[:, :, 2] == 128))
+        self.assertTrue(np.all(image[:, :, 3] == 255))
+        # A 300x200 view touches at most 3x2 tiles.
+        self.assertLessEqual(len(set(self.requested)), 6)
+        self.assertTrue(all(z == 4 for z, x, y in self.requested))
+
+    def test_bounds_to_zoom(self):
+        """Test fitting bounds in a map view."""
+        # The world is 256 pixels wide at zoom 0, so half of it fits in 256 pixels at zoom 1.
+        self.assertEqual(tiles.bounds_to_zoom(
+            [[-60, -90], [60, 90]], 256, 1000), 1)
+        self.assertEqual(tiles.bounds_to_zoom(
+            [[-60, -90], [60, 90]], 255, 1000), 0)
+        self.assertEqual(tiles.bounds_to_zoom(
+            [[-80, -180], [80, 180]], 100, 100), 0)
+        self.assertEqual(tiles.bounds_to_zoom(
+            [[40, -100], [40.001, -99.999]], 800, 600, max_zoom=18), 18)
+        # A line is fitted along its only side with an extent, and a point has no zoom level.
+        self.assertEqual(tiles.bounds_to_zoom(
+            [[0, -90], [0, 90]], 256, 256), 1)
+        self.assertIsNone(tiles.bounds_to_zoom([[40, -100], [40, -100]], 800, 600))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+"""Tests for `geemap.vectortiles` module."""
+
+
+import struct
+import unittest
+
+from geemap.vectortiles import VectorTileIndex, MVT_POINT, MVT_LINESTRING, MVT_POLYGON
+
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _read_message(data):
+    """Decodes the fields of a protobuf message as a list of (number, value) tuples."""
+    fields = []
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value = struct.unpack('<d', data[pos:pos + 8])[0]
+            pos += 8
+        elif wire_type == 2:
+            size, pos = _read_varint(data, pos)
+            value = data[pos:pos + size]
+            pos += size
+        else:
+            raise ValueError('Unexpected wire type {}'.format(wire_type))
+        fields.append((number, value))
+    return fields
+
+
+def _read_packed(data):
+    values = []
+    pos = 0
+    while pos < len(data):
+        value, pos = _read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _decode_geometry(commands):
+    """Decodes MVT geometry commands into a list of parts, each a list of (x, y) tile coordinates."""
+    parts = []
+    x, y = 0, 0
+    i = 0
+    while i < len(commands):
+        command, count = commands[i] & 0x7, commands[i] >> 3
+        i += 1
+        if command == 7:
+            continue
+        if command == 1:
+            parts.append([])
+        for _ in range(count):
+            x += _unzigzag(commands[i])
+            y += _unzigzag(commands[i + 1])
+            i += 2
+            if command == 1 and parts[-1]:
+                parts.append([])
+            parts[-1].append((x, y))
+    return parts
+
+
+def _decode_value(data):
+    number, value = _read_message(data)[0]
+    if number == 1:
+        return value.decode('utf-8')
+    if number == 6:
+        return _unzigzag(value)
+    if number == 7:
+        return bool(value)
+    return value
+
+
+def _decode_tile(data):
+    """Decodes a Mapbox Vector Tile into a dict of layers, each with its extent and a list of features."""
+    layers = {}
+    for number, layer_data in _read_message(data):
+        assert number == 3
+        name, features, keys, values, extent = None, [], [], [], 4096
+        for field, value in _read_message(layer_data):
+            if field == 1:
+                name = value.decode('utf-8')
+            elif field == 2:
+                features.append(value)
+            elif field == 3:
+                keys.append(value.decode('utf-8'))
+            elif field == 4:
+                values.append(_decode_value(value))
+            elif field == 5:
+                extent = value
+        decoded = []
+        for feature_data in features:
+            feature = {'properties': {}}
+            for field, value in _read_message(feature_data):
+                if field == 1:
+                    feature['id'] = value
+                elif field == 2:
+                    tags = _read_packed(value)
+                    for k, v in zip(tags[::2], tags[1::2]):
+                        feature['properties'][keys[k]] = values[v]
+                elif field == 3:
+                    feature['type'] = value
+                elif field == 4:
+                    feature['geometry'] = _decode_geometry(_read_packed(value))
+            decoded.append(feature)
+        layers[name] = {'extent': extent, 'features': decoded}
+    return layers
+
+
+def _area(ring):
+    return sum(ring[i - 1][0] * ring[i][1] - ring[i][0] * ring[i - 1][1]
+               for i in range(len(ring)))
+
+
+def _box(west, south, east, north):
+    return [[west, south], [east, south], [east, north], [west, north], [west, south]]
+
+
+class TestVectorTiles(unittest.TestCase):
+    """Tests for `geemap.vectortiles` module."""
+
+    def test_polygon(self):
+        """Test encoding a polygon with a hole and its properties."""
+        # The rings are given with the wrong winding for GeoJSON to check that it is fixed.
+        feature = {'type': 'Feature',
+                   'geometry': {'type': 'Polygon', 'coordinates': [_box(-90, -45, 90, 45)[::-1], _box(-10, -10, 10, 10)]},
+                   'properties': {'name': 'box', 'count': 3, 'offset': -2, 'area': 1.5, 'valid': True, 'empty': None}}
+        index = VectorTileIndex([feature], layer_name='boxes')
+        layers = _decode_tile(index.get_tile(0, 0, 0))
+        self.assertEqual(list(layers), ['boxes'])
+        self.assertEqual(layers['boxes']['extent'], 4096)
+
+        decoded = layers['boxes']['features']
+        self.assertEqual(len(decoded), 1)
+        self.assertEqual(decoded[0]['type'], MVT_POLYGON)
+        self.assertEqual(decoded[0]['properties'], {
+                         'name': 'box', 'count': 3, 'offset': -2, 'area': 1.5, 'valid': True})
+
+        exterior, interior = decoded[0]['geometry']
+        self.assertEqual(len(exterior), 4)
+        self.assertGreater(_area(exterior), 0)
+        self.assertLess(_area(interior), 0)
+        xs = sorted(set(p[0] for p in exterior))
+        self.assertEqual(xs, [1024, 3072])
+
+    def test_clipping(self):
+        """Test clipping lines and polygons to the buffered tile."""
+        features = [
+            {'type': 'Feature', 'geometry': {'type': 'LineString',
+                                             'coordinates': [[-170, 10], [170, 10]]}, 'properties': {}},
+            {'type': 'Feature', 'geometry': {'type': 'Polygon',
+                                             'coordinates': [_box(-170, 20, 170, 40)]}, 'properties': {}},
+        ]
+        index = VectorTileIndex(features, buffer=64)
+        decoded = _decode_tile(index.get_tile(1, 0, 0))['layer']['features']
+        self.assertEqual([f['type'] for f in decoded],
+                         [MVT_LINESTRING, MVT_POLYGON])
+        for feature in decoded:
+            points = [p for part in feature['geometry'] for p in part]
+            self.assertTrue(all(-64 <= x <= 4096 + 64 for x, y in points))
+            self.assertTrue(all(-64 <= y <= 4096 + 64 for x, y in points))
+            self.assertEqual(max(x for x, y in points), 4096 + 64)
+        self.assertGreater(_area(decoded[1]['geometry'][0]), 0)
+
+        # Features are not found in tiles they do not cover.
+        self.assertIsNone(index.get_tile(1, 0, 1))
+
+    def test_thinning(self):
+        """Test thinning points below max_zoom and keeping all of them beyond it."""
+        features = [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [10 + i * 1e-4, 10]},
+                     'properties': {'id': i}} for i in range(20)]
+        index = VectorTileIndex(features, max_zoom=6)
+        decoded = _decode_tile(index.get_tile(2, 2, 1))['layer']['features']
+        self.assertEqual(len(decoded), 1)
+        self.assertEqual(decoded[0]['type'], MVT_POINT)
+
+        decoded = _decode_tile(index.get_tile(6, 33, 30))['layer']['features']
+        self.assertEqual(len(decoded), 20)
+
+    def test_simplify_cache(self):
+        """Test that the cache of simplified geometries is bounded."""
+        line = [[-170 + i, (i % 7) * 0.1] for i in range(300)]
+        index = VectorTileIndex([{'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': line},
+                                  'properties': {}}], simplify_cache_size=2)
+        for z in range(1, 6):
+            self.assertIsNotNone(index.get_tile(z, 0, 2 ** (z - 1) - 1))
+        self.assertEqual(list(index._simplified), [(0, 4), (0, 5)])
+
+        # A simplified geometry is cheaper than the original one at low zoom levels.
+        self.assertLess(len(index._simplified_parts(0, 0)[0]), len(line))
+
+
+if __name__ == '__main__':
+    unittest.main()